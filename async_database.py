@@ -0,0 +1,95 @@
+"""
+Async data-access layer (psycopg 3) for endpoints that run on the event loop.
+
+Read-heavy routes (quote/invoice listings and views, reports) are declared
+``async def`` and use this pool, so they no longer occupy one of anyio's
+worker threads while waiting on Postgres. Rows come back as plain dicts with
+the same Python types psycopg2's RealDictCursor produces (Decimal, date,
+datetime, parsed JSONB), so responses serialize exactly as before.
+"""
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from typing import List, Optional
+
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool
+
+from database import DATABASE_URL
+
+ASYNC_DB_POOL_MIN_SIZE = int(os.getenv("ASYNC_DB_POOL_MIN_SIZE", "1"))
+ASYNC_DB_POOL_MAX_SIZE = int(os.getenv("ASYNC_DB_POOL_MAX_SIZE", "10"))
+ASYNC_DB_POOL_TIMEOUT = float(os.getenv("ASYNC_DB_POOL_TIMEOUT", "30"))
+ASYNC_DB_POOL_MAX_IDLE = float(os.getenv("ASYNC_DB_POOL_MAX_IDLE", "300"))
+
+_pool: Optional[AsyncConnectionPool] = None
+_pool_lock = asyncio.Lock()
+
+
+def _new_pool() -> AsyncConnectionPool:
+    return AsyncConnectionPool(
+        DATABASE_URL,
+        min_size=ASYNC_DB_POOL_MIN_SIZE,
+        max_size=ASYNC_DB_POOL_MAX_SIZE,
+        timeout=ASYNC_DB_POOL_TIMEOUT,
+        max_idle=ASYNC_DB_POOL_MAX_IDLE,
+        check=AsyncConnectionPool.check_connection,
+        # prepare_threshold=None: no server-side prepared statements, which
+        # the Supabase transaction pooler (pgbouncer) cannot route.
+        kwargs={"row_factory": dict_row, "prepare_threshold": None},
+        open=False,
+    )
+
+
+async def open_async_pool() -> AsyncConnectionPool:
+    """
+    Create and open the pool (app startup, or the first query if startup
+    did not). Does not wait for min_size. The lock keeps concurrent first
+    requests from creating two pools or using one before it is open.
+    """
+    global _pool
+    async with _pool_lock:
+        if _pool is None:
+            pool = _new_pool()
+            await pool.open(wait=False)
+            _pool = pool
+        return _pool
+
+
+async def close_async_pool():
+    """Close the pool (app shutdown)."""
+    global _pool
+    pool, _pool = _pool, None
+    if pool is not None:
+        await pool.close()
+
+
+def get_async_pool_stats() -> dict:
+    if _pool is None:
+        return {"pool_size": 0, "pool_available": 0, "pool_max": ASYNC_DB_POOL_MAX_SIZE}
+    stats = _pool.get_stats()
+    stats["pool_max"] = ASYNC_DB_POOL_MAX_SIZE
+    return stats
+
+
+@asynccontextmanager
+async def async_connection():
+    """
+    Borrow a connection for the duration of the block.
+    The transaction is committed on exit, or rolled back if the block raises.
+    """
+    pool = _pool or await open_async_pool()
+    async with pool.connection() as conn:
+        yield conn
+
+
+async def fetch_all(query: str, params=None) -> List[dict]:
+    async with async_connection() as conn:
+        cursor = await conn.execute(query, params)
+        return await cursor.fetchall()
+
+
+async def fetch_one(query: str, params=None) -> Optional[dict]:
+    async with async_connection() as conn:
+        cursor = await conn.execute(query, params)
+        return await cursor.fetchone()
@@ -171,26 +171,28 @@ def change_password(
     username = user.get("sub")
 
     conn = get_db_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
+    try:
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
 
-    cursor.execute("SELECT * FROM users WHERE username = %s", (username,))
-    db_user = cursor.fetchone()
+        cursor.execute("SELECT * FROM users WHERE username = %s", (username,))
+        db_user = cursor.fetchone()
 
-    if not db_user:
-        raise HTTPException(status_code=404, detail="User not found")
+        if not db_user:
+            raise HTTPException(status_code=404, detail="User not found")
 
-    if not verify_password(data.old_password, db_user["password_hash"]):
-        raise HTTPException(status_code=401, detail="Old password incorrect")
+        if not verify_password(data.old_password, db_user["password_hash"]):
+            raise HTTPException(status_code=401, detail="Old password incorrect")
 
-    new_hash = get_password_hash(data.new_password)
+        new_hash = get_password_hash(data.new_password)
 
-    cursor.execute(
-        "UPDATE users SET password_hash = %s WHERE username = %s",
-        (new_hash, username)
-    )
+        cursor.execute(
+            "UPDATE users SET password_hash = %s WHERE username = %s",
+            (new_hash, username)
+        )
 
-    conn.commit()
-    conn.close()
+        conn.commit()
+    finally:
+        conn.close()
 
     return {"message": "Password updated successfully"}
 
@@ -0,0 +1,73 @@
+"""
+Memory benchmark: building the Resend request body for PDF attachments.
+
+Compares the old attachment encoding, "content": list(pdf_bytes) (one
+Python int per byte), with email_outbox.encode_attachment (base64 straight
+from a memoryview). Both paths are measured up to the serialized JSON body,
+which is what the HTTP client sends; tracemalloc reports the peak heap
+above the PDF itself. No database or Resend account is needed.
+
+    python benchmarks/bench_email_attachments.py
+    python benchmarks/bench_email_attachments.py --size 1000 --attachments 3
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from email_outbox import encode_attachment
+
+PARAMS = {
+    "from": "METPRO SRL <noreply@metprord.site>",
+    "to": ["cliente@example.com"],
+    "subject": "Cotizacion Q-BENCH",
+    "html": "<p>Adjunto encontrara la cotizacion.</p>",
+}
+
+
+def legacy_body(files):
+    attachments = [{"filename": name, "content": list(content)} for name, content in files]
+    return json.dumps(dict(PARAMS, attachments=attachments))
+
+
+def outbox_body(files):
+    attachments = [encode_attachment(name, content) for name, content in files]
+    return json.dumps(dict(PARAMS, attachments=attachments))
+
+
+def measure(build, files, rounds):
+    tracemalloc.start()
+    started = time.perf_counter()
+    for _ in range(rounds):
+        body = build(files)
+    elapsed = (time.perf_counter() - started) / rounds * 1000
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak, elapsed, len(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Email attachment encoding memory benchmark")
+    parser.add_argument("--size", type=int, default=300, help="PDF size in KB")
+    parser.add_argument("--attachments", type=int, default=1)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    # Incompressible bytes, like a real PDF stream; read back as a memoryview
+    # the way the outbox gets BYTEA from psycopg2.
+    files = [(f"doc_{n}.pdf", memoryview(os.urandom(args.size * 1024))) for n in range(args.attachments)]
+    total = args.size * 1024 * args.attachments
+
+    print(f"attachments : {args.attachments} x {args.size} KB")
+    print(f"{'path':<22}{'peak heap':>12}{'x payload':>11}{'body':>12}{'ms/email':>10}")
+    for label, build in (("list(pdf_bytes)", legacy_body), ("base64(memoryview)", outbox_body)):
+        peak, elapsed, body = measure(build, files, args.rounds)
+        print(f"{label:<22}{peak / 1e6:>10.1f}MB{peak / total:>10.1f}x{body / 1e6:>10.2f}MB{elapsed:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
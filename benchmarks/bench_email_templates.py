@@ -0,0 +1,85 @@
+"""
+Microbenchmark: rendering emails from the template registry (email_templates.py).
+
+Measures per-email render time for the quote email and for a reminder
+statement with --rows invoices, against the previous inline f-string
+rendering (kept here as legacy_quote_html, no escaping). No database is needed.
+
+    python benchmarks/bench_email_templates.py
+    python benchmarks/bench_email_templates.py --count 20000 --rows 25
+"""
+import argparse
+import os
+import sys
+import time
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from email_templates import compile_templates, get_template, render_reminder_email
+
+
+def legacy_quote_html(contact_name, project_name, quote_id):
+    return f"""
+        <p>Estimado/a {contact_name},</p>
+
+        <p>Adjunto encontrará la cotización <strong>{quote_id}</strong> correspondiente al proyecto <strong>{project_name or 'su proyecto'}</strong>.</p>
+
+        <p>Puede ver la cotización en línea aquí:</p>
+
+        <p>
+            <a href="https://metprord.site/q/{quote_id}"
+               style="display:inline-block;padding:12px 20px;background:#0052cc;color:white;
+                      text-decoration:none;border-radius:6px;font-weight:bold;font-size:15px;">
+                Ver Cotización en Línea
+            </a>
+        </p>
+
+        <p>Quedamos a su disposición para cualquier consulta.</p>
+        <br/>
+        <p>Atentamente,<br/>Equipo METPRO</p>
+    """
+
+
+def timed(label, count, fn):
+    started = time.perf_counter()
+    for _ in range(count):
+        fn()
+    per_call = (time.perf_counter() - started) / count * 1e6
+    print(f"{label:<34}{per_call:>10.1f} us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Email template rendering microbenchmark")
+    parser.add_argument("--count", type=int, default=10000)
+    parser.add_argument("--rows", type=int, default=10, help="invoices per reminder statement")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    templates = compile_templates()
+    print(f"compile     : {templates} templates in {(time.perf_counter() - started) * 1000:.2f} ms")
+
+    quote = get_template("quote")
+    values = {
+        "contact_name": "Ana <Pérez> & Asociados",
+        "number": "Q-2026-000123",
+        "project_name": "Nave industrial",
+        "title": "Nave industrial",
+        "public_url": "https://metprord.site/q/Q-2026-000123",
+    }
+    invoices = [
+        {"id": n, "number": f"INV-2026-{n:06d}", "date": "01/09/2026", "days_overdue": 15,
+         "amount_due": Decimal("1234.50") + n}
+        for n in range(args.rows)
+    ]
+
+    timed("legacy f-string quote (no escaping)", args.count,
+          lambda: legacy_quote_html(values["contact_name"], values["project_name"], values["number"]))
+    timed("registry quote (subject + html)", args.count, lambda: quote.render(**values))
+    timed(f"registry reminder ({args.rows} rows)", args.count,
+          lambda: render_reminder_email("Ana", "Constructora <X>", invoices, Decimal("99999.99"),
+                                        "https://metprord.site"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Stress test: document number allocation under parallel load.
+
+Starts --processes worker processes with --threads threads each; every
+thread allocates --count quote numbers through documents.numbering as fast
+as it can (a duplicate storm). The parent collects all numbers and fails
+(exit code 1) if any number was handed out twice.
+
+For comparison, --legacy runs the same load against the old
+timestamp-based generator (Q-%Y%m%d%H%M%S), which collides as soon as two
+numbers are taken within the same second.
+
+Needs DATABASE_URL pointing at a database with schema.sql applied (the
+sequences are used for real; the numbers consumed are simply skipped).
+
+    python benchmarks/bench_numbering.py
+    python benchmarks/bench_numbering.py --processes 8 --threads 16 --count 500
+    python benchmarks/bench_numbering.py --legacy
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _legacy_number() -> str:
+    return f"Q-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+
+
+def _worker(args) -> tuple:
+    threads, count, legacy = args
+    from documents.numbering import quote_numbers
+
+    allocate = _legacy_number if legacy else quote_numbers.next_number
+
+    def run(_):
+        return [allocate() for _ in range(count)]
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        numbers = [n for batch in pool.map(run, range(threads)) for n in batch]
+    return numbers, time.perf_counter() - started, quote_numbers.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--count", type=int, default=250, help="numbers per thread")
+    parser.add_argument("--legacy", action="store_true", help="use the old timestamp generator")
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context("spawn")
+    started = time.perf_counter()
+    with ctx.Pool(args.processes) as pool:
+        results = pool.map(_worker, [(args.threads, args.count, args.legacy)] * args.processes)
+    elapsed = time.perf_counter() - started
+
+    numbers = [n for batch, _, _ in results for n in batch]
+    duplicates = {n: c for n, c in Counter(numbers).items() if c > 1}
+    blocks = sum(stats["blocks_reserved"] for _, _, stats in results)
+
+    print(f"generator   : {'legacy timestamp' if args.legacy else 'sequence blocks'}")
+    print(f"load        : {args.processes} processes x {args.threads} threads x {args.count}")
+    print(f"allocated   : {len(numbers)} numbers in {elapsed:.2f}s "
+          f"({len(numbers) / elapsed:,.0f}/s incl. process start)")
+    if not args.legacy:
+        print(f"db round trips: {blocks} block reservations")
+        print(f"sample      : {min(numbers)} .. {max(numbers)}")
+    print(f"unique      : {len(set(numbers))}")
+    print(f"duplicates  : {len(duplicates)}")
+
+    if duplicates:
+        sample = ", ".join(f"{n} x{c}" for n, c in list(duplicates.items())[:5])
+        print(f"FAIL: duplicate numbers ({sample})")
+        sys.exit(1)
+    print("OK: no duplicates")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Microbenchmark: per-document cost of fonts/logo with and without the PDF
+asset registry (pdf/assets.py).
+
+Renders a sample quote through the real layout (pdf.builder_quote.render_quote_document)
+once with the registry and once with the registry bypassed, i.e. with the
+old per-document pdf.add_font / pdf.image calls. No database is needed.
+
+    python benchmarks/bench_pdf_assets.py
+    python benchmarks/bench_pdf_assets.py --docs 200 --lines 20
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from documents.model import quote_document
+from pdf import assets
+from pdf.builder_quote import render_quote_document
+
+
+def sample_quote(lines):
+    return {
+        "quote_id": "Q-BENCH",
+        "company_name": "Constructora Ejemplo SRL",
+        "company_address": "Av. Principal 123, Santo Domingo",
+        "company_tax_id": "1-01-00000-1",
+        "contact_name": "Ana Perez",
+        "contact_email": "ana@example.com",
+        "contact_phone": "809-555-0100",
+        "project_name": "Nave industrial",
+        "notes": "Precios sujetos a cambio.",
+        "payment_terms": "50% anticipo",
+        "valid_until": "2026-12-31",
+        "created_at": "2026-10-01T10:00:00",
+        "included_charges": {},
+        "items": [
+            {"product_name": f"Viga W8x{i}", "quantity": 1 + i % 5, "unit_price": 125.5 + i,
+             "discount_type": "none", "discount_value": 0}
+            for i in range(lines)
+        ],
+    }
+
+
+def legacy_add_font(pdf, family, path=assets.SIGNATURE_FONT_PATH, style=""):
+    try:
+        pdf.add_font(family, style, path)
+        return True
+    except Exception:
+        return False
+
+
+def legacy_image(pdf, path=assets.LOGO_PATH, **kwargs):
+    return pdf.image(path, **kwargs)
+
+
+def run(docs, doc):
+    timings = []
+    for _ in range(docs):
+        started = time.perf_counter()
+        render_quote_document(doc)
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), statistics.mean(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PDF asset registry microbenchmark")
+    parser.add_argument("--docs", type=int, default=100)
+    parser.add_argument("--lines", type=int, default=10)
+    args = parser.parse_args()
+
+    doc = quote_document(sample_quote(args.lines))
+
+    registry_add_font, registry_image = assets.add_font, assets.image
+    try:
+        assets.add_font, assets.image = legacy_add_font, legacy_image
+        render_quote_document(doc)  # warm imports
+        legacy_median, legacy_mean = run(args.docs, doc)
+    finally:
+        assets.add_font, assets.image = registry_add_font, registry_image
+
+    started = time.perf_counter()
+    assets.preload()
+    preload_ms = (time.perf_counter() - started) * 1000
+    registry_median, registry_mean = run(args.docs, doc)
+
+    print(f"documents: {args.docs}, lines per document: {args.lines}")
+    print(f"per-document (legacy)   median {legacy_median:7.2f} ms   mean {legacy_mean:7.2f} ms")
+    print(f"per-document (registry) median {registry_median:7.2f} ms   mean {registry_mean:7.2f} ms")
+    print(f"saving per document     {legacy_median - registry_median:7.2f} ms "
+          f"({(1 - registry_median / legacy_median) * 100:.0f}%)")
+    print(f"one-time preload        {preload_ms:7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Benchmark: rendering very large quotes (10 / 1k / 10k lines).
+
+For each size it reports the render time, page count and PDF size, and the
+Python memory of the API process (peak, and still held once the response
+body has been produced) when serving the PDF two ways:
+
+- buffered: PdfCache.get_or_render() with the pool returns the bytes, which
+  are sent in one piece (pdf_response below PDF_STREAM_MIN_LINES);
+- streamed: PdfCache.open_or_render() has the worker write the PDF into the
+  disk tier, which is read back in PDF_STREAM_CHUNK_KB chunks (pdf_response
+  at or above the threshold).
+
+The render itself runs in a one-worker process pool, as in production, so
+the memory figures are the API side only; fpdf2 still assembles each
+document in memory inside the worker. The peak of both modes is dominated by
+pickling the Document for the worker, which grows with the line count; what
+streaming removes is the PDF body itself (held in full when buffered, one
+chunk at a time when streamed). No database is needed.
+
+    python benchmarks/bench_pdf_large.py
+    python benchmarks/bench_pdf_large.py --sizes 10 1000 10000 20000
+"""
+import argparse
+import os
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_pdf_assets import sample_quote
+from documents.model import quote_document
+from pdf.builder_quote import render_quote_document
+from pdf.cache import PdfCache
+from pdf.executor import PDF_STREAM_CHUNK_KB, RenderExecutor, _iter_file
+
+
+def page_count(data: bytes) -> int:
+    return len(re.findall(rb"/Type /Page\b", data))
+
+
+def measure(fn):
+    """Run fn() under tracemalloc; returns (result, seconds, peak bytes, bytes still held)."""
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - started
+    held, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak, held
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Large document PDF benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1000, 10000])
+    args = parser.parse_args()
+
+    executor = RenderExecutor(workers=1, max_pending=4, queue_wait=5, timeout=600)
+    executor.render(render_quote_document, quote_document(sample_quote(1)))  # start the worker
+
+    print(f"{'lines':>7} {'pages':>6} {'size KB':>9} {'render s':>9} "
+          f"{'buffered peak/held KB':>22} {'streamed peak/held KB':>22}")
+    try:
+        for lines in args.sizes:
+            doc = quote_document(sample_quote(lines))
+
+            with tempfile.TemporaryDirectory() as directory:
+                cache = PdfCache(directory, memory_bytes=1 << 30, disk_bytes=1 << 30)
+
+                def buffered():
+                    return cache.get_or_render("quote:bench", doc, render_quote_document, run=executor.render)
+
+                data, render_seconds, buffered_peak, buffered_held = measure(buffered)
+
+            with tempfile.TemporaryDirectory() as directory:
+                cache = PdfCache(directory, memory_bytes=1 << 30, disk_bytes=1 << 30)
+
+                def streamed():
+                    f = cache.open_or_render("quote:bench", doc, render_quote_document,
+                                             run_to_file=executor.render_to_file)
+                    return sum(len(chunk) for chunk in _iter_file(f, PDF_STREAM_CHUNK_KB * 1024))
+
+                streamed_size, _, streamed_peak, streamed_held = measure(streamed)
+
+            assert streamed_size == len(data)
+            print(f"{lines:>7} {page_count(data):>6} {len(data) / 1024:>9.1f} {render_seconds:>9.2f} "
+                  f"{buffered_peak / 1024:>12.1f} / {buffered_held / 1024:>7.1f} "
+                  f"{streamed_peak / 1024:>12.1f} / {streamed_held / 1024:>7.1f}")
+    finally:
+        executor.shutdown()
+
+
+if __name__ == "__main__":
+    main()
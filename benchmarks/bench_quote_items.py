@@ -0,0 +1,130 @@
+"""
+Benchmark: time to save a quote as its line count grows.
+
+Compares the previous one-INSERT-per-item loop against the batched path
+used by quotes.service (multi-row INSERT via execute_values), plus the
+server-side INSERT ... SELECT used when duplicating a quote.
+
+Runs against the database in DATABASE_URL inside a transaction that is
+rolled back, so nothing is left behind:
+
+    DATABASE_URL=postgresql://... python benchmarks/bench_quote_items.py
+    DATABASE_URL=postgresql://... python benchmarks/bench_quote_items.py --lines 10 200 800 --repeat 5
+
+Round-trip latency dominates the loop variant, so numbers against a remote
+database (e.g. Supabase) are far larger than against a local socket.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+from quotes.service import _insert_quote_items
+
+
+def make_items(n):
+    return [
+        {
+            "product_name": f"Item {i}",
+            "quantity": 1 + i % 7,
+            "unit_price": 100.0 + i,
+            "discount_type": "none",
+            "discount_value": 0.0,
+        }
+        for i in range(n)
+    ]
+
+
+def insert_loop(cursor, quote_id, items):
+    for item in items:
+        cursor.execute("""
+            INSERT INTO quote_items
+                (quote_id, product_name, quantity, unit_price, discount_type, discount_value)
+            VALUES (%s, %s, %s, %s, %s, %s)
+        """, (
+            quote_id,
+            item["product_name"],
+            item["quantity"],
+            item["unit_price"],
+            item.get("discount_type", "none"),
+            item.get("discount_value", 0.0),
+        ))
+
+
+def insert_select(cursor, quote_id, source_quote_id):
+    cursor.execute("""
+        INSERT INTO quote_items
+            (quote_id, product_name, quantity, unit_price, discount_type, discount_value)
+        SELECT %s, product_name, quantity, unit_price,
+               COALESCE(discount_type, 'none'), COALESCE(discount_value, 0)
+        FROM quote_items
+        WHERE quote_id = %s
+        ORDER BY id
+    """, (quote_id, source_quote_id))
+
+
+def create_quote_row(cursor, quote_id, client_id):
+    cursor.execute("""
+        INSERT INTO quotes (quote_id, client_id, status, included_charges, total_amount)
+        VALUES (%s, %s, 'Draft', '{}', 0)
+    """, (quote_id, client_id))
+
+
+def timed(fn):
+    started = time.perf_counter()
+    fn()
+    return (time.perf_counter() - started) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--lines", type=int, nargs="+", default=[10, 50, 100, 200, 400, 800])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    dsn = os.getenv("DATABASE_URL")
+    if not dsn:
+        sys.exit("DATABASE_URL is not set")
+
+    conn = psycopg2.connect(dsn)
+    try:
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        cursor.execute("""
+            INSERT INTO clients (company_name) VALUES ('__bench_quote_items__')
+            RETURNING id
+        """)
+        client_id = cursor.fetchone()["id"]
+
+        print(f"{'lines':>6} {'loop ms':>10} {'batched ms':>11} {'insert-select ms':>17} {'speedup':>8}")
+        seq = 0
+        for n in args.lines:
+            items = make_items(n)
+            loop_ms, batch_ms, copy_ms = [], [], []
+            for _ in range(args.repeat):
+                seq += 1
+                loop_id, batch_id, copy_id = (f"BENCH-L{seq}", f"BENCH-B{seq}", f"BENCH-C{seq}")
+                for qid in (loop_id, batch_id, copy_id):
+                    create_quote_row(cursor, qid, client_id)
+
+                loop_ms.append(timed(lambda: insert_loop(cursor, loop_id, items)))
+                batch_ms.append(timed(lambda: _insert_quote_items(cursor, batch_id, items)))
+                copy_ms.append(timed(lambda: insert_select(cursor, copy_id, batch_id)))
+
+            loop_med = statistics.median(loop_ms)
+            batch_med = statistics.median(batch_ms)
+            copy_med = statistics.median(copy_ms)
+            print(f"{n:>6} {loop_med:>10.2f} {batch_med:>11.2f} {copy_med:>17.2f} "
+                  f"{loop_med / batch_med if batch_med else 0:>7.1f}x")
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
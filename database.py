@@ -1,11 +1,14 @@
 import os
-import psycopg2
+import threading
+from typing import Optional
 from psycopg2.extras import RealDictCursor
 from dotenv import load_dotenv
 
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 
+from db_pool import ConnectionPool
+
 # Always load .env from the backend folder
 load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), ".env"))
 
@@ -25,21 +28,160 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
 
+# ============================================================
+# PSYCOPG2 CONNECTION POOL
+# One bounded pool per process, created on first use.
+# ============================================================
+
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+DB_POOL_MAX_IDLE = float(os.getenv("DB_POOL_MAX_IDLE", "300"))
+DB_POOL_MAX_LIFETIME = float(os.getenv("DB_POOL_MAX_LIFETIME", "1800"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_CHECK_AFTER = float(os.getenv("DB_POOL_CHECK_AFTER", "30"))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    DATABASE_URL,
+                    min_size=DB_POOL_MIN_SIZE,
+                    max_size=DB_POOL_MAX_SIZE,
+                    max_idle=DB_POOL_MAX_IDLE,
+                    max_lifetime=DB_POOL_MAX_LIFETIME,
+                    timeout=DB_POOL_TIMEOUT,
+                    check_after=DB_POOL_CHECK_AFTER,
+                    cursor_factory=RealDictCursor,
+                )
+    return _pool
+
+
+def open_pool():
+    """Create the pool and pre-open min_size connections (app startup)."""
+    try:
+        get_pool().warm()
+    except Exception as e:
+        print(f"Database pool warm-up failed: {e}")
+
+
+def close_pool():
+    """Close idle pooled connections (app shutdown)."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.close()
+
+
+def get_pool_stats() -> dict:
+    if _pool is None:
+        return {"size": 0, "in_use": 0, "idle": 0, "max_size": DB_POOL_MAX_SIZE}
+    return _pool.stats()
+
+
+# ============================================================
+# REQUEST-SCOPED UNIT OF WORK
+# One connection and one transaction per HTTP request.
+# ============================================================
+
+class UnitOfWork:
+    """
+    Shares a single pooled connection between every service call made
+    while handling one request. The connection is checked out lazily and
+    the transaction is committed (or rolled back) once, at the end.
+    """
+
+    def __init__(self):
+        self._conn = None
+        self._after_commit = []
+
+    @property
+    def connection(self):
+        if self._conn is None:
+            self._conn = get_pool().getconn()
+        return self._conn
+
+    def after_commit(self, callback):
+        """Run ``callback()`` once the transaction commits; dropped on rollback."""
+        self._after_commit.append(callback)
+
+    def commit(self):
+        if self._conn is not None:
+            self._conn.commit()
+        callbacks, self._after_commit = self._after_commit, []
+        for callback in callbacks:
+            callback()
+
+    def rollback(self):
+        self._after_commit = []
+        if self._conn is not None:
+            self._conn.rollback()
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+class _SharedConnection:
+    """
+    Connection handle given to service code running inside a UnitOfWork.
+    commit() and close() are deferred to the unit of work; everything
+    else goes straight to the underlying psycopg2 connection.
+    """
+
+    def __init__(self, uow: UnitOfWork):
+        self._uow = uow
+
+    def __getattr__(self, name):
+        return getattr(self._uow.connection, name)
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def get_unit_of_work():
+    """
+    FastAPI dependency yielding a UnitOfWork.
+    Commits when the endpoint returns, rolls back if it raises.
+    """
+    uow = UnitOfWork()
+    try:
+        yield uow
+        uow.commit()
+    except Exception:
+        uow.rollback()
+        raise
+    finally:
+        uow.close()
+
+
 # ============================================================
 # LEGACY FUNCTION (kept for backward compatibility)
 # Many routers still depend on this.
 # ============================================================
 
-def get_db_connection():
+def get_db_connection(uow: Optional[UnitOfWork] = None):
     """
     Legacy connection function used by older modules.
-    Returns a psycopg2 connection WITHOUT context manager.
+    Returns a pooled psycopg2 connection WITHOUT context manager.
+    Calling close() hands it back to the pool.
+
+    When a UnitOfWork is passed, returns its shared connection instead;
+    commit() and close() on it are then handled by the unit of work.
     """
-    conn = psycopg2.connect(
-        DATABASE_URL,
-        cursor_factory=RealDictCursor
-    )
-    return conn
+    if uow is not None:
+        return _SharedConnection(uow)
+    return get_pool().getconn()
 
 
 # ============================================================
@@ -56,4 +198,4 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
@@ -0,0 +1,317 @@
+"""
+Process-wide bounded pool of psycopg2 connections.
+
+database.get_db_connection() hands out connections from this pool. Calling
+close() on a pooled connection checks it back in instead of tearing down the
+TCP/TLS session, so existing call sites (try / finally: conn.close()) keep
+working unchanged. close() is idempotent, and a connection that is garbage
+collected while still checked out (close() never called) gives its slot back
+to the pool instead of shrinking it for good.
+"""
+import threading
+import time
+import weakref
+
+import psycopg2
+from psycopg2 import extensions
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes available within the pool timeout."""
+
+
+class PooledConnection(extensions.connection):
+    """psycopg2 connection whose close() returns it to the owning pool."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._pool = None
+        self._created_at = time.monotonic()
+        self._returned_at = self._created_at
+        self._returned = False
+        self._finalizer = None
+
+    def close(self):
+        if self._returned:
+            # Already checked in: the session may belong to someone else by now.
+            return
+        pool = self._pool
+        if pool is None:
+            super().close()
+        else:
+            pool.putconn(self)
+
+    def discard(self):
+        """Close the underlying session for good, bypassing the pool."""
+        self._pool = None
+        if not self.closed:
+            super().close()
+
+
+class ConnectionPool:
+    """
+    Thread-safe bounded connection pool.
+
+    - At most ``max_size`` connections exist at once; callers block for up to
+      ``timeout`` seconds when all of them are checked out.
+    - Idle connections beyond ``min_size`` are recycled after ``max_idle``
+      seconds, and every connection is recycled after ``max_lifetime``.
+    - Connections idle longer than ``check_after`` seconds are pinged with
+      ``SELECT 1`` on checkout; dead ones are replaced transparently.
+    """
+
+    def __init__(self, dsn, min_size=1, max_size=10, max_idle=300.0,
+                 max_lifetime=1800.0, timeout=30.0, check_after=30.0,
+                 **connect_kwargs):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError("Invalid pool size: need 0 <= min_size <= max_size, max_size >= 1")
+
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.timeout = timeout
+        self.check_after = check_after
+        self._connect_kwargs = connect_kwargs
+
+        self._cond = threading.Condition()
+        self._idle = []          # LIFO stack of idle connections
+        self._size = 0           # connections currently open (idle + in use)
+        self._waiting = 0
+        self._closed = False
+
+        self._checkouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._timeouts = 0
+        self._created = 0
+        self._discarded = 0
+        self._failed_checks = 0
+        self._leaked = 0
+
+    # ------------------------------------------------------------------
+    # CHECKOUT / CHECKIN
+    # ------------------------------------------------------------------
+    def getconn(self) -> PooledConnection:
+        started = time.monotonic()
+        deadline = started + self.timeout
+
+        while True:
+            conn = None
+            must_create = False
+
+            with self._cond:
+                if self._closed:
+                    raise PoolTimeout("Connection pool is closed")
+
+                self._waiting += 1
+                try:
+                    while True:
+                        self._prune_idle_locked()
+                        if self._idle:
+                            conn = self._idle.pop()
+                            break
+                        if self._size < self.max_size:
+                            self._size += 1
+                            must_create = True
+                            break
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self._timeouts += 1
+                            raise PoolTimeout(
+                                f"No database connection available after {self.timeout:.1f}s "
+                                f"(max_size={self.max_size})"
+                            )
+                        self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+
+            if must_create:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+            elif not self._is_healthy(conn):
+                self._drop(conn)
+                continue
+
+            waited = time.monotonic() - started
+            with self._cond:
+                self._checkouts += 1
+                self._wait_total += waited
+                self._wait_max = max(self._wait_max, waited)
+
+            conn._pool = self
+            conn._returned = False
+            # Reclaim the slot if the caller drops the connection without close().
+            conn._finalizer = weakref.finalize(conn, self._reclaim)
+            conn._finalizer.atexit = False
+            return conn
+
+    def putconn(self, conn: PooledConnection):
+        """Return a connection, rolling back any transaction left open."""
+        if conn._returned:
+            return
+        conn._returned = True
+        conn._pool = None
+        if conn._finalizer is not None:
+            conn._finalizer.detach()
+            conn._finalizer = None
+
+        if not conn.closed:
+            try:
+                status = conn.info.transaction_status
+                if status != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+                if conn.autocommit:
+                    conn.autocommit = False
+            except Exception:
+                pass
+
+        now = time.monotonic()
+        reusable = (
+            not self._closed
+            and not conn.closed
+            and conn.info.transaction_status == extensions.TRANSACTION_STATUS_IDLE
+            and now - conn._created_at < self.max_lifetime
+        )
+
+        if not reusable:
+            self._drop(conn)
+            return
+
+        conn._returned_at = now
+        with self._cond:
+            self._idle.append(conn)
+            self._cond.notify()
+
+    def warm(self):
+        """Open connections up to min_size so the first requests skip the handshake."""
+        conns = []
+        try:
+            while True:
+                with self._cond:
+                    if self._size >= self.min_size or self._closed:
+                        break
+                    self._size += 1
+                try:
+                    conns.append(self._connect())
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                    raise
+        finally:
+            for conn in conns:
+                self.putconn(conn)
+
+    def close(self):
+        """Close every idle connection; in-use ones are closed on checkin."""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._discarded += len(idle)
+            self._cond.notify_all()
+        for conn in idle:
+            conn.discard()
+
+    # ------------------------------------------------------------------
+    # STATS
+    # ------------------------------------------------------------------
+    def stats(self) -> dict:
+        with self._cond:
+            idle = len(self._idle)
+            return {
+                "size": self._size,
+                "in_use": self._size - idle,
+                "idle": idle,
+                "waiting": self._waiting,
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "checkouts": self._checkouts,
+                "wait_avg_ms": round(self._wait_total / self._checkouts * 1000, 3) if self._checkouts else 0.0,
+                "wait_max_ms": round(self._wait_max * 1000, 3),
+                "timeouts": self._timeouts,
+                "connections_created": self._created,
+                "connections_discarded": self._discarded,
+                "failed_health_checks": self._failed_checks,
+                "leaked_connections": self._leaked,
+            }
+
+    # ------------------------------------------------------------------
+    # INTERNALS
+    # ------------------------------------------------------------------
+    def _connect(self) -> PooledConnection:
+        conn = psycopg2.connect(
+            self.dsn,
+            connection_factory=PooledConnection,
+            **self._connect_kwargs
+        )
+        with self._cond:
+            self._created += 1
+        return conn
+
+    def _is_healthy(self, conn: PooledConnection) -> bool:
+        if conn.closed:
+            return False
+        now = time.monotonic()
+        if now - conn._created_at >= self.max_lifetime:
+            return False
+        if now - conn._returned_at < self.check_after:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception:
+            with self._cond:
+                self._failed_checks += 1
+            return False
+
+    def _drop(self, conn: PooledConnection):
+        try:
+            conn.discard()
+        except Exception:
+            pass
+        with self._cond:
+            self._size -= 1
+            self._discarded += 1
+            self._cond.notify()
+
+    def _reclaim(self):
+        """Finalizer of a checked-out connection collected without close()."""
+        with self._cond:
+            self._size -= 1
+            self._leaked += 1
+            self._cond.notify()
+        print("WARNING: pooled database connection was garbage collected without close()")
+
+    def _prune_idle_locked(self):
+        """Close idle connections past max_idle while staying above min_size."""
+        if not self._idle:
+            return
+        now = time.monotonic()
+        keep = []
+        expired = []
+        # Oldest idle connections sit at the bottom of the LIFO stack.
+        for conn in self._idle:
+            surplus = self._size - len(expired) > self.min_size
+            if surplus and now - conn._returned_at >= self.max_idle:
+                expired.append(conn)
+            else:
+                keep.append(conn)
+        if not expired:
+            return
+        self._idle = keep
+        self._size -= len(expired)
+        self._discarded += len(expired)
+        for conn in expired:
+            try:
+                conn.discard()
+            except Exception:
+                pass
@@ -0,0 +1,17 @@
+from .loader import (
+    load_quote_document,
+    load_quote_document_async,
+    load_invoice_document,
+    load_invoice_document_async,
+)
+from .model import Document, quote_document, invoice_document
+
+__all__ = [
+    'load_quote_document',
+    'load_quote_document_async',
+    'load_invoice_document',
+    'load_invoice_document_async',
+    'Document',
+    'quote_document',
+    'invoice_document',
+]
@@ -0,0 +1,224 @@
+"""
+Single-round-trip loaders for quote and invoice documents.
+
+Each loader fetches the header, client, contact, line items (and, for
+invoices, the source quote's charges and the payment history) in ONE SQL
+statement, aggregating child rows with json_agg in LATERAL subqueries.
+The aggregates are read as JSON text and parsed here with NUMERIC values as
+Decimal and dates as date (_children), so items and payments have the same
+types as a plain SELECT of those tables. PDF generation, public views and email sending all hydrate through here.
+documents.model turns these rows into the typed Document the PDF renderers use.
+"""
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Iterator, List, Optional
+
+from fastapi import HTTPException
+from psycopg2.extras import RealDictCursor
+
+from database import get_db_connection, UnitOfWork
+from async_database import fetch_one
+from utils.totals import parse_totals
+
+
+QUOTE_DOCUMENT_SELECT = """
+    SELECT
+        q.quote_id,
+        q.client_id,
+        q.contact_id,
+        q.project_name,
+        q.notes,
+        q.status,
+        q.included_charges,
+        q.total_amount,
+        q.totals,
+        q.payment_terms,
+        q.valid_until,
+        q.created_at,
+        q.updated_at,
+
+        c.company_name,
+        c.address        AS company_address,
+        c.tax_id         AS company_tax_id,
+
+        ct.name          AS contact_name,
+        ct.email         AS contact_email,
+        ct.phone         AS contact_phone,
+
+        COALESCE(li.items, '[]'::json)::text AS items
+
+    FROM quotes q
+    JOIN clients c ON c.id = q.client_id
+    LEFT JOIN contacts ct ON ct.id = q.contact_id AND ct.company_id = q.client_id
+    LEFT JOIN LATERAL (
+        SELECT json_agg(qi ORDER BY qi.id) AS items
+        FROM quote_items qi
+        WHERE qi.quote_id = q.quote_id
+    ) li ON TRUE
+"""
+
+QUOTE_DOCUMENT_SQL = QUOTE_DOCUMENT_SELECT + "WHERE q.quote_id = %s"
+
+
+INVOICE_DOCUMENT_SELECT = """
+    SELECT
+        i.id,
+        i.quote_id,
+        i.invoice_number,
+        i.ncf,
+        i.ncf_type,
+        i.invoice_date,
+        i.client_id,
+        i.contact_id,
+        i.total_amount,
+        COALESCE(i.amount_paid, 0) AS amount_paid,
+        COALESCE(i.amount_due, i.total_amount) AS amount_due,
+        i.status,
+        i.notes,
+        i.created_at,
+        i.updated_at,
+
+        c.company_name,
+        c.address        AS company_address,
+        c.tax_id         AS company_tax_id,
+
+        ct.name          AS contact_name,
+        ct.email         AS contact_email,
+        ct.phone         AS contact_phone,
+
+        q.project_name,
+        q.payment_terms,
+        q.valid_until,
+        COALESCE(q.included_charges, '{}'::jsonb) AS included_charges,
+        q.totals,
+
+        COALESCE(li.items, '[]'::json)::text    AS items,
+        COALESCE(pm.payments, '[]'::json)::text AS payments
+
+    FROM invoices i
+    JOIN clients c ON c.id = i.client_id
+    LEFT JOIN contacts ct ON ct.id = i.contact_id
+    LEFT JOIN quotes q ON TRIM(q.quote_id) = TRIM(i.quote_id)
+    LEFT JOIN LATERAL (
+        SELECT json_agg(qi ORDER BY qi.id) AS items
+        FROM quote_items qi
+        WHERE qi.quote_id = q.quote_id
+    ) li ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT json_agg(p ORDER BY p.id) AS payments
+        FROM invoice_payments p
+        WHERE p.invoice_id = i.id
+    ) pm ON TRUE
+"""
+
+INVOICE_DOCUMENT_SQL = INVOICE_DOCUMENT_SELECT + "WHERE i.id = %s"
+
+
+# json_agg renders DATE / TIMESTAMP columns as ISO strings.
+_DATE_FIELDS = ("payment_date",)
+_TIMESTAMP_FIELDS = ("created_at", "updated_at")
+
+
+def _children(value) -> List[dict]:
+    """json_agg text -> rows, with NUMERIC as Decimal (scale kept) and dates as date/datetime."""
+    if not value:
+        return []
+    rows = json.loads(value, parse_float=Decimal) if isinstance(value, str) else value
+    for row in rows:
+        for key in _DATE_FIELDS:
+            if isinstance(row.get(key), str):
+                row[key] = date.fromisoformat(row[key])
+        for key in _TIMESTAMP_FIELDS:
+            if isinstance(row.get(key), str):
+                row[key] = datetime.fromisoformat(row[key])
+    return rows
+
+
+def _normalize(row: Optional[dict], not_found: str) -> dict:
+    if not row:
+        raise HTTPException(status_code=404, detail=not_found)
+
+    doc = dict(row)
+    doc["items"] = _children(doc.get("items"))
+    if "payments" in doc:
+        doc["payments"] = _children(doc["payments"])
+    charges = doc.get("included_charges")
+    if isinstance(charges, str):
+        try:
+            charges = json.loads(charges)
+        except Exception:
+            charges = {}
+    doc["included_charges"] = charges or {}
+    doc["totals"] = parse_totals(doc.get("totals"))
+    return doc
+
+
+# ============================================================
+# QUOTES
+# ============================================================
+def load_quote_document(quote_id: str, uow: Optional[UnitOfWork] = None) -> dict:
+    """Quote header + client + contact + items, in one round trip."""
+    conn = None
+    try:
+        conn = get_db_connection(uow)
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        cursor.execute(QUOTE_DOCUMENT_SQL, (quote_id,))
+        return _normalize(cursor.fetchone(), "Quote not found")
+    finally:
+        if conn:
+            conn.close()
+
+
+async def load_quote_document_async(quote_id: str) -> dict:
+    return _normalize(await fetch_one(QUOTE_DOCUMENT_SQL, (quote_id,)), "Quote not found")
+
+
+# ============================================================
+# INVOICES
+# ============================================================
+def load_invoice_document(invoice_id: int, uow: Optional[UnitOfWork] = None) -> dict:
+    """Invoice header + client + contact + quote charges + items + payments, in one round trip."""
+    conn = None
+    try:
+        conn = get_db_connection(uow)
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        cursor.execute(INVOICE_DOCUMENT_SQL, (invoice_id,))
+        return _normalize(cursor.fetchone(), "Invoice not found")
+    finally:
+        if conn:
+            conn.close()
+
+
+async def load_invoice_document_async(invoice_id: int) -> dict:
+    return _normalize(await fetch_one(INVOICE_DOCUMENT_SQL, (invoice_id,)), "Invoice not found")
+
+
+# ============================================================
+# BULK (server-side cursor)
+# ============================================================
+def _stream(conn, sql: str, params: tuple, itersize: int) -> Iterator[dict]:
+    cursor = conn.cursor(name="document_stream", cursor_factory=RealDictCursor)
+    cursor.itersize = itersize
+    try:
+        cursor.execute(sql, params)
+        for row in cursor:
+            yield _normalize(row, "Document not found")
+    finally:
+        cursor.close()
+
+
+def stream_quote_documents(conn, where: str, params: tuple, itersize: int = 100) -> Iterator[dict]:
+    """
+    Quote documents matching ``where`` (SQL over alias q), oldest first,
+    fetched ``itersize`` rows at a time. ``conn`` must be a dedicated
+    (non unit-of-work) connection kept open while iterating.
+    """
+    sql = f"{QUOTE_DOCUMENT_SELECT} WHERE {where} ORDER BY q.created_at, q.id"
+    return _stream(conn, sql, params, itersize)
+
+
+def stream_invoice_documents(conn, where: str, params: tuple, itersize: int = 100) -> Iterator[dict]:
+    """Invoice documents matching ``where`` (SQL over alias i); see stream_quote_documents."""
+    sql = f"{INVOICE_DOCUMENT_SELECT} WHERE {where} ORDER BY i.invoice_date, i.id"
+    return _stream(conn, sql, params, itersize)
@@ -0,0 +1,251 @@
+"""
+Typed, immutable document model consumed by the PDF renderers.
+
+The loaders return raw rows (dicts straight from SQL); quote_document() and
+invoice_document() turn such a row into a Document exactly once: client and
+contact fields are mapped, numbers coerced, dates formatted and totals
+computed. Renderers only read a Document, never the raw row.
+
+All classes are frozen slotted dataclasses holding tuples and scalars, so a
+Document is hashable, cheap to pickle into the render pool and hashes
+deterministically into the PDF cache key (pdf.cache.document_key).
+Money is Decimal, computed by utils.totals.
+"""
+from dataclasses import dataclass
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Tuple
+
+from utils.totals import calculate_totals, charge_percentage, line_amounts
+
+QUOTE = "COTIZACION"
+INVOICE = "FACTURA"
+
+# (key in included_charges, label printed on the PDF)
+CHARGES = (
+    ("supervision", "Supervision"),
+    ("admin", "Administracion"),
+    ("insurance", "Seguro"),
+    ("transport", "Transporte"),
+    ("contingency", "Contingencia"),
+)
+
+ZERO = Decimal("0.00")
+
+
+@dataclass(frozen=True, slots=True)
+class Header:
+    doc_type: str                     # QUOTE or INVOICE
+    number: str                       # quote_id / invoice_number
+    date: str                         # DD/MM/YYYY
+    project_name: str = ""
+    notes: str = ""
+    payment_terms: str = ""
+    valid_until: str = ""
+    ncf: str = ""                     # fiscal receipt number (invoices)
+    ncf_type: str = ""
+
+
+@dataclass(frozen=True, slots=True)
+class Party:
+    company_name: str
+    address: str = ""
+    tax_id: str = ""
+    contact_name: str = ""
+    email: str = ""
+    phone: str = ""
+
+
+@dataclass(frozen=True, slots=True)
+class Line:
+    product_name: str
+    quantity: Decimal
+    unit_price: Decimal
+    discount_type: str = "none"
+    discount_value: Decimal = ZERO
+
+    @property
+    def subtotal(self) -> Decimal:
+        return line_amounts(self.quantity, self.unit_price)[0]
+
+
+@dataclass(frozen=True, slots=True)
+class Charge:
+    """An included charge (only enabled charges are part of a Document)."""
+    key: str
+    label: str
+    percentage: Decimal
+    amount: Decimal
+
+
+@dataclass(frozen=True, slots=True)
+class Totals:
+    items_total: Decimal
+    total_discounts: Decimal
+    items_after_discount: Decimal
+    subtotal_general: Decimal
+    itbis: Decimal
+    grand_total: Decimal
+
+
+@dataclass(frozen=True, slots=True)
+class Payment:
+    date: str
+    method: str
+    amount: Decimal
+    notes: str = ""
+
+
+@dataclass(frozen=True, slots=True)
+class Document:
+    header: Header
+    party: Party
+    lines: Tuple[Line, ...]
+    charges: Tuple[Charge, ...]
+    totals: Totals
+    payments: Tuple[Payment, ...] = ()
+    amount_paid: Decimal = ZERO
+    amount_due: Decimal = ZERO
+
+    @property
+    def is_quote(self) -> bool:
+        return self.header.doc_type == QUOTE
+
+
+# ============================================================
+# HELPERS
+# ============================================================
+def _text(value) -> str:
+    return "" if value is None else str(value)
+
+
+def _number(value) -> Decimal:
+    """NUMERIC column / JSON number -> Decimal (JSON floats via str, no binary noise)."""
+    if value is None or value == "":
+        return ZERO
+    return value if isinstance(value, Decimal) else Decimal(str(value))
+
+
+def format_doc_date(value) -> str:
+    """datetime, date or ISO string -> DD/MM/YYYY ("" when empty)."""
+    if not value:
+        return ""
+    if isinstance(value, (datetime, date)):
+        return value.strftime("%d/%m/%Y")
+    text = str(value)
+    try:
+        return datetime.fromisoformat(text[:10]).strftime("%d/%m/%Y")
+    except ValueError:
+        return text
+
+
+def _party(row: dict) -> Party:
+    return Party(
+        company_name=_text(row.get("company_name")),
+        address=_text(row.get("company_address")),
+        tax_id=_text(row.get("company_tax_id")),
+        contact_name=_text(row.get("contact_name")),
+        email=_text(row.get("contact_email")),
+        phone=_text(row.get("contact_phone")),
+    )
+
+
+def _lines(items) -> Tuple[Line, ...]:
+    return tuple(
+        Line(
+            product_name=_text(item.get("product_name") or "Item"),
+            quantity=_number(item.get("quantity")),
+            unit_price=_number(item.get("unit_price")),
+            discount_type=_text(item.get("discount_type") or "none"),
+            discount_value=_number(item.get("discount_value")),
+        )
+        for item in items or []
+    )
+
+
+def _priced(row: dict) -> Tuple[Tuple[Charge, ...], Totals]:
+    charges = row.get("included_charges") or {}
+    # Persisted breakdown (quotes.totals) when present, else priced from the lines.
+    totals = row.get("totals") or calculate_totals(row.get("items") or [], charges)
+    enabled = tuple(
+        Charge(
+            key=key,
+            label=label,
+            percentage=charge_percentage(charges, key),
+            amount=totals[key],
+        )
+        for key, label in CHARGES
+        if charges.get(key)
+    )
+    return enabled, Totals(
+        items_total=totals["items_total"],
+        total_discounts=totals["total_discounts"],
+        items_after_discount=totals["items_after_discount"],
+        subtotal_general=totals["subtotal_general"],
+        itbis=totals["itbis"],
+        grand_total=totals["grand_total"],
+    )
+
+
+# ============================================================
+# BUILDERS
+# ============================================================
+def quote_document(row: dict) -> Document:
+    """Document for a quote row from documents.loader.load_quote_document*."""
+    charges, totals = _priced(row)
+    return Document(
+        header=Header(
+            doc_type=QUOTE,
+            number=_text(row["quote_id"]),
+            date=format_doc_date(row.get("created_at") or row.get("updated_at")),
+            project_name=_text(row.get("project_name")),
+            notes=_text(row.get("notes")),
+            payment_terms=_text(row.get("payment_terms")),
+            valid_until=format_doc_date(row.get("valid_until")),
+        ),
+        party=_party(row),
+        lines=_lines(row.get("items")),
+        charges=charges,
+        totals=totals,
+    )
+
+
+def invoice_document(row: dict) -> Document:
+    """Document for an invoice row from documents.loader.load_invoice_document*."""
+    charges, totals = _priced(row)
+    payments = tuple(
+        Payment(
+            date=_text(p.get("payment_date") or p.get("date"))[:20],
+            method=_text(p.get("method")),
+            amount=_number(p.get("amount")),
+            notes=_text(p.get("notes")),
+        )
+        for p in row.get("payments") or []
+    )
+
+    amount_paid = _number(row.get("amount_paid"))
+    amount_due = _number(row.get("amount_due"))
+    # Older invoices may not have amount_paid maintained; derive it from the payments.
+    if amount_paid == 0 and payments:
+        amount_paid = sum(p.amount for p in payments)
+        amount_due = _number(row.get("total_amount")) - amount_paid
+
+    return Document(
+        header=Header(
+            doc_type=INVOICE,
+            number=_text(row["invoice_number"]),
+            date=format_doc_date(row.get("invoice_date")),
+            project_name=_text(row.get("project_name")),
+            notes=_text(row.get("notes")),
+            payment_terms=_text(row.get("payment_terms")),
+            ncf=_text(row.get("ncf")),
+            ncf_type=_text(row.get("ncf_type")),
+        ),
+        party=_party(row),
+        lines=_lines(row.get("items")),
+        charges=charges,
+        totals=totals,
+        payments=payments,
+        amount_paid=amount_paid,
+        amount_due=amount_due,
+    )
@@ -0,0 +1,152 @@
+"""
+Document numbers for quotes and invoices (and the conduces derived from them).
+
+Numbers come from Postgres sequences, so they are unique across threads,
+worker processes and API instances. Every sequence is created with
+INCREMENT BY <block> (schema.sql): one nextval() reserves a whole block of
+numbers, which this process then hands out from memory. A process only
+touches the database once per block, so duplicate storms and bulk imports
+do not queue on the sequence.
+
+Blocks that are not used up (process restart) leave gaps; numbers are
+unique and increasing per process, not gap-free.
+
+Formats are str.format templates with {year} (current year) and {seq}:
+
+    QUOTE_NUMBER_FORMAT     Q-{year}-{seq:06d}    -> Q-2026-000123
+    INVOICE_NUMBER_FORMAT   INV-{year}-{seq:06d}  -> INV-2026-000123
+    CONDUCE_NUMBER_PREFIX   CD-
+
+A conduce is the delivery note of an invoice and is not stored, so its
+number is the invoice number with the invoice prefix swapped for
+CONDUCE_NUMBER_PREFIX (INV-2026-000123 -> CD-2026-000123).
+
+Fiscal NCF numbers (DGII) come from authorized ranges managed by
+invoices.ncf; format_ncf() and NCF_TYPES describe how they are printed.
+"""
+import os
+import threading
+from datetime import datetime
+from typing import Optional
+
+from database import get_db_connection
+
+QUOTE_NUMBER_FORMAT = os.getenv("QUOTE_NUMBER_FORMAT", "Q-{year}-{seq:06d}")
+INVOICE_NUMBER_FORMAT = os.getenv("INVOICE_NUMBER_FORMAT", "INV-{year}-{seq:06d}")
+CONDUCE_NUMBER_PREFIX = os.getenv("CONDUCE_NUMBER_PREFIX", "CD-")
+
+_BLOCK_SQL = """
+    SELECT nextval(%s) AS start,
+           (SELECT increment_by FROM pg_sequences
+            WHERE schemaname = current_schema() AND sequencename = %s) AS size
+"""
+
+
+class NumberAllocator:
+    """Hands out numbers from blocks reserved on ``sequence``; thread safe."""
+
+    def __init__(self, sequence: str, number_format: str):
+        self.sequence = sequence
+        self.number_format = number_format
+        self._lock = threading.Lock()
+        self._next = 0
+        self._limit = 0
+        self._pid = os.getpid()
+        self._blocks = 0
+        self._allocated = 0
+
+    def _reserve(self, cursor=None):
+        if cursor is not None:
+            cursor.execute(_BLOCK_SQL, (self.sequence, self.sequence))
+            row = cursor.fetchone()
+        else:
+            conn = None
+            try:
+                conn = get_db_connection()
+                cur = conn.cursor()
+                cur.execute(_BLOCK_SQL, (self.sequence, self.sequence))
+                row = cur.fetchone()
+                conn.commit()
+            finally:
+                if conn:
+                    conn.close()
+        start = row["start"] if isinstance(row, dict) else row[0]
+        size = row["size"] if isinstance(row, dict) else row[1]
+        self._next = start
+        self._limit = start + (size or 1)
+        self._blocks += 1
+
+    def next_value(self, cursor=None) -> int:
+        """
+        Next sequence value. ``cursor`` (optional) is used when a new block is
+        needed; nextval() is not transactional, so a rollback of the
+        caller's transaction does not hand the block out twice.
+        """
+        with self._lock:
+            # A forked child must not reuse the block it inherited from its parent.
+            if os.getpid() != self._pid:
+                self._pid = os.getpid()
+                self._next = self._limit = 0
+            if self._next >= self._limit:
+                self._reserve(cursor)
+            value = self._next
+            self._next += 1
+            self._allocated += 1
+            return value
+
+    def next_number(self, cursor=None, when: Optional[datetime] = None) -> str:
+        seq = self.next_value(cursor)
+        return self.number_format.format(year=(when or datetime.now()).year, seq=seq)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "sequence": self.sequence,
+                "blocks_reserved": self._blocks,
+                "allocated": self._allocated,
+                "left_in_block": self._limit - self._next,
+            }
+
+
+quote_numbers = NumberAllocator("quote_number_seq", QUOTE_NUMBER_FORMAT)
+invoice_numbers = NumberAllocator("invoice_number_seq", INVOICE_NUMBER_FORMAT)
+
+
+def _prefix(number_format: str) -> str:
+    return number_format.split("{", 1)[0]
+
+
+def next_quote_number(cursor=None) -> str:
+    return quote_numbers.next_number(cursor)
+
+
+def next_invoice_number(cursor=None) -> str:
+    return invoice_numbers.next_number(cursor)
+
+
+def conduce_number(invoice_number: str) -> str:
+    """Conduce number of an invoice (also maps legacy INV-<timestamp> numbers)."""
+    for prefix in (_prefix(INVOICE_NUMBER_FORMAT), "INV-"):
+        if prefix and invoice_number.startswith(prefix):
+            return CONDUCE_NUMBER_PREFIX + invoice_number[len(prefix):]
+    return CONDUCE_NUMBER_PREFIX + invoice_number
+
+
+# ============================================================
+# NCF (comprobantes fiscales)
+# ============================================================
+# DGII receipt types: B series (printed) and E series (e-CF).
+NCF_TYPES = {
+    "01": "Credito Fiscal",
+    "02": "Consumo",
+    "14": "Regimen Especial",
+    "15": "Gubernamental",
+    "31": "Credito Fiscal Electronica",
+    "32": "Consumo Electronica",
+}
+
+
+def format_ncf(series: str, ncf_type: str, number: int) -> str:
+    """B + 01 + 8 digits (B0100000001); the E series uses 10 digits."""
+    digits = 10 if series == "E" else 8
+    return f"{series}{ncf_type}{number:0{digits}d}"
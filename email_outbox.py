@@ -0,0 +1,546 @@
+"""
+Email outbox.
+
+Emails are not sent inside the HTTP request any more. enqueue_email() stores
+the message in email_outbox (attachments in email_outbox_attachments) and
+returns a job id right away; a pool of EMAIL_WORKERS background threads
+claims due rows with FOR UPDATE SKIP LOCKED and sends them through the
+configured transport. No database connection is held while the transport
+talks to the provider.
+
+- Retries: a failed send is retried after EMAIL_BACKOFF_SECONDS * 2^(attempt-1)
+  (capped at EMAIL_BACKOFF_MAX_SECONDS, +-20% jitter), up to
+  EMAIL_MAX_ATTEMPTS attempts. After the last one, or at once for errors a
+  retry cannot fix (validation, invalid API key), the row is dead-lettered:
+  status 'dead', kept for inspection and POST /emails/{job_id}/retry.
+- Transactions: given the request's UnitOfWork, enqueue_email() inserts
+  the outbox rows on its connection, so they commit (or roll back) together
+  with the caller's own writes (e.g. the quote status) and the workers are
+  woken only after that commit.
+- Idempotency: every message has an idempotency key, the caller's
+  Idempotency-Key header or a new one, stored as "<kind>:<reference>:<key>"
+  so the same header value sent for two documents does not collide.
+  Enqueueing the same key again returns the first job, and the key is passed on to Resend, so a send retried after
+  a timeout (or re-claimed after a worker died mid-send, EMAIL_LOCK_TIMEOUT_SECONDS)
+  is not delivered twice.
+
+Attachments are read from BYTEA as memoryviews and base64-encoded straight
+from that buffer into the request (encode_attachment), never expanded into a
+list of ints.
+
+Every call to the provider goes through call_email_provider(): a bulkhead
+(at most EMAIL_MAX_CONCURRENCY calls in flight, whoever makes them) and a
+circuit breaker that opens after EMAIL_BREAKER_FAILURES consecutive
+failures and probes again after EMAIL_BREAKER_RESET_SECONDS. Resend
+requests time out after EMAIL_TIMEOUT_SECONDS. While the circuit is open
+workers stop claiming, and a message that could not get through is put
+back without using up an attempt. State and latency are in /health.
+
+EMAIL_TRANSPORT=fake replaces Resend with FakeTransport, which only records
+the messages (tests, local development).
+"""
+import base64
+import os
+import random
+import threading
+import uuid
+from typing import Iterable, List, Optional, Tuple
+
+import resend
+from fastapi import HTTPException
+from psycopg2 import Binary
+from psycopg2.extras import Json, RealDictCursor, execute_values
+from resend import exceptions as resend_errors
+
+from database import UnitOfWork, get_db_connection
+from utils.resilience import Bulkhead, BulkheadFullError, CircuitBreaker, CircuitOpenError
+
+resend.api_key = os.getenv("RESEND_API_KEY")
+
+EMAIL_TRANSPORT = os.getenv("EMAIL_TRANSPORT", "resend").lower()
+EMAIL_WORKERS = int(os.getenv("EMAIL_WORKERS", "2"))
+EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", "6"))
+EMAIL_BACKOFF_SECONDS = float(os.getenv("EMAIL_BACKOFF_SECONDS", "30"))
+EMAIL_BACKOFF_MAX_SECONDS = float(os.getenv("EMAIL_BACKOFF_MAX_SECONDS", "3600"))
+EMAIL_POLL_SECONDS = float(os.getenv("EMAIL_POLL_SECONDS", "5"))
+EMAIL_LOCK_TIMEOUT_SECONDS = int(os.getenv("EMAIL_LOCK_TIMEOUT_SECONDS", "300"))
+EMAIL_TIMEOUT_SECONDS = float(os.getenv("EMAIL_TIMEOUT_SECONDS", "10"))
+EMAIL_MAX_CONCURRENCY = int(os.getenv("EMAIL_MAX_CONCURRENCY", "4"))
+EMAIL_BULKHEAD_WAIT_SECONDS = float(os.getenv("EMAIL_BULKHEAD_WAIT_SECONDS", "5"))
+EMAIL_BREAKER_FAILURES = int(os.getenv("EMAIL_BREAKER_FAILURES", "5"))
+EMAIL_BREAKER_RESET_SECONDS = float(os.getenv("EMAIL_BREAKER_RESET_SECONDS", "30"))
+
+# The SDK default is a 30 s timeout per request.
+resend.default_http_client = resend.RequestsClient(timeout=EMAIL_TIMEOUT_SECONDS)
+
+_JOB_COLUMNS = """
+    job_id, kind, reference, status, attempts, max_attempts,
+    params->'to' AS "to", params->>'subject' AS subject,
+    next_attempt_at, last_error, provider_id, created_at, sent_at
+"""
+
+_CLAIM_SQL = """
+    UPDATE email_outbox AS o
+    SET status = 'sending',
+        attempts = o.attempts + 1,
+        locked_at = CURRENT_TIMESTAMP,
+        updated_at = CURRENT_TIMESTAMP
+    FROM (
+        SELECT id FROM email_outbox
+        WHERE (status = 'pending' AND next_attempt_at <= CURRENT_TIMESTAMP)
+           OR (status = 'sending' AND locked_at < CURRENT_TIMESTAMP - %s * INTERVAL '1 second')
+        ORDER BY next_attempt_at, id
+        LIMIT 1
+        FOR UPDATE SKIP LOCKED
+    ) AS pick
+    WHERE o.id = pick.id
+    RETURNING o.id, o.job_id, o.idempotency_key, o.params, o.attempts, o.max_attempts
+"""
+
+
+# ============================================================
+# TRANSPORTS
+# ============================================================
+class PermanentEmailError(Exception):
+    """The message can never be sent as is; dead-letter it without retrying."""
+
+
+_PERMANENT_RESEND_ERRORS = (
+    resend_errors.ValidationError,
+    resend_errors.MissingRequiredFieldsError,
+    resend_errors.InvalidApiKeyError,
+    resend_errors.MissingApiKeyError,
+)
+
+
+def encode_attachment(filename: str, content) -> dict:
+    """Resend attachment; ``content`` is any bytes-like object, encoded without a copy."""
+    return {"filename": filename, "content": base64.b64encode(memoryview(content)).decode("ascii")}
+
+
+class ResendTransport:
+    name = "resend"
+
+    def send(self, params: dict, attachments: List[Tuple[str, bytes]], idempotency_key: str) -> Optional[str]:
+        if attachments:
+            params = dict(params, attachments=[encode_attachment(*a) for a in attachments])
+        try:
+            response = resend.Emails.send(params, {"idempotency_key": idempotency_key})
+        except _PERMANENT_RESEND_ERRORS as e:
+            raise PermanentEmailError(str(e))
+        return response.get("id")
+
+    def send_batch(self, messages: List[dict], idempotency_key: str) -> List[Optional[str]]:
+        """Up to 100 messages (no attachments) in one call to the batch endpoint."""
+        try:
+            response = resend.Batch.send(messages, {"idempotency_key": idempotency_key})
+        except _PERMANENT_RESEND_ERRORS as e:
+            raise PermanentEmailError(str(e))
+        return [item.get("id") for item in response.get("data") or []]
+
+
+class FakeTransport:
+    """Records messages instead of sending them. ``fail`` makes the next N sends raise."""
+
+    name = "fake"
+
+    def __init__(self):
+        self.sent: List[dict] = []
+        self.fail = 0
+        self._lock = threading.Lock()
+
+    def send(self, params: dict, attachments: List[Tuple[str, bytes]], idempotency_key: str) -> Optional[str]:
+        with self._lock:
+            if self.fail:
+                self.fail -= 1
+                raise RuntimeError("fake transport failure")
+            # Same key twice: like Resend, answer with the first message.
+            for message in self.sent:
+                if message["idempotency_key"] == idempotency_key:
+                    return message["id"]
+            message_id = f"fake-{len(self.sent) + 1}"
+            self.sent.append({
+                "id": message_id,
+                "idempotency_key": idempotency_key,
+                "params": params,
+                "attachments": attachments,
+            })
+        print(f"EMAIL (fake): {params.get('subject')} -> {', '.join(params.get('to', []))}")
+        return message_id
+
+    def send_batch(self, messages: List[dict], idempotency_key: str) -> List[Optional[str]]:
+        with self._lock:
+            if self.fail:
+                self.fail -= 1
+                raise RuntimeError("fake transport failure")
+        return [self.send(params, [], f"{idempotency_key}:{n}") for n, params in enumerate(messages)]
+
+
+email_transport = FakeTransport() if EMAIL_TRANSPORT == "fake" else ResendTransport()
+
+
+# ============================================================
+# CIRCUIT BREAKER / BULKHEAD
+# ============================================================
+# A permanent error is an answer from a healthy provider.
+email_breaker = CircuitBreaker(
+    "email", EMAIL_BREAKER_FAILURES, EMAIL_BREAKER_RESET_SECONDS, healthy_errors=(PermanentEmailError,))
+email_bulkhead = Bulkhead("email", EMAIL_MAX_CONCURRENCY, EMAIL_BULKHEAD_WAIT_SECONDS)
+
+# Raised instead of calling the provider; the call can simply be tried later.
+EmailUnavailable = (CircuitOpenError, BulkheadFullError)
+
+
+def call_email_provider(fn, *args):
+    """Run one outbound email call under the bulkhead and the circuit breaker."""
+    email_breaker.check()  # fail fast while open instead of queueing for a slot
+    with email_bulkhead.slot():
+        return email_breaker.call(fn, *args)
+
+
+# ============================================================
+# ENQUEUE
+# ============================================================
+def enqueue_email(
+    params: dict,
+    attachments: Iterable[Tuple[str, bytes]] = (),
+    kind: Optional[str] = None,
+    reference: Optional[str] = None,
+    idempotency_key: Optional[str] = None,
+    uow: Optional[UnitOfWork] = None,
+) -> dict:
+    """
+    Store a message for sending; returns its job (see get_email_job).
+    ``params`` are Resend params without attachments; ``attachments`` are
+    (filename, bytes) pairs. With ``uow`` the rows are part of its
+    transaction and nothing is committed here.
+    """
+    job_id = uuid.uuid4().hex
+    key = f"{kind}:{reference}:{idempotency_key or job_id}"
+    conn = None
+    try:
+        conn = get_db_connection(uow)
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        cursor.execute(f"""
+            INSERT INTO email_outbox (job_id, idempotency_key, kind, reference, params, max_attempts)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            ON CONFLICT (idempotency_key) DO NOTHING
+            RETURNING id, {_JOB_COLUMNS}
+        """, (job_id, key, kind, reference, Json(params), EMAIL_MAX_ATTEMPTS))
+        row = cursor.fetchone()
+
+        if row is None:
+            # Key seen before: the message is already queued (or sent).
+            cursor.execute(
+                f"SELECT {_JOB_COLUMNS} FROM email_outbox WHERE idempotency_key = %s",
+                (key,),
+            )
+            job = dict(cursor.fetchone())
+            conn.commit()
+            return dict(job, duplicate=True)
+
+        job = dict(row)
+        outbox_id = job.pop("id")
+        rows = [(outbox_id, position, filename, Binary(content))
+                for position, (filename, content) in enumerate(attachments)]
+        if rows:
+            execute_values(cursor, """
+                INSERT INTO email_outbox_attachments (outbox_id, position, filename, content)
+                VALUES %s
+            """, rows)
+        conn.commit()
+
+    except Exception as e:
+        if conn:
+            conn.rollback()
+        raise HTTPException(status_code=500, detail=f"Failed to queue email: {str(e)}")
+
+    finally:
+        if conn:
+            conn.close()
+
+    if uow is not None:
+        uow.after_commit(email_workers.wake)
+    else:
+        email_workers.wake()
+    return dict(job, duplicate=False)
+
+
+# ============================================================
+# PROCESSING
+# ============================================================
+def _claim() -> Optional[dict]:
+    conn = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        cursor.execute(_CLAIM_SQL, (EMAIL_LOCK_TIMEOUT_SECONDS,))
+        job = cursor.fetchone()
+        if job is None:
+            conn.commit()
+            return None
+        job = dict(job)
+        cursor.execute("""
+            SELECT filename, content FROM email_outbox_attachments
+            WHERE outbox_id = %s ORDER BY position
+        """, (job["id"],))
+        job["attachments"] = [(row["filename"], row["content"]) for row in cursor.fetchall()]
+        conn.commit()
+        return job
+
+    except Exception:
+        if conn:
+            conn.rollback()
+        raise
+
+    finally:
+        if conn:
+            conn.close()
+
+
+def _backoff(attempts: int) -> float:
+    delay = min(EMAIL_BACKOFF_SECONDS * 2 ** (attempts - 1), EMAIL_BACKOFF_MAX_SECONDS)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def _finish(job: dict, provider_id: Optional[str] = None, error: Optional[str] = None,
+            permanent: bool = False) -> str:
+    """Record the outcome of one attempt; returns the new status."""
+    if error is None:
+        status, sql, args = "sent", """
+            UPDATE email_outbox
+            SET status = 'sent', provider_id = %s, last_error = NULL, locked_at = NULL,
+                sent_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+            WHERE id = %s
+        """, (provider_id, job["id"])
+    elif permanent or job["attempts"] >= job["max_attempts"]:
+        status, sql, args = "dead", """
+            UPDATE email_outbox
+            SET status = 'dead', last_error = %s, locked_at = NULL, updated_at = CURRENT_TIMESTAMP
+            WHERE id = %s
+        """, (error, job["id"])
+    else:
+        status, sql, args = "pending", """
+            UPDATE email_outbox
+            SET status = 'pending', last_error = %s, locked_at = NULL,
+                next_attempt_at = CURRENT_TIMESTAMP + %s * INTERVAL '1 second',
+                updated_at = CURRENT_TIMESTAMP
+            WHERE id = %s
+        """, (error, _backoff(job["attempts"]), job["id"])
+
+    conn = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute(sql, args)
+        conn.commit()
+        return status
+
+    except Exception:
+        if conn:
+            conn.rollback()
+        raise
+
+    finally:
+        if conn:
+            conn.close()
+
+
+def _defer(job: dict, delay: float) -> str:
+    """Put a message back without counting the attempt (the provider was never called)."""
+    conn = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute("""
+            UPDATE email_outbox
+            SET status = 'pending', attempts = attempts - 1, locked_at = NULL,
+                next_attempt_at = CURRENT_TIMESTAMP + %s * INTERVAL '1 second',
+                updated_at = CURRENT_TIMESTAMP
+            WHERE id = %s
+        """, (delay, job["id"]))
+        conn.commit()
+        return "deferred"
+
+    except Exception:
+        if conn:
+            conn.rollback()
+        raise
+
+    finally:
+        if conn:
+            conn.close()
+
+
+def process_next_email(transport=None) -> Optional[str]:
+    """
+    Send one due message; returns its new status ("deferred" when the
+    provider is unavailable), or None when nothing is due.
+    """
+    job = _claim()
+    if job is None:
+        return None
+
+    transport = transport or email_transport
+    try:
+        provider_id = call_email_provider(
+            transport.send, job["params"], job["attachments"], job["idempotency_key"])
+    except EmailUnavailable as e:
+        return _defer(job, e.retry_after)
+    except PermanentEmailError as e:
+        status = _finish(job, error=str(e), permanent=True)
+    except Exception as e:
+        status = _finish(job, error=f"{type(e).__name__}: {e}")
+    else:
+        return _finish(job, provider_id=provider_id)
+
+    print(f"Email {job['job_id']} attempt {job['attempts']}/{job['max_attempts']} failed ({status})")
+    return status
+
+
+# ============================================================
+# WORKER POOL
+# ============================================================
+class EmailWorkerPool:
+    def __init__(self, size: int):
+        self.size = size
+        self._threads: List[threading.Thread] = []
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._counts = {"sent": 0, "pending": 0, "dead": 0, "deferred": 0}
+
+    def start(self):
+        with self._lock:
+            if self._threads or self.size <= 0:
+                return
+            self._stop.clear()
+            for n in range(self.size):
+                thread = threading.Thread(target=self._work, name=f"email-worker-{n}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def wake(self):
+        self._wake.set()
+
+    def _work(self):
+        while not self._stop.is_set():
+            # No claims while the circuit is open; they would only be deferred.
+            delay = email_breaker.retry_after()
+            if delay > 0:
+                self._stop.wait(delay)
+                continue
+            try:
+                status = process_next_email()
+            except Exception as e:
+                print(f"Email worker error: {e}")
+                status = None
+
+            if status is not None:
+                with self._lock:
+                    # "pending" here means the attempt failed and a retry is scheduled.
+                    self._counts[status] += 1
+                continue
+            self._wake.wait(EMAIL_POLL_SECONDS)
+            self._wake.clear()
+
+    def shutdown(self, timeout: float = 10):
+        with self._lock:
+            threads, self._threads = self._threads, []
+        self._stop.set()
+        self._wake.set()
+        for thread in threads:
+            thread.join(timeout=timeout)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "transport": email_transport.name,
+                "workers": len(self._threads),
+                "sent": self._counts["sent"],
+                "retried": self._counts["pending"],
+                "dead_lettered": self._counts["dead"],
+                "deferred": self._counts["deferred"],
+                "circuit": email_breaker.stats(),
+                "bulkhead": email_bulkhead.stats(),
+            }
+
+
+email_workers = EmailWorkerPool(EMAIL_WORKERS)
+
+
+def start_email_workers():
+    email_workers.start()
+
+
+def shutdown_email_workers():
+    email_workers.shutdown()
+
+
+def get_email_outbox_stats() -> dict:
+    return email_workers.stats()
+
+
+# ============================================================
+# JOBS
+# ============================================================
+def get_email_job(job_id: str) -> dict:
+    conn = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        cursor.execute(f"SELECT {_JOB_COLUMNS} FROM email_outbox WHERE job_id = %s", (job_id,))
+        job = cursor.fetchone()
+        if not job:
+            raise HTTPException(status_code=404, detail="Email job not found")
+        return dict(job)
+
+    finally:
+        if conn:
+            conn.close()
+
+
+def list_email_jobs(status: Optional[str] = None, limit: int = 50) -> List[dict]:
+    conn = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        cursor.execute(f"""
+            SELECT {_JOB_COLUMNS} FROM email_outbox
+            WHERE %s::text IS NULL OR status = %s
+            ORDER BY id DESC
+            LIMIT %s
+        """, (status, status, limit))
+        return [dict(row) for row in cursor.fetchall()]
+
+    finally:
+        if conn:
+            conn.close()
+
+
+def retry_email_job(job_id: str) -> dict:
+    """Put a dead-lettered message back in the queue with a fresh set of attempts."""
+    conn = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        cursor.execute(f"""
+            UPDATE email_outbox
+            SET status = 'pending', attempts = 0, next_attempt_at = CURRENT_TIMESTAMP,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE job_id = %s AND status = 'dead'
+            RETURNING {_JOB_COLUMNS}
+        """, (job_id,))
+        job = cursor.fetchone()
+        if not job:
+            conn.rollback()
+            get_email_job(job_id)  # 404 when it does not exist
+            raise HTTPException(status_code=409, detail="Only dead-lettered emails can be retried")
+        conn.commit()
+
+    finally:
+        if conn:
+            conn.close()
+
+    email_workers.wake()
+    return dict(job)
@@ -1,102 +1,81 @@
-import os
-import resend
+"""
+Client emails for quotes and invoices.
 
-resend.api_key = os.getenv("RESEND_API_KEY")
-
-FROM_EMAIL = "METPRO SRL <noreply@metprord.site>"
+The send_* functions build the message and queue it in the email outbox
+(email_outbox.py); they return the outbox job instead of waiting for Resend.
+``attachments`` are extra (filename, bytes) files sent after the PDF; with
+a ``uow`` the message is queued in the caller's transaction.
+Subjects and bodies come from the template registry (email_templates.py).
+"""
+from typing import Iterable, Optional, Tuple
 
+from database import UnitOfWork
+from email_outbox import enqueue_email
+from email_templates import clean_text, get_template
 
-# ---------------------------------------------------------
-# HELPERS
-# ---------------------------------------------------------
-def clean_text(value: str) -> str:
-    """Remove newlines and sanitize text for email subjects."""
-    if not value:
-        return ""
-    return value.replace("\n", " ").replace("\r", " ").strip()
+FROM_EMAIL = "METPRO SRL <noreply@metprord.site>"
+PUBLIC_URL = "https://metprord.site"
 
 
 # ---------------------------------------------------------
 # QUOTES
 # ---------------------------------------------------------
-def send_quote_email(contact_email, contact_name, company_name, project_name, quote_id, pdf_bytes):
-
-    clean_title = clean_text(project_name or company_name)
-
-    html = f"""
-        <p>Estimado/a {contact_name},</p>
-
-        <p>Adjunto encontrará la cotización <strong>{quote_id}</strong> correspondiente al proyecto <strong>{project_name or 'su proyecto'}</strong>.</p>
-
-        <p>Puede ver la cotización en línea aquí:</p>
-
-        <p>
-            <a href="https://metprord.site/q/{quote_id}"
-               style="display:inline-block;padding:12px 20px;background:#0052cc;color:white;
-                      text-decoration:none;border-radius:6px;font-weight:bold;font-size:15px;">
-                Ver Cotización en Línea
-            </a>
-        </p>
-
-        <p>Quedamos a su disposición para cualquier consulta.</p>
-        <br/>
-        <p>Atentamente,<br/>Equipo METPRO</p>
-    """
-
+def send_quote_email(contact_email, contact_name, company_name, project_name, quote_id, pdf_bytes,
+                     idempotency_key: Optional[str] = None,
+                     attachments: Iterable[Tuple[str, bytes]] = (),
+                     uow: Optional[UnitOfWork] = None):
+
+    subject, html = get_template("quote").render(
+        contact_name=contact_name,
+        number=quote_id,
+        project_name=project_name or "su proyecto",
+        title=clean_text(project_name or company_name),
+        public_url=f"{PUBLIC_URL}/q/{quote_id}",
+    )
     params = {
         "from": FROM_EMAIL,
         "to": [contact_email],
-        "subject": f"Cotización {quote_id} - {clean_title}",
+        "subject": subject,
         "html": html,
-        "attachments": [
-            {
-                "filename": f"cotizacion_{quote_id}.pdf",
-                "content": list(pdf_bytes),
-            }
-        ],
     }
 
-    return resend.Emails.send(params)
+    return enqueue_email(
+        params,
+        [(f"cotizacion_{quote_id}.pdf", pdf_bytes), *attachments],
+        kind="quote",
+        reference=str(quote_id),
+        idempotency_key=idempotency_key,
+        uow=uow,
+    )
 
 
 # ---------------------------------------------------------
 # INVOICES
 # ---------------------------------------------------------
-def send_invoice_email(contact_email, contact_name, company_name, project_name, invoice_id, pdf_bytes):
-
-    clean_title = clean_text(project_name or company_name)
-
-    html = f"""
-        <p>Estimado/a {contact_name},</p>
-
-        <p>Adjunto encontrará la factura <strong>{invoice_id}</strong> correspondiente al proyecto <strong>{project_name or 'su proyecto'}</strong>.</p>
-
-        <p>Puede ver la factura en línea aquí:</p>
-
-        <p>
-            <a href="https://metprord.site/inv/{invoice_id}"
-               style="display:inline-block;padding:12px 20px;background:#0a7d4f;color:white;
-                      text-decoration:none;border-radius:6px;font-weight:bold;font-size:15px;">
-                Ver Factura
-            </a>
-        </p>
-
-        <p>Quedamos a su disposición para cualquier consulta.</p>
-        <br/>
-        <p>Atentamente,<br/>Equipo METPRO</p>
-    """
-
+def send_invoice_email(contact_email, contact_name, company_name, project_name, invoice_id, pdf_bytes,
+                       idempotency_key: Optional[str] = None,
+                       attachments: Iterable[Tuple[str, bytes]] = (),
+                       uow: Optional[UnitOfWork] = None):
+
+    subject, html = get_template("invoice").render(
+        contact_name=contact_name,
+        number=invoice_id,
+        project_name=project_name or "su proyecto",
+        title=clean_text(project_name or company_name),
+        public_url=f"{PUBLIC_URL}/inv/{invoice_id}",
+    )
     params = {
         "from": FROM_EMAIL,
         "to": [contact_email],
-        "subject": f"Factura {invoice_id} - {clean_title}",
+        "subject": subject,
         "html": html,
-        "attachments": [
-            {
-                "filename": f"factura_{invoice_id}.pdf",
-                "content": list(pdf_bytes),
-            }
-        ],
     }
 
-    return resend.Emails.send(params)
\ No newline at end of file
+    return enqueue_email(
+        params,
+        [(f"factura_{invoice_id}.pdf", pdf_bytes), *attachments],
+        kind="invoice",
+        reference=str(invoice_id),
+        idempotency_key=idempotency_key,
+        uow=uow,
+    )
@@ -1,109 +1,266 @@
-def render_quote_email(client_name: str, quote_id: int, public_url: str) -> str:
-    return f"""
-    <div style="font-family: Arial, sans-serif; padding: 20px; background-color: #f7f7f7;">
-        
-        <!-- Logo -->
-        <div style="text-align: center; margin-bottom: 30px;">
-            <img src="https://metprord.site/logo.png" alt="METPRO Logo" style="width: 180px;">
-        </div>
+"""
+Email template registry.
 
-        <!-- Card -->
-        <div style="max-width: 600px; margin: auto; background: white; padding: 30px; border-radius: 10px; box-shadow: 0 4px 12px rgba(0,0,0,0.1);">
+Every email the API sends is a template registered here under
+(name, language, version), with a subject and an HTML body. Placeholders
+are written {{ field }} and HTML-escaped when rendered; {{ field|money }}
+formats an amount as $1,234.56 and {{ field|raw }} inserts trusted HTML
+(another rendered template) as is. Subjects are plain text: values are not
+escaped but newlines are removed (clean_text).
 
-            <h2 style="text-align: center; color: #333;">Cotización #{quote_id}</h2>
+Templates are compiled once (compile_templates(), called at startup, or on
+first use) into their literal parts plus a list of (slot, field, converter),
+and the compiled objects are cached per (name, language, version). Rendering
+fills the slots and joins the parts: no parsing per email, which matters for
+reminder campaigns rendering thousands of statements.
 
-            <p style="font-size: 16px; color: #444;">
-                Estimado/a <strong>{client_name}</strong>,
-            </p>
+get_template(name, language, version) falls back to EMAIL_LANGUAGE when the
+language has no such template, and to the newest version when none is given.
+"""
+import os
+import re
+import threading
+from decimal import Decimal
+from html import escape
+from typing import Callable, Dict, List, Optional, Tuple
 
-            <p style="font-size: 15px; color: #555;">
-                Le enviamos la cotización solicitada. Puede revisarla en línea o descargar el archivo PDF adjunto.
-            </p>
+EMAIL_LANGUAGE = os.getenv("EMAIL_LANGUAGE", "es")
 
-            <!-- CTA Button -->
-            <div style="text-align: center; margin: 30px 0;">
-                <a href="{public_url}" 
-                   style="background-color: #0052cc; color: white; padding: 14px 28px; 
-                          text-decoration: none; border-radius: 6px; font-size: 16px;">
-                    Ver Cotización
-                </a>
-            </div>
+_PLACEHOLDER = re.compile(r"\{\{\s*(\w+)\s*(?:\|\s*(\w+)\s*)?\}\}")
 
-            <p style="font-size: 14px; color: #777;">
-                Si tiene alguna pregunta o desea realizar cambios, no dude en contactarnos.
-            </p>
 
-        </div>
+# ============================================================
+# FILTERS
+# ============================================================
+def clean_text(value) -> str:
+    """Remove newlines and sanitize text for email subjects."""
+    if not value:
+        return ""
+    return str(value).replace("\n", " ").replace("\r", " ").strip()
 
-        <!-- Footer -->
-        <p style="text-align: center; font-size: 12px; color: #999; margin-top: 20px;">
-            © {2026} METPRO. Todos los derechos reservados.
-        </p>
 
-    </div>
-    """
+def _html(value) -> str:
+    return escape("" if value is None else str(value))
 
 
-def render_invoice_email(client_name: str, invoice_id: int, public_url: str) -> str:
-    return f"""
+def _money(value) -> str:
+    return f"${Decimal(value or 0):,.2f}"
+
+
+def _raw(value) -> str:
+    return "" if value is None else str(value)
+
+
+_HTML_FILTERS = {None: _html, "money": _money, "raw": _raw}
+_TEXT_FILTERS = {None: clean_text, "money": _money}
+
+
+# ============================================================
+# COMPILED TEMPLATE
+# ============================================================
+def _compile(source: str, filters: dict) -> Tuple[List[str], List[Tuple[int, str, Callable]]]:
+    """``source`` -> (literal parts with empty slots, [(slot index, field, converter)])."""
+    parts, slots, position = [], [], 0
+    for match in _PLACEHOLDER.finditer(source):
+        name, flt = match.group(1), match.group(2)
+        if flt not in filters:
+            raise ValueError(f"Unknown template filter '{flt}' in {{{{ {name}|{flt} }}}}")
+        parts.append(source[position:match.start()])
+        slots.append((len(parts), name, filters[flt]))
+        parts.append("")
+        position = match.end()
+    parts.append(source[position:])
+    return parts, slots
+
+
+class EmailTemplate:
+    def __init__(self, name: str, language: str, version: int, subject: str, html: str):
+        self.name = name
+        self.language = language
+        self.version = version
+        self._subject, self._subject_slots = _compile(subject, _TEXT_FILTERS)
+        self._html, self._html_slots = _compile(html, _HTML_FILTERS)
+        self.fields = sorted({name for _, name, _ in self._subject_slots + self._html_slots})
+
+    @staticmethod
+    def _fill(parts: List[str], slots, values: dict) -> str:
+        out = parts.copy()
+        try:
+            for index, name, convert in slots:
+                out[index] = convert(values[name])
+        except KeyError as e:
+            raise ValueError(f"Missing template value {e}") from None
+        return "".join(out)
+
+    def render_subject(self, **values) -> str:
+        return self._fill(self._subject, self._subject_slots, values)
+
+    def render_html(self, **values) -> str:
+        return self._fill(self._html, self._html_slots, values)
+
+    def render(self, **values) -> Tuple[str, str]:
+        """(subject, html)."""
+        return self.render_subject(**values), self.render_html(**values)
+
+
+# ============================================================
+# SOURCES
+# ============================================================
+_LAYOUT = """
     <div style="font-family: Arial, sans-serif; padding: 20px; background-color: #f4f4f4;">
-        
+
         <!-- Logo -->
         <div style="text-align: center; margin-bottom: 30px;">
             <img src="https://metprord.site/logo.png" alt="METPRO Logo" style="width: 180px;">
         </div>
 
         <!-- Card -->
-        <div style="
-            max-width: 600px; 
-            margin: auto; 
-            background: white; 
-            padding: 30px; 
-            border-radius: 10px; 
-            border: 1px solid #e0e0e0;
-            box-shadow: 0 3px 10px rgba(0,0,0,0.08);
-        ">
+        <div style="max-width: 600px; margin: auto; background: white; padding: 30px; border-radius: 10px; border: 1px solid #e0e0e0;">
+%s
+        </div>
 
+        <!-- Footer -->
+        <p style="text-align: center; font-size: 12px; color: #999; margin-top: 20px;">
+            © 2026 METPRO. Todos los derechos reservados.
+        </p>
+
+    </div>
+"""
+
+_DOCUMENT_BODY = """
+            <p>Estimado/a {{ contact_name }},</p>
+
+            <p>Adjunto encontrará la %(document)s <strong>{{ number }}</strong> correspondiente al proyecto <strong>{{ project_name }}</strong>.</p>
+
+            <p>Puede ver la %(document)s en línea aquí:</p>
+
+            <p>
+                <a href="{{ public_url }}"
+                   style="display:inline-block;padding:12px 20px;background:%(color)s;color:white;
+                          text-decoration:none;border-radius:6px;font-weight:bold;font-size:15px;">
+                    %(button)s
+                </a>
+            </p>
+
+            <p>Quedamos a su disposición para cualquier consulta.</p>
+            <br/>
+            <p>Atentamente,<br/>Equipo METPRO</p>
+"""
+
+_REMINDER_BODY = """
             <h2 style="text-align: center; color: #222; margin-bottom: 10px;">
-                Factura #{invoice_id}
+                Estado de Cuenta
             </h2>
 
             <p style="font-size: 16px; color: #444;">
-                Estimado/a <strong>{client_name}</strong>,
+                Estimado/a <strong>{{ contact_name }}</strong>,
             </p>
 
             <p style="font-size: 15px; color: #555;">
-                Le enviamos la factura correspondiente a los servicios prestados. 
-                Puede revisarla en línea o descargar el archivo PDF adjunto.
+                Le recordamos que {{ company_name }} tiene las siguientes facturas pendientes de pago:
             </p>
 
-            <!-- CTA Button -->
-            <div style="text-align: center; margin: 30px 0;">
-                <a href="{public_url}" 
-                   style="
-                        background-color: #0a7d4f; 
-                        color: white; 
-                        padding: 14px 28px; 
-                        text-decoration: none; 
-                        border-radius: 6px; 
-                        font-size: 16px;
-                        font-weight: bold;
-                   ">
-                    Ver / Pagar Factura
-                </a>
-            </div>
+            <table style="width: 100%; border-collapse: collapse; font-size: 14px; color: #444;">
+                <tr style="background-color: #f7f7f7;">
+                    <th style="padding: 8px; text-align: left;">Factura</th>
+                    <th style="padding: 8px; text-align: left;">Fecha</th>
+                    <th style="padding: 8px; text-align: center;">Días vencida</th>
+                    <th style="padding: 8px; text-align: right;">Pendiente</th>
+                </tr>{{ rows|raw }}
+                <tr>
+                    <td colspan="3" style="padding: 8px; text-align: right; font-weight: bold;">Total pendiente</td>
+                    <td style="padding: 8px; text-align: right; font-weight: bold;">{{ total_due|money }}</td>
+                </tr>
+            </table>
 
-            <p style="font-size: 14px; color: #777;">
-                Si tiene alguna pregunta sobre esta factura o necesita asistencia, 
+            <p style="font-size: 14px; color: #777; margin-top: 25px;">
+                Si ya realizó el pago, por favor ignore este mensaje. Para cualquier consulta
                 estamos a su disposición.
             </p>
+"""
 
-        </div>
+_REMINDER_ROW = """
+                <tr>
+                    <td style="padding: 8px; border-bottom: 1px solid #eee;">
+                        <a href="{{ public_url }}" style="color: #0a7d4f;">{{ number }}</a>
+                    </td>
+                    <td style="padding: 8px; border-bottom: 1px solid #eee;">{{ date }}</td>
+                    <td style="padding: 8px; border-bottom: 1px solid #eee; text-align: center;">{{ days_overdue }}</td>
+                    <td style="padding: 8px; border-bottom: 1px solid #eee; text-align: right;">{{ amount_due|money }}</td>
+                </tr>"""
 
-        <!-- Footer -->
-        <p style="text-align: center; font-size: 12px; color: #999; margin-top: 20px;">
-            © {2026} METPRO. Todos los derechos reservados.
-        </p>
+# (name, language, version) -> (subject, html)
+TEMPLATE_SOURCES: Dict[Tuple[str, str, int], Tuple[str, str]] = {
+    ("quote", "es", 1): (
+        "Cotización {{ number }} - {{ title }}",
+        _LAYOUT % (_DOCUMENT_BODY % {
+            "document": "cotización", "color": "#0052cc", "button": "Ver Cotización en Línea"}),
+    ),
+    ("invoice", "es", 1): (
+        "Factura {{ number }} - {{ title }}",
+        _LAYOUT % (_DOCUMENT_BODY % {
+            "document": "factura", "color": "#0a7d4f", "button": "Ver Factura"}),
+    ),
+    ("reminder", "es", 1): (
+        "Recordatorio de pago - {{ company_name }}",
+        _LAYOUT % _REMINDER_BODY,
+    ),
+    ("reminder_row", "es", 1): ("", _REMINDER_ROW),
+}
 
-    </div>
-    """
\ No newline at end of file
+
+# ============================================================
+# REGISTRY
+# ============================================================
+_compiled: Dict[Tuple[str, str, int], EmailTemplate] = {}
+_latest: Dict[Tuple[str, str], int] = {}
+_lock = threading.Lock()
+
+
+def compile_templates() -> int:
+    """Compile every registered template (idempotent); returns how many there are."""
+    with _lock:
+        for key, (subject, html) in TEMPLATE_SOURCES.items():
+            if key not in _compiled:
+                _compiled[key] = EmailTemplate(*key, subject=subject, html=html)
+                name, language, version = key
+                _latest[(name, language)] = max(version, _latest.get((name, language), 0))
+        return len(_compiled)
+
+
+def get_template(name: str, language: Optional[str] = None, version: Optional[int] = None) -> EmailTemplate:
+    if not _compiled:
+        compile_templates()
+    for lang in (language or EMAIL_LANGUAGE, EMAIL_LANGUAGE):
+        ver = version if version is not None else _latest.get((name, lang))
+        template = _compiled.get((name, lang, ver))
+        if template is not None:
+            return template
+    raise KeyError(f"No email template '{name}' (language={language}, version={version})")
+
+
+# ============================================================
+# RENDER HELPERS
+# ============================================================
+def render_quote_email(client_name: str, quote_id, public_url: str, project_name: str = "") -> str:
+    return get_template("quote").render_html(
+        contact_name=client_name, number=quote_id, project_name=project_name or "su proyecto",
+        public_url=public_url)
+
+
+def render_invoice_email(client_name: str, invoice_id, public_url: str, project_name: str = "") -> str:
+    return get_template("invoice").render_html(
+        contact_name=client_name, number=invoice_id, project_name=project_name or "su proyecto",
+        public_url=public_url)
+
+
+def render_reminder_email(contact_name: str, company_name: str, invoices: list, total_due, public_base_url: str,
+                          language: Optional[str] = None) -> Tuple[str, str]:
+    """
+    (subject, html) statement of a contact's open invoices; ``invoices`` are
+    dicts with id, number, date, days_overdue and amount_due.
+    """
+    row = get_template("reminder_row", language)
+    rows = "".join(row.render_html(public_url=f"{public_base_url}/inv/{inv['id']}", **inv) for inv in invoices)
+    return get_template("reminder", language).render(
+        contact_name=contact_name, company_name=company_name, rows=rows, total_due=total_due)
@@ -1,6 +1,10 @@
 import os
 import resend
-from fastapi import APIRouter
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException
+
+from auth.service import require_role, verify_token
+from email_outbox import EmailUnavailable, call_email_provider, get_email_job, list_email_jobs, retry_email_job
 
 router = APIRouter()
 
@@ -15,5 +19,27 @@ def send_test_email():
         "html": "<strong>If you see this, Resend + FastAPI works.</strong>",
     }
 
-    email = resend.Emails.send(params)
-    return {"status": "sent", "id": email.id}
\ No newline at end of file
+    try:
+        email = call_email_provider(resend.Emails.send, params)
+    except EmailUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(int(e.retry_after) + 1)})
+    return {"status": "sent", "id": email["id"]}
+
+
+# ============================================================
+# OUTBOX
+# ============================================================
+@router.get("/emails")
+def get_email_jobs(status: Optional[str] = None, limit: int = 50, current_user: dict = Depends(verify_token)):
+    """Latest outbox jobs; ?status=dead lists the dead-lettered ones."""
+    return list_email_jobs(status, min(limit, 500))
+
+
+@router.get("/emails/{job_id}")
+def get_email_status(job_id: str, current_user: dict = Depends(verify_token)):
+    return get_email_job(job_id)
+
+
+@router.post("/emails/{job_id}/retry")
+def retry_email(job_id: str, current_user: dict = Depends(require_role("admin"))):
+    return retry_email_job(job_id)
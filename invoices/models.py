@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import Dict, List, Optional
 from datetime import datetime
 
 
@@ -20,6 +20,8 @@ class Invoice(BaseModel):
     amount_due: float = 0.0
     status: str
     notes: Optional[str] = None
+    ncf: Optional[str] = None
+    ncf_type: Optional[str] = None
     created_at: datetime
     updated_at: datetime
 
@@ -27,6 +29,23 @@ class Invoice(BaseModel):
         from_attributes = True
 
 
+class InvoiceStatusCount(BaseModel):
+    count: int
+    total_amount: float
+    amount_due: float
+
+
+class InvoiceCounts(BaseModel):
+    by_status: Dict[str, InvoiceStatusCount]
+    total: InvoiceStatusCount
+
+
+class InvoicePage(BaseModel):
+    items: List[Invoice]
+    next_cursor: Optional[str] = None
+    counts: Optional[InvoiceCounts] = None
+
+
 class InvoiceCreate(InvoiceBase):
     pass
 
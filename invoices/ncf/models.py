@@ -0,0 +1,16 @@
+from datetime import date
+from typing import Optional
+
+from pydantic import BaseModel
+
+
+class NcfRangeCreate(BaseModel):
+    ncf_type: str                     # "01" credito fiscal, "02" consumo, ...
+    series: str = "B"
+    range_start: int
+    range_end: int
+    expires_on: Optional[date] = None
+
+
+class NcfRangeUpdate(BaseModel):
+    active: bool
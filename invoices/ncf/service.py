@@ -0,0 +1,222 @@
+"""
+NCF range manager.
+
+DGII authorizes ranges of fiscal receipt numbers (NCF) per receipt type;
+they are stored in ncf_ranges and consumed in order. stamp_invoice_ncf()
+takes the next number and writes it onto the invoice.
+
+Allocation is one UPDATE ... RETURNING on the range row, run in the
+invoice's own transaction as its LAST statement before COMMIT: the row lock
+is held only for the commit, and a rolled back invoice gives its number
+back, so NCFs stay gap-free without serializing whole invoice creations.
+When the current range of a type runs out the next one is used; when what
+is left across all ranges of a type drops below NCF_WARN_REMAINING a warning is
+logged and the type is flagged in GET /invoices/ncf/ranges.
+"""
+import os
+from typing import Optional
+
+from fastapi import HTTPException
+from psycopg2.extras import RealDictCursor
+
+from database import get_db_connection
+from documents.numbering import NCF_TYPES, format_ncf
+
+# Receipt type for clients with / without an RNC (tax_id).
+NCF_TYPE_WITH_RNC = os.getenv("NCF_TYPE_WITH_RNC", "01")
+NCF_TYPE_DEFAULT = os.getenv("NCF_TYPE_DEFAULT", "02")
+# When true an invoice cannot be created without an NCF (409 if no range is available).
+NCF_REQUIRED = os.getenv("NCF_REQUIRED", "false").lower() in ("1", "true", "yes")
+NCF_WARN_REMAINING = int(os.getenv("NCF_WARN_REMAINING", "100"))
+NCF_WARN_EXPIRY_DAYS = int(os.getenv("NCF_WARN_EXPIRY_DAYS", "30"))
+
+_USABLE = """
+    active
+    AND next_number <= range_end
+    AND (expires_on IS NULL OR expires_on >= CURRENT_DATE)
+"""
+
+_ALLOCATE_SQL = f"""
+    UPDATE ncf_ranges AS r
+    SET next_number = r.next_number + 1
+    FROM (
+        SELECT id FROM ncf_ranges
+        WHERE ncf_type = %s AND {_USABLE}
+        ORDER BY range_start, id
+        LIMIT 1
+        FOR UPDATE
+    ) AS pick
+    WHERE r.id = pick.id
+    RETURNING r.id, r.series, r.ncf_type, r.next_number - 1 AS number, r.range_end
+"""
+
+
+def ncf_type_for_client(cursor, client_id: int) -> str:
+    cursor.execute("SELECT tax_id FROM clients WHERE id = %s", (client_id,))
+    row = cursor.fetchone()
+    return NCF_TYPE_WITH_RNC if row and (row["tax_id"] or "").strip() else NCF_TYPE_DEFAULT
+
+
+def _remaining(cursor, ncf_type: str) -> int:
+    cursor.execute(f"""
+        SELECT COALESCE(SUM(range_end - next_number + 1), 0) AS n
+        FROM ncf_ranges
+        WHERE ncf_type = %s AND {_USABLE}
+    """, (ncf_type,))
+    return cursor.fetchone()["n"]
+
+
+def allocate_ncf(cursor, ncf_type: str) -> Optional[str]:
+    """Next NCF of ``ncf_type`` (None when no range is available); commit right after."""
+    # A range that ran out while we waited for its lock is skipped by the
+    # locked re-check and yields no row; the second attempt picks the next range.
+    row = None
+    for _ in range(2):
+        cursor.execute(_ALLOCATE_SQL, (ncf_type,))
+        row = cursor.fetchone()
+        if row:
+            break
+    if not row:
+        return None
+
+    if row["range_end"] - row["number"] < NCF_WARN_REMAINING:
+        remaining = _remaining(cursor, ncf_type)
+        if remaining < NCF_WARN_REMAINING:
+            print(f"WARNING: only {remaining} NCF numbers left for type {ncf_type} ({NCF_TYPES.get(ncf_type, '')})")
+    return format_ncf(row["series"], row["ncf_type"], row["number"])
+
+
+def stamp_invoice_ncf(cursor, invoice_id: int, client_id: int) -> dict:
+    """
+    Allocate an NCF and store it on the invoice; returns {"ncf", "ncf_type"}.
+    Call as the last statement before conn.commit() (see module docstring).
+    """
+    ncf_type = ncf_type_for_client(cursor, client_id)
+    ncf = allocate_ncf(cursor, ncf_type)
+    if ncf is None:
+        if NCF_REQUIRED:
+            raise HTTPException(status_code=409, detail=f"No authorized NCF range available for type {ncf_type}")
+        print(f"WARNING: invoice {invoice_id} created without NCF, no range for type {ncf_type}")
+        return {"ncf": None, "ncf_type": None}
+
+    cursor.execute(
+        "UPDATE invoices SET ncf = %s, ncf_type = %s WHERE id = %s",
+        (ncf, ncf_type, invoice_id),
+    )
+    return {"ncf": ncf, "ncf_type": ncf_type}
+
+
+# ============================================================
+# RANGE MANAGEMENT
+# ============================================================
+def create_ncf_range(data) -> dict:
+    if data.ncf_type not in NCF_TYPES:
+        raise HTTPException(status_code=400, detail=f"Unknown NCF type {data.ncf_type}")
+    if data.series not in ("B", "E"):
+        raise HTTPException(status_code=400, detail="NCF series must be B or E")
+    if data.range_start < 1 or data.range_end < data.range_start:
+        raise HTTPException(status_code=400, detail="Invalid NCF range")
+
+    conn = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        cursor.execute("""
+            SELECT id FROM ncf_ranges
+            WHERE series = %s AND ncf_type = %s
+              AND range_start <= %s AND range_end >= %s
+        """, (data.series, data.ncf_type, data.range_end, data.range_start))
+        overlap = cursor.fetchone()
+        if overlap:
+            raise HTTPException(status_code=409, detail=f"Overlaps NCF range {overlap['id']}")
+
+        cursor.execute("""
+            INSERT INTO ncf_ranges (ncf_type, series, range_start, range_end, next_number, expires_on)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            RETURNING *
+        """, (data.ncf_type, data.series, data.range_start, data.range_end, data.range_start, data.expires_on))
+        row = dict(cursor.fetchone())
+        conn.commit()
+        return row
+
+    except HTTPException:
+        if conn:
+            conn.rollback()
+        raise
+
+    except Exception as e:
+        if conn:
+            conn.rollback()
+        raise HTTPException(status_code=500, detail=f"Failed to create NCF range: {str(e)}")
+
+    finally:
+        if conn:
+            conn.close()
+
+
+def set_ncf_range_active(range_id: int, active: bool) -> dict:
+    conn = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        cursor.execute("UPDATE ncf_ranges SET active = %s WHERE id = %s RETURNING *", (active, range_id))
+        row = cursor.fetchone()
+        if not row:
+            raise HTTPException(status_code=404, detail="NCF range not found")
+        conn.commit()
+        return dict(row)
+
+    except HTTPException:
+        if conn:
+            conn.rollback()
+        raise
+
+    finally:
+        if conn:
+            conn.close()
+
+
+def get_ncf_status() -> dict:
+    """Every range with its usage, plus per-type remaining numbers and warnings."""
+    conn = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        cursor.execute(f"""
+            SELECT id, ncf_type, series, range_start, range_end, next_number, expires_on, active,
+                   GREATEST(range_end - next_number + 1, 0) AS remaining,
+                   ({_USABLE}) AS usable
+            FROM ncf_ranges
+            ORDER BY ncf_type, range_start, id
+        """)
+        ranges = [dict(row) for row in cursor.fetchall()]
+
+        cursor.execute(f"""
+            SELECT ncf_type,
+                   SUM(range_end - next_number + 1) AS remaining,
+                   MIN(expires_on) AS next_expiry,
+                   MIN(expires_on) < CURRENT_DATE + %s::int AS expiring
+            FROM ncf_ranges
+            WHERE {_USABLE}
+            GROUP BY ncf_type
+        """, (NCF_WARN_EXPIRY_DAYS,))
+        usable = {row["ncf_type"]: row for row in cursor.fetchall()}
+
+        # Types in use: the ones with ranges plus the two assigned automatically.
+        in_use = {r["ncf_type"] for r in ranges} | {NCF_TYPE_WITH_RNC, NCF_TYPE_DEFAULT}
+        types = {}
+        for ncf_type in sorted(in_use):
+            row = usable.get(ncf_type)
+            remaining = row["remaining"] if row else 0
+            types[ncf_type] = {
+                "label": NCF_TYPES.get(ncf_type, ""),
+                "remaining": remaining,
+                "next_expiry": row["next_expiry"] if row else None,
+                "low": remaining < NCF_WARN_REMAINING,
+                "expiring": bool(row and row["expiring"]),
+            }
+        return {"ranges": ranges, "types": types, "warn_remaining": NCF_WARN_REMAINING}
+
+    finally:
+        if conn:
+            conn.close()
@@ -0,0 +1,326 @@
+"""
+Payment reminder campaigns.
+
+An admin starts a campaign for overdue invoices (scope "overdue",
+OVERDUE_CONDITION) or for every unpaid one (scope "pending"); it runs on a
+background thread and reports progress like a totals recalculation.
+
+- One query selects the invoices, grouped by contact, with array-aggregated
+  invoice columns; each contact gets a single statement email listing all
+  of its invoices, rendered once (email_templates.render_reminder_email).
+  Invoices reminded less than REMINDER_MIN_INTERVAL_DAYS ago, and those
+  without a contact email, are left out.
+- Statements are sent through the Resend batch endpoint,
+  REMINDER_BATCH_SIZE (max 100) per call, by REMINDER_CONCURRENCY threads
+  and at most REMINDER_RATE_LIMIT calls per second. A failed batch is
+  retried with backoff (its idempotency key keeps a retry from delivering
+  twice); after REMINDER_RETRIES it is recorded as failed and the run goes on.
+- After each delivered batch invoices.last_reminder_at is set, so a
+  campaign that is started again skips what was already sent.
+
+The report has per-batch size, duration and throughput, plus the failures.
+"""
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from decimal import Decimal
+from typing import List, Optional
+
+from fastapi import HTTPException
+from psycopg2.extras import RealDictCursor
+
+from database import get_db_connection
+from documents.model import format_doc_date
+from email_outbox import EmailUnavailable, PermanentEmailError, call_email_provider, email_transport
+from email_service import FROM_EMAIL, PUBLIC_URL
+from email_templates import render_reminder_email
+from invoices.service import INVOICE_DUE_DAYS, OVERDUE_CONDITION
+
+REMINDER_BATCH_SIZE = min(int(os.getenv("REMINDER_BATCH_SIZE", "100")), 100)
+REMINDER_CONCURRENCY = int(os.getenv("REMINDER_CONCURRENCY", "2"))
+REMINDER_RATE_LIMIT = float(os.getenv("REMINDER_RATE_LIMIT", "2"))   # batch calls per second
+REMINDER_RETRIES = int(os.getenv("REMINDER_RETRIES", "3"))
+REMINDER_BACKOFF_SECONDS = float(os.getenv("REMINDER_BACKOFF_SECONDS", "2"))
+REMINDER_MIN_INTERVAL_DAYS = int(os.getenv("REMINDER_MIN_INTERVAL_DAYS", "7"))
+REMINDER_PUBLIC_URL = os.getenv("REMINDER_PUBLIC_URL", PUBLIC_URL)
+REMINDER_KEEP_JOBS = 10
+REMINDER_FAILURE_LIMIT = 200
+
+PENDING_CONDITION = """
+    (i.status NOT IN ('Paid', 'Cancelled')
+     AND COALESCE(i.amount_due, i.total_amount) > 0)
+"""
+
+_SCOPES = {"overdue": OVERDUE_CONDITION, "pending": PENDING_CONDITION}
+
+_REMINDER_SQL = """
+    SELECT
+        ct.id            AS contact_id,
+        ct.name          AS contact_name,
+        ct.email         AS contact_email,
+        c.company_name,
+        array_agg(i.id ORDER BY i.invoice_date, i.id)             AS invoice_ids,
+        array_agg(i.invoice_number ORDER BY i.invoice_date, i.id) AS invoice_numbers,
+        array_agg(i.invoice_date ORDER BY i.invoice_date, i.id)   AS invoice_dates,
+        array_agg(COALESCE(i.amount_due, i.total_amount) ORDER BY i.invoice_date, i.id) AS amounts_due
+    FROM invoices i
+    JOIN clients c ON c.id = i.client_id
+    LEFT JOIN contacts ct ON ct.id = i.contact_id AND ct.company_id = i.client_id
+    WHERE {condition}
+      AND (i.last_reminder_at IS NULL
+           OR i.last_reminder_at < CURRENT_TIMESTAMP - %s * INTERVAL '1 day')
+      AND (%s::int IS NULL OR i.client_id = %s)
+    GROUP BY ct.id, ct.name, ct.email, c.id, c.company_name
+    ORDER BY c.id, ct.id
+"""
+
+
+class RateLimiter:
+    """Spaces calls at least 1 / ``rate`` seconds apart across threads."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next = 0.0
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class ReminderJob:
+    def __init__(self, scope: str, dry_run: bool, client_id: Optional[int]):
+        self.id = uuid.uuid4().hex[:12]
+        self.scope = scope
+        self.dry_run = dry_run
+        self.client_id = client_id
+        self.status = "running"
+        self.error: Optional[str] = None
+
+        self.contacts = 0
+        self.invoices = 0
+        self.skipped_invoices = 0      # no contact email
+        self.sent = 0
+        self.failed = 0
+        self.amount_due = Decimal("0.00")
+        self.batches: List[dict] = []
+        self.failures: List[dict] = []
+
+        self.started = time.time()
+        self.finished: Optional[float] = None
+        self.lock = threading.Lock()
+
+    def report(self) -> dict:
+        with self.lock:
+            elapsed = (self.finished or time.time()) - self.started
+            done = self.sent + self.failed
+            return {
+                "job_id": self.id,
+                "status": self.status,
+                "scope": self.scope,
+                "dry_run": self.dry_run,
+                "client_id": self.client_id,
+                "error": self.error,
+                "contacts": self.contacts,
+                "invoices": self.invoices,
+                "skipped_invoices": self.skipped_invoices,
+                "amount_due": self.amount_due,
+                "sent": self.sent,
+                "failed": self.failed,
+                "percent": round(done / self.contacts * 100, 1) if self.contacts else 100.0,
+                "elapsed_seconds": round(elapsed, 2),
+                "emails_per_second": round(self.sent / elapsed, 1) if elapsed > 0 else 0.0,
+                "batches": list(self.batches),
+                "failures": list(self.failures),
+            }
+
+
+# ============================================================
+# SELECT / RENDER
+# ============================================================
+def _load_statements(job: ReminderJob) -> List[dict]:
+    """One message per contact, rendered once; counts what is left out on ``job``."""
+    conn = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        params = [INVOICE_DUE_DAYS] if job.scope == "overdue" else []
+        cursor.execute(
+            _REMINDER_SQL.format(condition=_SCOPES[job.scope]),
+            params + [REMINDER_MIN_INTERVAL_DAYS, job.client_id, job.client_id],
+        )
+        rows = cursor.fetchall()
+    finally:
+        if conn:
+            conn.close()
+
+    today = date.today()
+    statements = []
+    invoice_count, skipped, amount_due = 0, 0, Decimal("0.00")
+    for row in rows:
+        if not (row["contact_email"] or "").strip():
+            skipped += len(row["invoice_ids"])
+            continue
+
+        invoices = [
+            {"id": invoice_id, "number": number, "date": format_doc_date(invoice_date),
+             "days_overdue": max((today - invoice_date).days - INVOICE_DUE_DAYS, 0),
+             "amount_due": amount}
+            for invoice_id, number, invoice_date, amount in zip(
+                row["invoice_ids"], row["invoice_numbers"], row["invoice_dates"], row["amounts_due"])
+        ]
+        total_due = sum(row["amounts_due"], Decimal("0.00"))
+        subject, html = render_reminder_email(
+            row["contact_name"], row["company_name"], invoices, total_due, REMINDER_PUBLIC_URL)
+        statements.append({
+            "contact_id": row["contact_id"],
+            "invoice_ids": row["invoice_ids"],
+            "message": {
+                "from": FROM_EMAIL,
+                "to": [row["contact_email"].strip()],
+                "subject": subject,
+                "html": html,
+            },
+        })
+        invoice_count += len(invoices)
+        amount_due += total_due
+
+    with job.lock:
+        job.contacts = len(statements)
+        job.invoices = invoice_count
+        job.skipped_invoices = skipped
+        job.amount_due = amount_due
+    return statements
+
+
+# ============================================================
+# DISPATCH
+# ============================================================
+def _mark_reminded(invoice_ids: List[int]):
+    conn = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            "UPDATE invoices SET last_reminder_at = CURRENT_TIMESTAMP WHERE id = ANY(%s)",
+            (invoice_ids,),
+        )
+        conn.commit()
+    finally:
+        if conn:
+            conn.close()
+
+
+def _send_batch(job: ReminderJob, number: int, batch: List[dict], limiter: RateLimiter):
+    key = f"reminders-{job.id}-{number}"
+    started = time.perf_counter()
+    error, attempts = None, 0
+    for attempts in range(1, REMINDER_RETRIES + 2):
+        try:
+            if not job.dry_run:
+                limiter.wait()
+                call_email_provider(email_transport.send_batch, [s["message"] for s in batch], key)
+            error = None
+            break
+        except PermanentEmailError as e:
+            error = str(e)
+            break
+        except EmailUnavailable as e:
+            error = str(e)
+            if attempts <= REMINDER_RETRIES:
+                time.sleep(max(e.retry_after, REMINDER_BACKOFF_SECONDS))
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            if attempts <= REMINDER_RETRIES:
+                time.sleep(REMINDER_BACKOFF_SECONDS * 2 ** (attempts - 1))
+
+    if error is None and not job.dry_run:
+        try:
+            _mark_reminded([i for s in batch for i in s["invoice_ids"]])
+        except Exception as e:
+            print(f"Reminder batch {number}: sent, but last_reminder_at not saved: {e}")
+
+    seconds = time.perf_counter() - started
+    with job.lock:
+        job.batches.append({
+            "batch": number,
+            "size": len(batch),
+            "attempts": attempts,
+            "ok": error is None,
+            "seconds": round(seconds, 3),
+            "emails_per_second": round(len(batch) / seconds, 1) if seconds > 0 else None,
+        })
+        if error is None:
+            job.sent += len(batch)
+            return
+        job.failed += len(batch)
+        for statement in batch:
+            if len(job.failures) < REMINDER_FAILURE_LIMIT:
+                job.failures.append({
+                    "batch": number,
+                    "contact_id": statement["contact_id"],
+                    "to": statement["message"]["to"],
+                    "invoice_ids": statement["invoice_ids"],
+                    "error": error,
+                })
+
+
+def run_reminders(job: ReminderJob):
+    try:
+        statements = _load_statements(job)
+        batches = [statements[n:n + REMINDER_BATCH_SIZE] for n in range(0, len(statements), REMINDER_BATCH_SIZE)]
+        limiter = RateLimiter(REMINDER_RATE_LIMIT)
+        with ThreadPoolExecutor(max_workers=max(REMINDER_CONCURRENCY, 1),
+                                thread_name_prefix=f"reminders-{job.id}") as pool:
+            futures = [pool.submit(_send_batch, job, n + 1, batch, limiter) for n, batch in enumerate(batches)]
+            for future in futures:
+                future.result()
+        job.status = "done"
+
+    except Exception as e:
+        job.status = "failed"
+        job.error = str(e)
+
+    finally:
+        job.finished = time.time()
+
+
+# ============================================================
+# REGISTRY
+# ============================================================
+_jobs: "OrderedDict[str, ReminderJob]" = OrderedDict()
+_jobs_lock = threading.Lock()
+
+
+def start_reminders(scope: str = "overdue", dry_run: bool = False, client_id: Optional[int] = None) -> dict:
+    """Start a reminder campaign in the background; 409 while another one is running."""
+    if scope not in _SCOPES:
+        raise HTTPException(status_code=400, detail=f"Invalid scope. Must be one of: {list(_SCOPES)}")
+
+    with _jobs_lock:
+        running = [job for job in _jobs.values() if job.status == "running"]
+        if running:
+            raise HTTPException(status_code=409, detail=f"Reminder campaign {running[0].id} is still running")
+
+        job = ReminderJob(scope=scope, dry_run=dry_run, client_id=client_id)
+        _jobs[job.id] = job
+        while len(_jobs) > REMINDER_KEEP_JOBS:
+            _jobs.popitem(last=False)
+
+    threading.Thread(target=run_reminders, args=(job,), name=f"reminders-{job.id}", daemon=True).start()
+    return job.report()
+
+
+def get_reminders(job_id: str) -> dict:
+    job = _jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Reminder campaign not found")
+    return job.report()
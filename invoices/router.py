@@ -1,22 +1,25 @@
-import json
 import base64
 
-from fastapi import APIRouter, Depends, HTTPException, Response
-from typing import List, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException
+from typing import List, Optional, Union
+from datetime import date
 
-from .models import Invoice, InvoiceCreate, InvoiceStatusUpdate
+from .models import Invoice, InvoiceCreate, InvoicePage, InvoiceStatusUpdate
 from . import service
-from auth.service import verify_token
+from auth.service import require_role, verify_token
 
 from invoices.payments.models import PaymentCreate
 from invoices.payments.service import create_payment
+from invoices.ncf.models import NcfRangeCreate, NcfRangeUpdate
+from invoices.ncf.service import create_ncf_range, get_ncf_status, set_ncf_range_active
+from invoices.reminders import get_reminders, start_reminders
 
-from database import get_db_connection
-from psycopg2.extras import RealDictCursor
+from database import get_db_connection, UnitOfWork, get_unit_of_work
 
 from email_service import send_invoice_email
-from invoices.service import calculate_invoice_totals
-from pdf.builder_invoice import create_invoice_pdf
+from documents.model import invoice_document
+from pdf.builder_invoice import render_invoice_document
+from pdf.executor import pdf_response, render_pdf
 
 router = APIRouter(prefix="/invoices", tags=["invoices"])
 
@@ -27,107 +30,124 @@ def create_invoice(invoice: InvoiceCreate, current_user: dict = Depends(verify_t
     return Invoice(**result)
 
 
-@router.get("/", response_model=List[Invoice])
-def get_invoices(
+@router.get("/", response_model=Union[List[Invoice], InvoicePage])
+async def get_invoices(
     client_id: Optional[int] = None,
     status: Optional[str] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    min_amount_due: Optional[float] = None,
+    max_amount_due: Optional[float] = None,
+    overdue_only: bool = False,
+    include_counts: bool = False,
     current_user: dict = Depends(verify_token),
 ):
-    invoices = service.get_all_invoices(client_id, status)
+    """
+    List invoices. Pass ``limit`` (or ``include_counts``) for a keyset page:
+    {"items", "next_cursor", "counts"}.
+    """
+    invoices = await service.get_all_invoices(
+        client_id, status,
+        limit=limit,
+        cursor=cursor,
+        date_from=date_from,
+        date_to=date_to,
+        min_amount_due=min_amount_due,
+        max_amount_due=max_amount_due,
+        overdue_only=overdue_only,
+        include_counts=include_counts,
+    )
+    if isinstance(invoices, dict):
+        return InvoicePage(**invoices)
     return [Invoice(**inv) for inv in invoices]
 
 
-@router.post("/{invoice_id}/send")
-def send_invoice(invoice_id: int, current_user: dict = Depends(verify_token)):
-    """Send invoice PDF to client via email"""
+# ============================================================
+# NCF RANGES
+# ============================================================
+@router.get("/ncf/ranges")
+def get_ncf_ranges(current_user: dict = Depends(verify_token)):
+    """Authorized NCF ranges with remaining numbers and low / expiring warnings."""
+    return get_ncf_status()
 
-    invoice = service.get_invoice_with_contact(invoice_id)
-    if not invoice:
-        raise HTTPException(status_code=404, detail="Invoice not found")
 
-    client = {
-        "company_name": invoice["company_name"],
-        "address": invoice.get("company_address", ""),
-        "contact_name": invoice.get("contact_name", ""),
-        "email": invoice.get("contact_email", ""),
-        "phone": invoice.get("contact_phone", ""),
-    }
+@router.post("/ncf/ranges")
+def add_ncf_range(data: NcfRangeCreate, current_user: dict = Depends(require_role("admin"))):
+    return create_ncf_range(data)
 
-    raw_charges = invoice.get("included_charges") or {}
-    if isinstance(raw_charges, str):
-        raw_charges = json.loads(raw_charges)
 
-    items = invoice.get("items", [])
-    totals = calculate_invoice_totals(items, raw_charges)
+@router.patch("/ncf/ranges/{range_id}")
+def update_ncf_range(range_id: int, data: NcfRangeUpdate, current_user: dict = Depends(require_role("admin"))):
+    return set_ncf_range_active(range_id, data.active)
 
-    # ---- NEW: fetch payments for this invoice so Historial de Pagos is populated ----
-    conn = get_db_connection()
-    try:
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-        cursor.execute(
-            "SELECT * FROM invoice_payments WHERE invoice_id = %s ORDER BY id ASC",
-            (invoice_id,),
-        )
-        payments = [dict(row) for row in cursor.fetchall()]
-    finally:
-        conn.close()
-    # -------------------------------------------------------------------------------
 
-    pdf_stream = create_invoice_pdf(
-        doc_type="FACTURA",
-        doc_id=invoice["invoice_number"],
-        doc_date=str(invoice["invoice_date"])[:10] if invoice.get("invoice_date") else "",
-        client=client,
-        project_name=invoice.get("project_name", ""),
-        notes=invoice.get("notes", ""),
-        items=items,
-        charges=raw_charges,
-        items_total=totals["items_total"],
-        total_discounts=totals["total_discounts"],
-        items_after_discount=totals["items_after_discount"],
-        supervision=totals["supervision"],
-        supervision_pct=raw_charges.get("supervision_percentage", 10.0),
-        admin=totals["admin"],
-        admin_pct=raw_charges.get("admin_percentage", 4.0),
-        insurance=totals["insurance"],
-        insurance_pct=raw_charges.get("insurance_percentage", 1.0),
-        transport=totals["transport"],
-        transport_pct=raw_charges.get("transport_percentage", 3.0),
-        contingency=totals["contingency"],
-        contingency_pct=raw_charges.get("contingency_percentage", 3.0),
-        subtotal_general=totals["subtotal_general"],
-        itbis=totals["itbis"],
-        grand_total=totals["grand_total"],
-        payment_terms=None,
-        valid_until=None,
-        amount_paid=invoice.get("amount_paid", 0),
-        amount_due=invoice.get("amount_due", 0),
-        payments=payments,  # ✅ now the PDF has the full payment history
-    )
+# ============================================================
+# PAYMENT REMINDERS
+# ============================================================
+@router.post("/reminders", status_code=202)
+def start_reminder_campaign(
+    scope: str = "overdue",
+    dry_run: bool = False,
+    client_id: Optional[int] = None,
+    current_user: dict = Depends(require_role("admin")),
+):
+    """
+    Email every contact a statement of its overdue (scope=overdue) or unpaid
+    (scope=pending) invoices in the background; poll GET /invoices/reminders/{job_id}.
+    """
+    return start_reminders(scope, dry_run, client_id)
+
+
+@router.get("/reminders/{job_id}")
+def get_reminder_campaign(job_id: str, current_user: dict = Depends(require_role("admin"))):
+    return get_reminders(job_id)
+
+
+@router.post("/{invoice_id}/send", status_code=202)
+def send_invoice(
+    invoice_id: int,
+    idempotency_key: Optional[str] = Header(None),
+    current_user: dict = Depends(verify_token),
+    uow: UnitOfWork = Depends(get_unit_of_work),
+):
+    """Queue the invoice PDF for sending to the client; poll GET /emails/{job_id}."""
 
-    pdf_bytes = pdf_stream.read()
+    invoice = service.get_invoice_with_contact(invoice_id, uow)
+    if not invoice:
+        raise HTTPException(status_code=404, detail="Invoice not found")
 
-    send_invoice_email(
+    pdf_bytes = render_pdf(f"invoice:{invoice_id}", invoice_document(invoice), render_invoice_document)
+
+    job = send_invoice_email(
         contact_email=invoice["contact_email"],
         contact_name=invoice["contact_name"],
         company_name=invoice["company_name"],
         project_name=invoice.get("project_name", ""),
         invoice_id=str(invoice["id"]),
         pdf_bytes=pdf_bytes,
+        idempotency_key=idempotency_key,
+        uow=uow,
     )
 
-    return {"message": "Factura enviada exitosamente", "invoice_id": invoice_id}
+    return {
+        "message": "Factura en cola de envío",
+        "invoice_id": invoice_id,
+        "job_id": job["job_id"],
+        "status": job["status"],
+    }
 
 
 @router.get("/{invoice_id}", response_model=Invoice)
-def get_invoice(invoice_id: int, current_user: dict = Depends(verify_token)):
-    result = service.get_invoice_by_id(invoice_id)
+async def get_invoice(invoice_id: int, current_user: dict = Depends(verify_token)):
+    result = await service.get_invoice_by_id(invoice_id)
     return Invoice(**result)
 
 
 @router.get("/number/{invoice_number}", response_model=Invoice)
-def get_invoice_by_number(invoice_number: str, current_user: dict = Depends(verify_token)):
-    result = service.get_invoice_by_number(invoice_number)
+async def get_invoice_by_number(invoice_number: str, current_user: dict = Depends(verify_token)):
+    result = await service.get_invoice_by_number(invoice_number)
     return Invoice(**result)
 
 
@@ -157,87 +177,22 @@ def add_payment(invoice_id: int, data: PaymentCreate):
 
 
 @router.get("/{invoice_id}/public")
-def get_public_invoice(invoice_id: int):
+async def get_public_invoice(invoice_id: int):
     """Public invoice view without authentication"""
-    invoice = service.get_invoice_with_contact(invoice_id)
-    if not invoice:
-        raise HTTPException(status_code=404, detail="Invoice not found")
-
-    return invoice
+    return await service.get_invoice_public_async(invoice_id)
 
 
 @router.get("/{invoice_id}/public/pdf")
-def get_public_invoice_pdf(invoice_id: int):
+def get_public_invoice_pdf(invoice_id: int, uow: UnitOfWork = Depends(get_unit_of_work)):
     """Public PDF download for invoices"""
 
-    invoice = service.get_invoice_with_contact(invoice_id)
+    invoice = service.get_invoice_with_contact(invoice_id, uow)
     if not invoice:
         raise HTTPException(status_code=404, detail="Invoice not found")
 
-    raw_charges = invoice.get("included_charges") or {}
-    if isinstance(raw_charges, str):
-        raw_charges = json.loads(raw_charges)
-
-    items = invoice.get("items", [])
-    totals = calculate_invoice_totals(items, raw_charges)
-
-    # ---- NEW: fetch payments for this invoice so Historial de Pagos matches download ----
-    conn = get_db_connection()
-    try:
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-        cursor.execute(
-            "SELECT * FROM invoice_payments WHERE invoice_id = %s ORDER BY id ASC",
-            (invoice_id,),
-        )
-        payments = [dict(row) for row in cursor.fetchall()]
-    finally:
-        conn.close()
-    # -------------------------------------------------------------------------------
-
-    pdf_stream = create_invoice_pdf(
-        doc_type="FACTURA",
-        doc_id=invoice["invoice_number"],
-        doc_date=str(invoice["invoice_date"])[:10] if invoice.get("invoice_date") else "",
-        client={
-            "company_name": invoice["company_name"],
-            "address": invoice.get("company_address", ""),
-            "contact_name": invoice.get("contact_name", ""),
-            "email": invoice.get("contact_email", ""),
-            "phone": invoice.get("contact_phone", ""),
-        },
-        project_name=invoice.get("project_name", ""),
-        notes=invoice.get("notes", ""),
-        items=items,
-        charges=raw_charges,
-        items_total=totals["items_total"],
-        total_discounts=totals["total_discounts"],
-        items_after_discount=totals["items_after_discount"],
-        supervision=totals["supervision"],
-        supervision_pct=raw_charges.get("supervision_percentage", 10.0),
-        admin=totals["admin"],
-        admin_pct=raw_charges.get("admin_percentage", 4.0),
-        insurance=totals["insurance"],
-        insurance_pct=raw_charges.get("insurance_percentage", 1.0),
-        transport=totals["transport"],
-        transport_pct=raw_charges.get("transport_percentage", 3.0),
-        contingency=totals["contingency"],
-        contingency_pct=raw_charges.get("contingency_percentage", 3.0),
-        subtotal_general=totals["subtotal_general"],
-        itbis=totals["itbis"],
-        grand_total=totals["grand_total"],
-        payment_terms=None,
-        valid_until=None,
-        amount_paid=invoice.get("amount_paid", 0),
-        amount_due=invoice.get("amount_due", 0),
-        payments=payments,  # ✅ same payment history as internal/download PDF
-    )
-
-    pdf_bytes = pdf_stream.read()
-
-    return Response(
-        content=pdf_bytes,
-        media_type="application/pdf",
-        headers={
-            "Content-Disposition": f"attachment; filename=factura_{invoice_id}.pdf"
-        },
+    return pdf_response(
+        f"invoice:{invoice_id}",
+        invoice_document(invoice),
+        render_invoice_document,
+        f"attachment; filename=factura_{invoice_id}.pdf",
     )
\ No newline at end of file
@@ -1,57 +1,21 @@
-from typing import List, Optional
+from typing import Optional
 from fastapi import HTTPException
-from datetime import datetime
+from datetime import datetime, date
 import json
-from database import get_db_connection
+import os
+from database import get_db_connection, UnitOfWork
+from async_database import fetch_all, fetch_one
+from utils.pagination import DEFAULT_PAGE_SIZE, check_page_size, decode_cursor, encode_cursor
+from utils.totals import calculate_totals, parse_totals
+from documents.loader import load_invoice_document, load_invoice_document_async
+from documents.numbering import next_invoice_number
+from invoices.ncf.service import stamp_invoice_ncf
+from pdf.prerender import prerender_invoice
 from psycopg2.extras import RealDictCursor
 
 
-def generate_invoice_number() -> str:
-    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-    return f"INV-{timestamp}"
-
-
-def calculate_invoice_totals(items: List[dict], charges: dict) -> dict:
-    items_total = sum(float(item["quantity"] or 0) * float(item["unit_price"] or 0) for item in items)
-    total_discounts = 0
-    for item in items:
-        subtotal = float(item["quantity"] or 0) * float(item["unit_price"] or 0)
-        if item.get("discount_type") == "percentage":
-            total_discounts += subtotal * (float(item.get("discount_value", 0)) / 100)
-        elif item.get("discount_type") == "fixed":
-            total_discounts += float(item.get("discount_value", 0))
-
-    items_after_discount = items_total - total_discounts
-
-    supervision_pct = float(charges.get("supervision_percentage", 10.0))
-    admin_pct = float(charges.get("admin_percentage", 4.0))
-    insurance_pct = float(charges.get("insurance_percentage", 1.0))
-    transport_pct = float(charges.get("transport_percentage", 3.0))
-    contingency_pct = float(charges.get("contingency_percentage", 3.0))
-
-    supervision = items_after_discount * (supervision_pct / 100) if charges.get("supervision") else 0
-    admin = items_after_discount * (admin_pct / 100) if charges.get("admin") else 0
-    insurance = items_after_discount * (insurance_pct / 100) if charges.get("insurance") else 0
-    transport = items_after_discount * (transport_pct / 100) if charges.get("transport") else 0
-    contingency = items_after_discount * (contingency_pct / 100) if charges.get("contingency") else 0
-
-    subtotal_general = items_after_discount + supervision + admin + insurance + transport + contingency
-    itbis = subtotal_general * 0.18
-    grand_total = subtotal_general + itbis
-
-    return {
-        "items_total": items_total,
-        "total_discounts": total_discounts,
-        "items_after_discount": items_after_discount,
-        "supervision": supervision,
-        "admin": admin,
-        "insurance": insurance,
-        "transport": transport,
-        "contingency": contingency,
-        "subtotal_general": subtotal_general,
-        "itbis": itbis,
-        "grand_total": grand_total,
-    }
+def generate_invoice_number(cursor=None) -> str:
+    return next_invoice_number(cursor)
 
 
 def create_invoice_from_quote(quote_id: str, notes: Optional[str] = None) -> dict:
@@ -98,10 +62,10 @@ def create_invoice_from_quote(quote_id: str, notes: Optional[str] = None) -> dic
                 "contingency": True, "contingency_percentage": 3.0,
             }
 
-        totals = calculate_invoice_totals(items, charges)
+        totals = parse_totals(quote.get("totals")) or calculate_totals(items, charges)
         grand_total = totals["grand_total"]
 
-        invoice_number = generate_invoice_number()
+        invoice_number = generate_invoice_number(cursor)
         invoice_date = datetime.now().strftime("%Y-%m-%d")
 
         cursor.execute("""
@@ -111,7 +75,7 @@ def create_invoice_from_quote(quote_id: str, notes: Optional[str] = None) -> dic
             VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
             RETURNING id, invoice_number, quote_id, client_id, total_amount,
                       amount_paid, amount_due, status, invoice_date, notes,
-                      created_at, updated_at
+                      ncf, ncf_type, created_at, updated_at
         """, (
             quote_id,
             invoice_number,
@@ -131,7 +95,11 @@ def create_invoice_from_quote(quote_id: str, notes: Optional[str] = None) -> dic
             (quote_id,),
         )
 
+        # Fiscal number last: its range row stays locked only until the commit
+        invoice.update(stamp_invoice_ncf(cursor, invoice["id"], quote["client_id"]))
+
         conn.commit()
+        prerender_invoice(invoice["id"])
 
         invoice["items"] = items
         invoice["totals"] = totals
@@ -151,108 +119,186 @@ def create_invoice_from_quote(quote_id: str, notes: Optional[str] = None) -> dic
             conn.close()
 
 
-def get_all_invoices(client_id: Optional[int] = None, status: Optional[str] = None) -> List[dict]:
-    conn = None
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
+# Days after invoice_date before an unpaid invoice counts as overdue.
+INVOICE_DUE_DAYS = int(os.getenv("INVOICE_DUE_DAYS", "30"))
+
+# Invoice is overdue: flagged as such, or still owing past its due window.
+OVERDUE_CONDITION = """
+    (i.status = 'Overdue'
+     OR (i.status NOT IN ('Paid', 'Cancelled')
+         AND COALESCE(i.amount_due, i.total_amount) > 0
+         AND i.invoice_date < CURRENT_DATE - %s::int))
+"""
+
+
+async def get_all_invoices(
+    client_id: Optional[int] = None,
+    status: Optional[str] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    min_amount_due: Optional[float] = None,
+    max_amount_due: Optional[float] = None,
+    overdue_only: bool = False,
+    include_counts: bool = False,
+):
+    """
+    List invoices, newest invoice_date first.
 
-        query = """
-            SELECT
-                i.id,
-                i.quote_id,
-                i.invoice_number,
-                i.invoice_date,
-                i.client_id,
-                c.company_name AS client_name,
-                i.total_amount,
-                COALESCE(i.amount_paid, 0) AS amount_paid,
-                COALESCE(i.amount_due, i.total_amount) AS amount_due,
-                i.status,
-                i.notes,
-                i.created_at,
-                i.updated_at
-            FROM invoices i
-            JOIN clients c ON i.client_id = c.id
-            WHERE 1=1
+    Without ``limit`` (and without ``include_counts``) the full filtered list
+    is returned, as before. Otherwise the result is a keyset-paginated page
+    ``{"items", "next_cursor", "counts"}`` ordered by (invoice_date, id).
+
+    With ``include_counts`` the page carries per-status count / total_amount /
+    amount_due for every invoice matching the filters other than ``status``
+    (so dashboard tabs can show all statuses), computed in the same
+    statement with GROUPING SETS.
+    """
+    paginated = limit is not None or include_counts
+    if paginated:
+        limit = check_page_size(limit if limit is not None else DEFAULT_PAGE_SIZE)
+
+    base = """
+        SELECT
+            i.id,
+            i.quote_id,
+            i.invoice_number,
+            i.ncf,
+            i.invoice_date,
+            i.client_id,
+            c.company_name AS client_name,
+            i.total_amount,
+            COALESCE(i.amount_paid, 0) AS amount_paid,
+            COALESCE(i.amount_due, i.total_amount) AS amount_due,
+            i.status,
+            i.notes,
+            i.created_at,
+            i.updated_at
+        FROM invoices i
+        JOIN clients c ON i.client_id = c.id
+        WHERE 1=1
+    """
+    params = []
+
+    if client_id:
+        base += " AND i.client_id = %s"
+        params.append(client_id)
+    if date_from:
+        base += " AND i.invoice_date >= %s"
+        params.append(date_from)
+    if date_to:
+        base += " AND i.invoice_date <= %s"
+        params.append(date_to)
+    if min_amount_due is not None:
+        base += " AND COALESCE(i.amount_due, i.total_amount) >= %s"
+        params.append(min_amount_due)
+    if max_amount_due is not None:
+        base += " AND COALESCE(i.amount_due, i.total_amount) <= %s"
+        params.append(max_amount_due)
+    if overdue_only:
+        base += " AND " + OVERDUE_CONDITION
+        params.append(INVOICE_DUE_DAYS)
+
+    page_filter = ""
+    page_params = []
+    if status:
+        page_filter += " AND status = %s"
+        page_params.append(status)
+
+    if not paginated:
+        query = f"SELECT * FROM ({base}) f WHERE 1=1{page_filter} ORDER BY invoice_date DESC, id DESC"
+        return await fetch_all(query, params + page_params)
+
+    if cursor:
+        page_filter += " AND (invoice_date, id) < (%s::date, %s)"
+        page_params.extend(decode_cursor(cursor, 2))
+
+    page_sql = f"""
+        SELECT * FROM filtered
+        WHERE 1=1{page_filter}
+        ORDER BY invoice_date DESC, id DESC
+        LIMIT %s
+    """
+    page_params.append(limit + 1)
+
+    if include_counts:
+        query = f"""
+            WITH filtered AS ({base}),
+            grouped AS (
+                SELECT
+                    GROUPING(status) AS is_total,
+                    status,
+                    COUNT(*) AS count,
+                    COALESCE(SUM(total_amount), 0) AS total_amount,
+                    COALESCE(SUM(amount_due), 0) AS amount_due
+                FROM filtered
+                GROUP BY GROUPING SETS ((status), ())
+            ),
+            counts AS (
+                SELECT json_build_object(
+                    'by_status', COALESCE(
+                        json_object_agg(COALESCE(status, 'Unknown'),
+                                        json_build_object('count', count,
+                                                          'total_amount', total_amount,
+                                                          'amount_due', amount_due))
+                            FILTER (WHERE is_total = 0),
+                        '{{}}'::json),
+                    'total', COALESCE(
+                        (array_agg(json_build_object('count', count,
+                                                     'total_amount', total_amount,
+                                                     'amount_due', amount_due))
+                            FILTER (WHERE is_total = 1))[1],
+                        json_build_object('count', 0, 'total_amount', 0, 'amount_due', 0))
+                ) AS counts
+                FROM grouped
+            ),
+            page AS ({page_sql})
+            SELECT page.*, counts.counts AS _counts
+            FROM counts
+            LEFT JOIN page ON TRUE
+            ORDER BY page.invoice_date DESC, page.id DESC
         """
-        params = []
+    else:
+        query = f"WITH filtered AS ({base}) {page_sql}"
 
-        if client_id:
-            query += " AND i.client_id = %s"
-            params.append(client_id)
-        if status:
-            query += " AND i.status = %s"
-            params.append(status)
+    rows = await fetch_all(query, params + page_params)
 
-        query += " ORDER BY i.invoice_date DESC"
-        cursor.execute(query, params)
+    counts = None
+    if include_counts:
+        counts = rows[0]["_counts"]
+        rows = [row for row in rows if row["id"] is not None]
+        for row in rows:
+            del row["_counts"]
 
-        return [dict(row) for row in cursor.fetchall()]
-    finally:
-        if conn:
-            conn.close()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor([last["invoice_date"], last["id"]])
 
+    return {"items": rows, "next_cursor": next_cursor, "counts": counts}
 
-def get_invoice_by_id(invoice_id: int) -> dict:
-    conn = None
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
 
-        cursor.execute("SELECT * FROM invoices WHERE id = %s", (invoice_id,))
-        invoice = cursor.fetchone()
-        if not invoice:
-            raise HTTPException(status_code=404, detail="Invoice not found")
+async def get_invoice_by_id(invoice_id: int) -> dict:
+    invoice = await load_invoice_document_async(invoice_id)
 
-        invoice = dict(invoice)
+    # Ensure safe defaults
+    invoice["amount_paid"] = float(invoice.get("amount_paid") or 0)
+    invoice["amount_due"] = float(invoice.get("amount_due") or invoice.get("total_amount") or 0)
 
-        # Ensure safe defaults
-        invoice["amount_paid"] = float(invoice.get("amount_paid") or 0)
-        invoice["amount_due"] = float(invoice.get("amount_due") or invoice.get("total_amount") or 0)
+    # Loader row carries the quote's persisted breakdown; older quotes are priced from the items.
+    invoice["totals"] = invoice["totals"] or calculate_totals(invoice["items"], invoice["included_charges"])
 
-        cursor.execute("SELECT * FROM quote_items WHERE quote_id = %s", (invoice["quote_id"],))
-        items = [dict(row) for row in cursor.fetchall()]
-        invoice["items"] = items
+    return invoice
 
-        cursor.execute("SELECT included_charges FROM quotes WHERE quote_id = %s", (invoice["quote_id"],))
-        quote_row = cursor.fetchone()
-        if quote_row:
-            raw_charges = quote_row["included_charges"]
-            try:
-                if isinstance(raw_charges, str):
-                    charges = json.loads(raw_charges)
-                else:
-                    charges = raw_charges or {}
-            except Exception:
-                charges = {}
-
-            totals = calculate_invoice_totals(items, charges)
-            invoice["totals"] = totals
 
-        return invoice
+async def get_invoice_by_number(invoice_number: str) -> dict:
+    invoice = await fetch_one("SELECT * FROM invoices WHERE invoice_number = %s", (invoice_number,))
+    if not invoice:
+        raise HTTPException(status_code=404, detail="Invoice not found")
 
-    finally:
-        if conn:
-            conn.close()
-
-
-def get_invoice_by_number(invoice_number: str) -> dict:
-    conn = None
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-
-        cursor.execute("SELECT * FROM invoices WHERE invoice_number = %s", (invoice_number,))
-        invoice = cursor.fetchone()
-        if not invoice:
-            raise HTTPException(status_code=404, detail="Invoice not found")
-
-        return dict(invoice)
-
-    finally:
-        if conn:
-            conn.close()
+    return invoice
 
 
 def update_invoice_status(invoice_id: int, status: str) -> dict:
@@ -326,66 +372,40 @@ def delete_invoice(invoice_id: int) -> dict:
         if conn:
             conn.close()
 
-def get_invoice_with_contact(invoice_id: int) -> dict:
+def get_invoice_with_contact(invoice_id: int, uow: Optional[UnitOfWork] = None) -> dict:
     """
-    Load an invoice joined with full client and contact info.
+    Load an invoice joined with full client and contact info, its items,
+    the source quote's charges and the payment history — in one query.
     Always use this when building a PDF or sending an email.
     """
-    conn = None
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-
-        cursor.execute("""
-            SELECT
-                i.id,
-                i.quote_id,
-                i.invoice_number,
-                i.invoice_date,
-                i.client_id,
-                i.total_amount,
-                COALESCE(i.amount_paid, 0) AS amount_paid,
-                COALESCE(i.amount_due, i.total_amount) AS amount_due,
-                i.status,
-                i.notes,
-                i.created_at,
-                i.updated_at,
-
-                c.company_name,
-                c.address AS company_address,
-
-                ct.name  AS contact_name,
-                ct.email AS contact_email,
-                ct.phone AS contact_phone
-
-            FROM invoices i
-            JOIN clients  c  ON i.client_id  = c.id
-            LEFT JOIN quotes q ON TRIM(i.quote_id) = TRIM(q.quote_id)
-            JOIN contacts ct ON i.contact_id = ct.id
-            WHERE i.id = %s
-        """, (invoice_id,))
-
-        row = cursor.fetchone()
-        if not row:
-            raise HTTPException(status_code=404, detail="Invoice not found")
-
-        invoice = dict(row)
-
-        cursor.execute("SELECT * FROM quote_items WHERE quote_id = %s", (invoice["quote_id"],))
-        invoice["items"] = [dict(r) for r in cursor.fetchall()]
-
-        cursor.execute("SELECT included_charges FROM quotes WHERE quote_id = %s", (invoice["quote_id"],))
-        quote_row = cursor.fetchone()
-        if quote_row:
-            raw_charges = quote_row["included_charges"]
-            if isinstance(raw_charges, str):
-                raw_charges = json.loads(raw_charges)
-            invoice["included_charges"] = raw_charges or {}
-        else:
-            invoice["included_charges"] = {}
-
-        return invoice
-
-    finally:
-        if conn:
-            conn.close()
\ No newline at end of file
+    invoice = load_invoice_document(invoice_id, uow)
+    if invoice["contact_name"] is None:
+        raise HTTPException(status_code=404, detail="Invoice not found")
+    return invoice
+
+
+async def get_invoice_with_contact_async(invoice_id: int) -> dict:
+    """Async twin of get_invoice_with_contact for event-loop endpoints."""
+    invoice = await load_invoice_document_async(invoice_id)
+    if invoice["contact_name"] is None:
+        raise HTTPException(status_code=404, detail="Invoice not found")
+    return invoice
+
+
+# Keys of the unauthenticated GET /invoices/{invoice_id}/public view. The
+# loader row carries more (client tax id, totals breakdown, payments) that
+# stays private.
+INVOICE_PUBLIC_FIELDS = (
+    "id", "quote_id", "invoice_number", "invoice_date", "client_id",
+    "total_amount", "amount_paid", "amount_due", "status", "notes",
+    "created_at", "updated_at",
+    "company_name", "company_address",
+    "contact_name", "contact_email", "contact_phone",
+    "items", "included_charges",
+)
+
+
+async def get_invoice_public_async(invoice_id: int) -> dict:
+    """The public view of an invoice: get_invoice_with_contact_async limited to INVOICE_PUBLIC_FIELDS."""
+    invoice = await get_invoice_with_contact_async(invoice_id)
+    return {key: invoice.get(key) for key in INVOICE_PUBLIC_FIELDS}
@@ -1,4 +1,5 @@
 import os
+from contextlib import asynccontextmanager
 from datetime import datetime
 
 from dotenv import load_dotenv
@@ -9,6 +10,28 @@ from uvicorn.middleware.proxy_headers import ProxyHeadersMiddleware
 
 load_dotenv()
 
+# ============================================================
+# LIFESPAN (startup / shutdown)
+# ============================================================
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    from database import open_pool, close_pool
+    from async_database import open_async_pool, close_async_pool
+
+    open_pool()
+    await open_async_pool()
+    preload_pdf_assets()
+    compile_email_templates()
+    start_email_workers()
+    yield
+    shutdown_email_workers()
+    shutdown_pdf_prerender()
+    shutdown_pdf_executor()
+    await close_async_pool()
+    close_pool()
+
+
 # ============================================================
 # FASTAPI APP
 # ============================================================
@@ -17,6 +40,7 @@ app = FastAPI(
     title="METPRO ERP API",
     description="Modular ERP System for Construction & Services",
     version="2.0.0",
+    lifespan=lifespan,
 )
 
 # ============================================================
@@ -62,7 +86,14 @@ if os.path.exists("assets"):
 # ROUTERS (MUST BE IMPORTED AFTER CORS)
 # ============================================================
 
-from database import get_db
+from database import get_db, get_pool_stats
+from async_database import get_async_pool_stats
+from pdf.cache import get_pdf_cache_stats
+from pdf.executor import get_pdf_executor_stats, shutdown_pdf_executor
+from pdf.prerender import get_pdf_prerender_stats, shutdown_pdf_prerender
+from pdf.assets import preload as preload_pdf_assets
+from email_outbox import get_email_outbox_stats, shutdown_email_workers, start_email_workers
+from email_templates import compile_templates as compile_email_templates
 
 from auth.router import router as auth_router
 from users.router import router as users_router
@@ -125,4 +156,10 @@ def health_check():
             "expenses",
             "contacts",
         ],
+        "database_pool": get_pool_stats(),
+        "async_database_pool": get_async_pool_stats(),
+        "pdf_cache": get_pdf_cache_stats(),
+        "pdf_renderer": get_pdf_executor_stats(),
+        "pdf_prerender": get_pdf_prerender_stats(),
+        "email_outbox": get_email_outbox_stats(),
     }
@@ -0,0 +1,177 @@
+"""
+Process-wide registry of PDF assets (TTF fonts, raster images).
+
+pdf.add_font() re-reads and re-parses the TTF on every document and
+pdf.image() re-decodes and re-compresses the PNG. The registry does that work
+once per process and hands each new FPDF document its own lightweight copy:
+
+- Fonts: the parsed metrics (widths, cmap, glyph ids, descriptor) are shared;
+  each document gets a fresh fontTools handle over the in-memory TTF bytes,
+  because fpdf2 subsets that handle in place when the PDF is written.
+- Images: the decoded/compressed image info is shared; each document gets a
+  copy registered in its image cache, so pdf.image(path) finds it there.
+
+Font sharing relies on fpdf2 internals (TTFFont slots), so it is checked
+once per process (preload() or the first add_font) by rendering a throwaway
+document with a shared copy. If that fails, e.g. after an fpdf2 upgrade,
+sharing is switched off for good, reported once, and fonts go through the
+public pdf.add_font. Images fall back to pdf.image the same way.
+"""
+import copy
+import io
+import os
+import threading
+
+from fontTools import ttLib
+from fpdf import FPDF
+from fpdf.fonts import SubsetMap, TTFFont
+from fpdf.image_parsing import get_img_info
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FONT_DIR = os.path.join(BASE_DIR, "fonts")
+ASSET_DIR = os.path.join(BASE_DIR, "assets")
+
+SIGNATURE_FONT_PATH = os.path.join(FONT_DIR, "GreatVibes-Regular.ttf")
+LOGO_PATH = os.path.join(ASSET_DIR, "logo.png")
+
+_lock = threading.Lock()
+_fonts = {}    # (path, style) -> (ttf bytes, template TTFFont)
+_images = {}   # path -> image info template
+_font_sharing = None   # None until checked, then whether shared copies work
+
+
+# ============================================================
+# FONTS
+# ============================================================
+def _load_font(path: str, style: str):
+    key = (path, style)
+    with _lock:
+        cached = _fonts.get(key)
+    if cached is not None:
+        return cached
+
+    with open(path, "rb") as f:
+        data = f.read()
+
+    raw = ttLib.TTFont(io.BytesIO(data), lazy=True)
+    if "glyf" in raw and ".notdef" not in raw["glyf"]:
+        # fpdf2 patches a fallback .notdef glyph into each font handle;
+        # fresh handles would miss it, so such fonts are not shared.
+        template = None
+    else:
+        # Parse once against a throwaway document; only the metrics are kept.
+        template = TTFFont(FPDF(), io.BytesIO(data), "template", style)
+        template.ttfont.close()
+    raw.close()
+
+    with _lock:
+        cached = _fonts.setdefault(key, (data, template))
+    return cached
+
+
+def _share_font(pdf: FPDF, fontkey: str, path: str, data: bytes, template: TTFFont):
+    font = TTFFont.__new__(TTFFont)
+    for slot in TTFFont.__slots__:
+        # hbfont is created lazily by fpdf2 when text shaping is used.
+        if slot != "hbfont" and hasattr(template, slot):
+            setattr(font, slot, getattr(template, slot))
+    font.i = len(pdf.fonts) + 1
+    font.fontkey = fontkey
+    font.ttffile = path
+    font.ttfont = ttLib.TTFont(io.BytesIO(data), recalcTimestamp=False, fontNumber=0, lazy=True)
+    font.missing_glyphs = []
+    font.subset = SubsetMap(font)
+    pdf.fonts[fontkey] = font
+
+
+def _check_font_sharing(path: str = SIGNATURE_FONT_PATH) -> bool:
+    """Whether this fpdf2 accepts shared font copies; tested once per process."""
+    global _font_sharing
+    if _font_sharing is None:
+        try:
+            data, template = _load_font(path, "")
+            if template is not None:
+                probe = FPDF()
+                probe.add_page()
+                _share_font(probe, "probe", path, data, template)
+                probe.set_font("probe", "", 12)
+                probe.cell(text="Probe 0123")
+                probe.output()
+            _font_sharing = True
+        except Exception as e:
+            print(f"Shared PDF fonts disabled, using pdf.add_font: {type(e).__name__}: {e}")
+            _font_sharing = False
+    return _font_sharing
+
+
+def add_font(pdf: FPDF, family: str, path: str = SIGNATURE_FONT_PATH, style: str = "") -> bool:
+    """
+    Register a TTF font on ``pdf`` from the shared registry.
+    Returns False if the font could not be loaded.
+    """
+    style = "".join(sorted(style.upper()))
+    fontkey = f"{family.lower()}{style}"
+    if fontkey in pdf.fonts:
+        return True
+
+    if _check_font_sharing():
+        try:
+            data, template = _load_font(path, style)
+            if template is not None:
+                _share_font(pdf, fontkey, path, data, template)
+                return True
+        except Exception:
+            pass
+
+    try:
+        pdf.add_font(family, style, path)
+        return True
+    except Exception:
+        return False
+
+
+# ============================================================
+# IMAGES
+# ============================================================
+def _load_image(path: str, image_filter: str):
+    key = (path, image_filter)
+    with _lock:
+        if key in _images:
+            return _images[key]
+
+    info = get_img_info(path, None, image_filter)
+    # ICC profiles are indexed per document; leave such images to fpdf2.
+    template = None if info.get("iccp") else info
+
+    with _lock:
+        return _images.setdefault(key, template)
+
+
+def image(pdf: FPDF, path: str = LOGO_PATH, **kwargs):
+    """pdf.image(path, **kwargs), reusing the registry's decoded copy of the image."""
+    cache = pdf.image_cache
+    if path not in cache.images:
+        try:
+            template = _load_image(path, cache.image_filter)
+        except Exception as e:
+            print(f"Image preload failed: {e}")
+            template = None
+        if template is not None:
+            info = copy.copy(template)
+            info["i"] = len(cache.images) + 1
+            info["usages"] = 0
+            info["iccp_i"] = None
+            cache.images[path] = info
+    return pdf.image(path, **kwargs)
+
+
+# ============================================================
+# WARM-UP
+# ============================================================
+def preload():
+    """Parse the standard assets up front (app start / render worker start)."""
+    try:
+        _load_image(LOGO_PATH, "AUTO")
+    except Exception as e:
+        print(f"PDF asset preload failed: {e}")
+    _check_font_sharing()
@@ -1,7 +1,10 @@
 import io
 import os
-from fpdf import FPDF
+from pdf.utils.page_utils import PagedPDF
 from pdf.utils.text_utils import sanitize_text
+from pdf import assets
+from documents.model import Document
+from documents.numbering import conduce_number
 
 # Import external footer helper
 try:
@@ -18,16 +21,19 @@ BASE_DIR = os.path.dirname(os.path.dirname(__file__))
 LOGO_PATH = os.path.join(BASE_DIR, "assets", "logo.png")
 
 
-def create_conduce_pdf(doc_id, doc_date, client, project_name, notes, items):
-    """Generate PDF bytes for a conduce (delivery note)."""
-    pdf = FPDF()
+def create_conduce_pdf(doc: Document):
+    """Generate the PDF stream for a conduce (delivery note) of an invoice document."""
+    header, client = doc.header, doc.party
+    doc_id = conduce_number(header.number)
+
+    pdf = PagedPDF()
     pdf.add_page()
     pdf.set_auto_page_break(auto=True, margin=15)
 
     # ==================== HEADER: METPRO BRANDING ====================
     try:
         if os.path.exists(LOGO_PATH):
-            pdf.image(LOGO_PATH, x=10, y=10, w=15)
+            assets.image(pdf, LOGO_PATH, x=10, y=10, w=15)
         else:
             print(f"Logo not found at: {LOGO_PATH}")
     except Exception as e:
@@ -71,16 +77,16 @@ def create_conduce_pdf(doc_id, doc_date, client, project_name, notes, items):
     pdf.cell(35, 4, 'Fecha:', 0, 0)
     pdf.set_font('Arial', '', 7)
     pdf.set_text_color(30, 30, 30)
-    pdf.cell(0, 4, sanitize_text(doc_date), 0, 1)
+    pdf.cell(0, 4, sanitize_text(header.date), 0, 1)
 
-    if project_name:
+    if header.project_name:
         pdf.set_x(left_x)
         pdf.set_font('Arial', 'B', 7)
         pdf.set_text_color(80, 80, 80)
         pdf.cell(35, 4, 'Proyecto:', 0, 0)
         pdf.set_font('Arial', '', 7)
         pdf.set_text_color(30, 30, 30)
-        pdf.cell(0, 4, sanitize_text(project_name)[:60], 0, 1)
+        pdf.cell(0, 4, sanitize_text(header.project_name)[:60], 0, 1)
 
     # Right column: Client
     pdf.set_xy(right_x, start_y)
@@ -89,25 +95,25 @@ def create_conduce_pdf(doc_id, doc_date, client, project_name, notes, items):
     pdf.cell(25, 4, 'Cliente:', 0, 0)
     pdf.set_font('Arial', '', 7)
     pdf.set_text_color(30, 30, 30)
-    pdf.cell(0, 4, sanitize_text(client["company_name"])[:40], 0, 1)
+    pdf.cell(0, 4, sanitize_text(client.company_name)[:40], 0, 1)
 
-    if client.get('contact_name'):
+    if client.contact_name:
         pdf.set_x(right_x)
         pdf.set_font('Arial', 'B', 7)
         pdf.set_text_color(80, 80, 80)
         pdf.cell(25, 4, 'Contacto:', 0, 0)
         pdf.set_font('Arial', '', 7)
         pdf.set_text_color(30, 30, 30)
-        pdf.cell(0, 4, sanitize_text(client["contact_name"])[:40], 0, 1)
+        pdf.cell(0, 4, sanitize_text(client.contact_name)[:40], 0, 1)
 
-    if client.get('address'):
+    if client.address:
         pdf.set_x(right_x)
         pdf.set_font('Arial', 'B', 7)
         pdf.set_text_color(80, 80, 80)
         pdf.cell(25, 4, 'Direccion:', 0, 0)
         pdf.set_font('Arial', '', 7)
         pdf.set_text_color(30, 30, 30)
-        pdf.cell(0, 4, sanitize_text(client["address"])[:40], 0, 1)
+        pdf.cell(0, 4, sanitize_text(client.address)[:40], 0, 1)
 
     pdf.ln(8)
 
@@ -117,22 +123,25 @@ def create_conduce_pdf(doc_id, doc_date, client, project_name, notes, items):
     pdf.cell(0, 5, 'Items Entregados', 0, 1, 'L')
     pdf.ln(2)
 
-    # Table headers - NO PRICE COLUMNS
-    pdf.set_fill_color(245, 245, 245)
-    pdf.set_draw_color(220, 220, 220)
-    pdf.set_font('Arial', 'B', 7)
-    pdf.set_text_color(60, 60, 60)
-    pdf.cell(140, 6, 'DESCRIPCION', 1, 0, 'L', True)
-    pdf.cell(50, 6, 'CANTIDAD', 1, 1, 'C', True)
+    # Table headers - NO PRICE COLUMNS (repeated on every page)
+    def items_header():
+        pdf.set_fill_color(245, 245, 245)
+        pdf.set_draw_color(220, 220, 220)
+        pdf.set_font('Arial', 'B', 7)
+        pdf.set_text_color(60, 60, 60)
+        pdf.cell(140, 6, 'DESCRIPCION', 1, 0, 'L', True)
+        pdf.cell(50, 6, 'CANTIDAD', 1, 1, 'C', True)
+
+    pdf.start_table(items_header)
 
     # Table rows
     pdf.set_font('Arial', '', 7)
     pdf.set_text_color(30, 30, 30)
     row_color = True
 
-    for item in items:
-        qty = float(item['quantity'] or 0)
-        product_name = sanitize_text(item.get('product_name', 'Item'))[:80]
+    for line in doc.lines:
+        qty = line.quantity
+        product_name = sanitize_text(line.product_name)[:80]
 
         if row_color:
             pdf.set_fill_color(252, 252, 252)
@@ -144,16 +153,17 @@ def create_conduce_pdf(doc_id, doc_date, client, project_name, notes, items):
 
         row_color = not row_color
 
+    pdf.end_table()
     pdf.ln(12)
 
     # ==================== SIGNATURES ====================
     add_footer_with_signature(pdf)
 
-    # ==================== FOOTER ====================
-    pdf.set_y(-15)
-    pdf.set_font('Arial', 'I', 8)
-    pdf.set_text_color(180, 180, 180)
-    pdf.cell(0, 10, 'Pagina 1 de 1', 0, 0, 'C')
-
+    # Footer ("Pagina X de Y") is drawn by PagedPDF on every page.
     pdf_bytes = pdf.output()
     return io.BytesIO(pdf_bytes)
+
+
+def render_conduce_document(doc: Document) -> bytes:
+    """Render the conduce for an invoice Document to PDF bytes."""
+    return create_conduce_pdf(doc).getvalue()
@@ -1,67 +1,17 @@
-import io
+from documents.model import Document
 from pdf.utils.layout_utils import build_quote_invoice_pdf
 
-def create_quote_pdf(
-    doc_type,
-    doc_id,
-    doc_date,
-    client,
-    project_name,
-    notes,
-    items,
-    charges,
-    items_total,
-    total_discounts,
-    items_after_discount,
-    supervision,
-    supervision_pct,
-    admin,
-    admin_pct,
-    insurance,
-    insurance_pct,
-    transport,
-    transport_pct,
-    contingency,
-    contingency_pct,
-    subtotal_general,
-    itbis,
-    grand_total,
 
-    payment_terms=None,
-    valid_until=None
-):
-    """Generate PDF bytes for a quote."""
-
-    pdf_stream = build_quote_invoice_pdf(
-    doc_type=doc_type,
-    doc_id=doc_id,
-    doc_date=doc_date,
-    client=client,
-    project_name=project_name,
-    notes=notes,
-    payment_terms=payment_terms,
-    valid_until=valid_until,
-    items=items,
-    charges=charges,
-    items_total=items_total,
-    total_discounts=total_discounts,
-    items_after_discount=items_after_discount,
-    supervision=supervision,
-    supervision_pct=supervision_pct,
-    admin=admin,
-    admin_pct=admin_pct,
-    insurance=insurance,
-    insurance_pct=insurance_pct,
-    transport=transport,
-    transport_pct=transport_pct,
-    contingency=contingency,
-    contingency_pct=contingency_pct,
-    subtotal_general=subtotal_general,
-    itbis=itbis,
-    grand_total=grand_total,
-)
+def create_quote_pdf(doc: Document):
+    """Generate the PDF stream (BytesIO) for a quote document."""
+    pdf_stream = build_quote_invoice_pdf(doc)
 
     if pdf_stream is None:
         raise ValueError("build_quote_invoice_pdf returned None")
 
     return pdf_stream   # <-- already BytesIO
+
+
+def render_quote_document(doc: Document) -> bytes:
+    """Render a quote Document (documents.model.quote_document) to PDF bytes."""
+    return create_quote_pdf(doc).getvalue()
@@ -0,0 +1,382 @@
+"""
+Two-tier cache for rendered PDF bytes (in-process LRU + shared on-disk).
+
+Entries are keyed by a SHA-256 of the document (documents.model.Document),
+the render function and TEMPLATE_VERSION. Any change to a quote, its items,
+an invoice or its payments changes the document and therefore the key, so stale PDFs
+are never served. The entry previously rendered for the same document is
+dropped when a new version is stored.
+
+Large documents go through open_or_render(): they are rendered straight to
+a file in the disk tier and handed back as an open file for streaming, so
+their bytes never sit in the memory tier or the API process.
+"""
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from dataclasses import fields, is_dataclass
+from typing import Any, BinaryIO, Callable, Optional
+
+# Bump whenever a layout/builder change alters the rendered output.
+TEMPLATE_VERSION = "5"
+
+PDF_CACHE_ENABLED = os.getenv("PDF_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+PDF_CACHE_DIR = os.getenv("PDF_CACHE_DIR", os.path.join(tempfile.gettempdir(), "metpro-pdf-cache"))
+PDF_CACHE_MEMORY_MB = float(os.getenv("PDF_CACHE_MEMORY_MB", "64"))
+PDF_CACHE_DISK_MB = float(os.getenv("PDF_CACHE_DISK_MB", "512"))
+
+
+def _render_name(render: Callable) -> str:
+    return f"{render.__module__}.{render.__qualname__}"
+
+
+def _render_file(render: Callable, document: Any, path: str, run_to_file: Optional[Callable]):
+    if run_to_file is not None:
+        run_to_file(render, document, path)
+    else:
+        with open(path, "wb") as f:
+            f.write(render(document))
+
+
+def _render_temp_file(render: Callable, document: Any, run_to_file: Optional[Callable]) -> BinaryIO:
+    """Render into an anonymous temp file and return it opened for reading."""
+    fd, path = tempfile.mkstemp(suffix=".pdf")
+    os.close(fd)
+    try:
+        _render_file(render, document, path, run_to_file)
+        return open(path, "rb")
+    finally:
+        os.remove(path)   # the open handle keeps the data readable
+
+
+def _update_hash(h, value):
+    """Feed ``value`` into ``h`` piece by piece (no full serialised copy of large documents)."""
+    if is_dataclass(value):
+        values = [getattr(value, f.name) for f in fields(value)]
+        h.update(type(value).__name__.encode())
+        if any(is_dataclass(v) or isinstance(v, (tuple, list)) for v in values):
+            for v in values:
+                _update_hash(h, v)
+        else:
+            h.update(json.dumps(values, default=str).encode())
+    elif isinstance(value, (tuple, list)):
+        h.update(b"[%d" % len(value))
+        for v in value:
+            _update_hash(h, v)
+        h.update(b"]")
+    else:
+        h.update(json.dumps(value, sort_keys=True, separators=(",", ":"), default=str).encode())
+        h.update(b";")
+
+
+def document_key(document: Any, render: Callable) -> str:
+    """Content hash of a document for a given render function."""
+    h = hashlib.sha256(f"{TEMPLATE_VERSION}:{_render_name(render)}:".encode())
+    _update_hash(h, document)
+    return h.hexdigest()
+
+
+class PdfCache:
+    def __init__(self, directory: Optional[str], memory_bytes: int, disk_bytes: int):
+        self.directory = directory
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()   # key -> bytes, least recently used first
+        self._memory_size = 0
+        self._refs = {}                # "render:doc_ref" -> key of latest render
+        self._disk_size = None         # lazily measured
+
+        self._memory_hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    # ------------------------------------------------------------------
+    # PUBLIC API
+    # ------------------------------------------------------------------
+    def get_or_render(self, doc_ref: str, document: Any, render: Callable[[Any], bytes],
+                      run: Optional[Callable] = None) -> bytes:
+        """
+        Return the cached PDF for ``document`` or render it with
+        ``render(document)`` and store it. ``doc_ref`` identifies the
+        document (e.g. "quote:Q-123") so older versions can be dropped.
+        ``run(render, document)``, if given, performs the render (e.g. in
+        the process pool).
+        """
+        key = document_key(document, render)
+        data = self.get(key)
+        if data is None:
+            data = run(render, document) if run is not None else render(document)
+            self.put(key, data, ref=f"{_render_name(render)}:{doc_ref}")
+        return data
+
+    def open_or_render(self, doc_ref: str, document: Any, render: Callable[[Any], bytes],
+                       run_to_file: Optional[Callable] = None) -> BinaryIO:
+        """
+        Like get_or_render, but returns a readable file object instead of the
+        bytes. On a miss the PDF is rendered directly into the disk tier
+        (``run_to_file(render, document, path)`` if given) and is not kept in
+        the memory tier. The caller must close the returned file.
+        """
+        if not self.directory:
+            return _render_temp_file(render, document, run_to_file)
+
+        key = document_key(document, render)
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self._memory_hits += 1
+                return io.BytesIO(data)
+
+        path = self._path(key)
+        try:
+            f = open(path, "rb")
+            os.utime(path)
+            with self._lock:
+                self._disk_hits += 1
+            return f
+        except OSError:
+            pass
+
+        with self._lock:
+            self._misses += 1
+
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            os.close(fd)
+        except OSError as e:
+            print(f"PDF cache write failed: {e}")
+            return _render_temp_file(render, document, run_to_file)
+
+        try:
+            _render_file(render, document, tmp_path, run_to_file)
+            f = open(tmp_path, "rb")
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+        self._register_disk(key, os.fstat(f.fileno()).st_size, ref=f"{_render_name(render)}:{doc_ref}")
+        return f
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self._memory_hits += 1
+                return data
+
+        data = self._read_disk(key)
+        with self._lock:
+            if data is None:
+                self._misses += 1
+                return None
+            self._disk_hits += 1
+            self._store_memory_locked(key, data)
+        return data
+
+    def put(self, key: str, data: bytes, ref: Optional[str] = None):
+        stale = None
+        with self._lock:
+            if ref is not None:
+                stale = self._set_ref_locked(ref, key)
+            self._store_memory_locked(key, data)
+
+        if stale is not None:
+            self._remove_disk(stale)
+        self._write_disk(key, data)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._memory_size = 0
+            self._refs.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._memory_hits + self._disk_hits + self._misses
+            hits = self._memory_hits + self._disk_hits
+            return {
+                "enabled": True,
+                "template_version": TEMPLATE_VERSION,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_size,
+                "memory_max_bytes": self.memory_bytes,
+                "disk_bytes": self._disk_size or 0,
+                "disk_max_bytes": self.disk_bytes,
+                "memory_hits": self._memory_hits,
+                "disk_hits": self._disk_hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            }
+
+    # ------------------------------------------------------------------
+    # MEMORY TIER
+    # ------------------------------------------------------------------
+    def _store_memory_locked(self, key: str, data: bytes):
+        if len(data) > self.memory_bytes:
+            return
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return
+        self._memory[key] = data
+        self._memory_size += len(data)
+        while self._memory_size > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_size -= len(evicted)
+            self._evictions += 1
+
+    def _drop_memory_locked(self, key: str):
+        data = self._memory.pop(key, None)
+        if data is not None:
+            self._memory_size -= len(data)
+
+    def _set_ref_locked(self, ref: str, key: str) -> Optional[str]:
+        """Point ``ref`` at ``key``; returns the superseded key, dropped from memory."""
+        previous = self._refs.get(ref)
+        self._refs[ref] = key
+        if previous is None or previous == key:
+            return None
+        self._drop_memory_locked(previous)
+        return previous
+
+    # ------------------------------------------------------------------
+    # DISK TIER (shared by all worker processes)
+    # ------------------------------------------------------------------
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.pdf")
+
+    def _read_disk(self, key: str) -> Optional[bytes]:
+        if not self.directory:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)   # mtime doubles as last-access time for pruning
+            return data
+        except OSError:
+            return None
+
+    def _write_disk(self, key: str, data: bytes):
+        if not self.directory:
+            return
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"PDF cache write failed: {e}")
+            return
+        self._account_disk(len(data))
+
+    def _account_disk(self, size: int):
+        with self._lock:
+            if self._disk_size is None:
+                self._disk_size = self._measure_disk()
+            else:
+                self._disk_size += size
+            over_budget = self._disk_size > self.disk_bytes
+        if over_budget:
+            self._prune_disk()
+
+    def _register_disk(self, key: str, size: int, ref: str):
+        """Account for a file placed in the disk tier by open_or_render()."""
+        with self._lock:
+            stale = self._set_ref_locked(ref, key)
+        if stale is not None:
+            self._remove_disk(stale)
+        self._account_disk(size)
+
+    def _remove_disk(self, key: str):
+        if not self.directory:
+            return
+        try:
+            size = os.path.getsize(self._path(key))
+            os.remove(self._path(key))
+        except OSError:
+            return
+        with self._lock:
+            if self._disk_size is not None:
+                self._disk_size -= size
+
+    def _disk_entries(self):
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(".pdf"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def _measure_disk(self) -> int:
+        return sum(size for _, size, _ in self._disk_entries())
+
+    def _prune_disk(self):
+        """Delete least recently used files until the tier is at 80% of its budget."""
+        entries = sorted(self._disk_entries())
+        total = sum(size for _, size, _ in entries)
+        target = self.disk_bytes * 0.8
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                continue
+        with self._lock:
+            self._disk_size = total
+
+
+class _DisabledCache:
+    """Stand-in used when PDF_CACHE_ENABLED is off: always renders."""
+
+    def get_or_render(self, doc_ref: str, document: Any, render: Callable[[Any], bytes],
+                      run: Optional[Callable] = None) -> bytes:
+        return run(render, document) if run is not None else render(document)
+
+    def open_or_render(self, doc_ref: str, document: Any, render: Callable[[Any], bytes],
+                       run_to_file: Optional[Callable] = None) -> BinaryIO:
+        return _render_temp_file(render, document, run_to_file)
+
+    def clear(self):
+        pass
+
+    def stats(self) -> dict:
+        return {"enabled": False}
+
+
+if PDF_CACHE_ENABLED:
+    pdf_cache = PdfCache(
+        directory=PDF_CACHE_DIR or None,
+        memory_bytes=int(PDF_CACHE_MEMORY_MB * 1024 * 1024),
+        disk_bytes=int(PDF_CACHE_DISK_MB * 1024 * 1024),
+    )
+else:
+    pdf_cache = _DisabledCache()
+
+
+def get_pdf_cache_stats() -> dict:
+    return pdf_cache.stats()
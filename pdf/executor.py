@@ -0,0 +1,261 @@
+"""
+Process pool for PDF rendering.
+
+fpdf2 layout is CPU-bound pure Python; run inline it holds the GIL and stalls
+every other request served by the same worker. Renders are shipped to a
+ProcessPoolExecutor instead: the parent sends the document (a picklable
+documents.model.Document) plus a module-level render function and gets PDF
+bytes back.
+
+- Back-pressure: at most PDF_RENDER_MAX_PENDING renders may be queued or
+  running; beyond that callers wait up to PDF_RENDER_QUEUE_WAIT seconds and
+  then get 503.
+- Each render is bounded by PDF_RENDER_TIMEOUT seconds (504 on expiry).
+- PDF_RENDER_WORKERS=0 renders inline (no pool), e.g. for local debugging.
+- Documents with PDF_STREAM_MIN_LINES lines or more are written to a file by
+  the worker and streamed to the client in PDF_STREAM_CHUNK_KB chunks
+  (pdf_response), so the API process never holds the whole PDF.
+"""
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, BinaryIO, Callable, Optional
+
+from fastapi import HTTPException
+from fastapi.responses import Response, StreamingResponse
+
+from pdf import assets
+from pdf.cache import pdf_cache
+
+PDF_RENDER_WORKERS = int(os.getenv("PDF_RENDER_WORKERS", str(os.cpu_count() or 1)))
+PDF_RENDER_MAX_PENDING = int(os.getenv("PDF_RENDER_MAX_PENDING", str(max(PDF_RENDER_WORKERS, 1) * 4)))
+PDF_RENDER_QUEUE_WAIT = float(os.getenv("PDF_RENDER_QUEUE_WAIT", "2"))
+PDF_RENDER_TIMEOUT = float(os.getenv("PDF_RENDER_TIMEOUT", "30"))
+# forkserver: children fork from a clean single-threaded server process, not
+# from the (threaded) app process.
+PDF_RENDER_START_METHOD = os.getenv("PDF_RENDER_START_METHOD", "forkserver")
+PDF_STREAM_MIN_LINES = int(os.getenv("PDF_STREAM_MIN_LINES", "500"))
+PDF_STREAM_CHUNK_KB = int(os.getenv("PDF_STREAM_CHUNK_KB", "64"))
+
+
+def _run(render: Callable[[Any], bytes], document: Any) -> tuple:
+    """Executed in the worker process; returns (pdf bytes, render seconds)."""
+    started = time.perf_counter()
+    data = render(document)
+    return bytes(data), time.perf_counter() - started
+
+
+def _run_to_file(render: Callable[[Any], bytes], document: Any, path: str) -> tuple:
+    """Executed in the worker process; writes the PDF to ``path``, returns (size, render seconds)."""
+    started = time.perf_counter()
+    data = render(document)
+    with open(path, "wb") as f:
+        f.write(data)
+    return len(data), time.perf_counter() - started
+
+
+class RenderExecutor:
+    def __init__(self, workers: int, max_pending: int, queue_wait: float, timeout: float,
+                 start_method: str = PDF_RENDER_START_METHOD):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.queue_wait = queue_wait
+        self.timeout = timeout
+        self.start_method = start_method
+
+        self._lock = threading.Lock()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._pending = 0
+
+        self._renders = 0
+        self._failures = 0
+        self._timeouts = 0
+        self._rejected = 0
+        self._render_total = 0.0
+        self._render_max = 0.0
+        self._wait_total = 0.0
+
+    # ------------------------------------------------------------------
+    # LIFECYCLE
+    # ------------------------------------------------------------------
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                methods = multiprocessing.get_all_start_methods()
+                method = self.start_method if self.start_method in methods else "spawn"
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context(method),
+                    initializer=assets.preload,
+                )
+            return self._pool
+
+    def _reset_pool(self, broken: ProcessPoolExecutor):
+        with self._lock:
+            if self._pool is broken:
+                self._pool = None
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    # ------------------------------------------------------------------
+    # RENDER
+    # ------------------------------------------------------------------
+    def render(self, render: Callable[[Any], bytes], document: Any) -> bytes:
+        """Render ``document`` with ``render`` in the pool and return the PDF bytes."""
+        return self._execute(_run, render, document)
+
+    def render_to_file(self, render: Callable[[Any], bytes], document: Any, path: str) -> int:
+        """Render ``document`` in the pool straight into ``path``; returns the file size."""
+        return self._execute(_run_to_file, render, document, path)
+
+    def _execute(self, fn: Callable, *args):
+        """Run ``fn(*args) -> (result, render seconds)`` under back-pressure and timeout."""
+        if self.workers <= 0:
+            result, render_seconds = fn(*args)
+            self._record(render_seconds, 0.0)
+            return result
+
+        queued_at = time.perf_counter()
+        if not self._slots.acquire(timeout=self.queue_wait):
+            with self._lock:
+                self._rejected += 1
+            raise HTTPException(
+                status_code=503,
+                detail="PDF renderer is busy, please retry shortly",
+                headers={"Retry-After": "5"},
+            )
+
+        pool = self._get_pool()
+        try:
+            future = pool.submit(fn, *args)
+        except BrokenProcessPool:
+            self._slots.release()
+            self._reset_pool(pool)
+            raise HTTPException(status_code=500, detail="PDF renderer crashed, please retry")
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._pending += 1
+        # The slot is held until the worker is actually done, even if the
+        # caller gave up on a timeout, so max_pending reflects real load.
+        future.add_done_callback(self._release)
+
+        try:
+            result, render_seconds = future.result(timeout=self.timeout)
+        except FutureTimeout:
+            with self._lock:
+                self._timeouts += 1
+            raise HTTPException(status_code=504, detail="PDF rendering timed out")
+        except BrokenProcessPool:
+            with self._lock:
+                self._failures += 1
+            self._reset_pool(pool)
+            raise HTTPException(status_code=500, detail="PDF renderer crashed, please retry")
+        except Exception:
+            with self._lock:
+                self._failures += 1
+            raise
+
+        self._record(render_seconds, time.perf_counter() - queued_at - render_seconds)
+        return result
+
+    def _release(self, _future):
+        with self._lock:
+            self._pending -= 1
+        self._slots.release()
+
+    def _record(self, render_seconds: float, wait_seconds: float):
+        with self._lock:
+            self._renders += 1
+            self._render_total += render_seconds
+            self._render_max = max(self._render_max, render_seconds)
+            self._wait_total += max(wait_seconds, 0.0)
+
+    # ------------------------------------------------------------------
+    # STATS
+    # ------------------------------------------------------------------
+    def stats(self) -> dict:
+        with self._lock:
+            running = min(self._pending, self.workers)
+            return {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "pending": self._pending,
+                "running": running,
+                "queue_depth": self._pending - running,
+                "renders": self._renders,
+                "failures": self._failures,
+                "timeouts": self._timeouts,
+                "rejected": self._rejected,
+                "render_avg_ms": round(self._render_total / self._renders * 1000, 2) if self._renders else 0.0,
+                "render_max_ms": round(self._render_max * 1000, 2),
+                "overhead_avg_ms": round(self._wait_total / self._renders * 1000, 2) if self._renders else 0.0,
+            }
+
+
+pdf_executor = RenderExecutor(
+    workers=PDF_RENDER_WORKERS,
+    max_pending=PDF_RENDER_MAX_PENDING,
+    queue_wait=PDF_RENDER_QUEUE_WAIT,
+    timeout=PDF_RENDER_TIMEOUT,
+)
+
+
+def render_pdf(doc_ref: str, document: Any, render: Callable[[Any], bytes]) -> bytes:
+    """
+    Cached render: served from pdf_cache when possible, otherwise rendered
+    in the process pool and stored. ``render`` must be a module-level
+    function so it can be sent to the worker processes.
+    """
+    return pdf_cache.get_or_render(doc_ref, document, render, run=pdf_executor.render)
+
+
+def _iter_file(f: BinaryIO, chunk_size: int):
+    try:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        f.close()
+
+
+def pdf_response(doc_ref: str, document: Any, render: Callable[[Any], bytes], disposition: str) -> Response:
+    """
+    HTTP response with the rendered PDF. Small documents are sent from memory
+    (render_pdf); documents with PDF_STREAM_MIN_LINES lines or more are
+    rendered to a file and streamed in chunks.
+    """
+    headers = {"Content-Disposition": disposition}
+    if len(getattr(document, "lines", ())) < PDF_STREAM_MIN_LINES:
+        return Response(content=render_pdf(doc_ref, document, render), media_type="application/pdf", headers=headers)
+
+    f = pdf_cache.open_or_render(doc_ref, document, render, run_to_file=pdf_executor.render_to_file)
+    size = f.seek(0, os.SEEK_END)
+    f.seek(0)
+    headers["Content-Length"] = str(size)
+    return StreamingResponse(
+        _iter_file(f, PDF_STREAM_CHUNK_KB * 1024),
+        media_type="application/pdf",
+        headers=headers,
+    )
+
+
+def get_pdf_executor_stats() -> dict:
+    return pdf_executor.stats()
+
+
+def shutdown_pdf_executor():
+    pdf_executor.shutdown()
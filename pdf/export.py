@@ -0,0 +1,234 @@
+"""
+Bulk PDF export: one ZIP with every quote, invoice and/or conduce matching a
+set of filters, streamed to the client while the documents are rendered.
+
+- Documents are read with a server-side cursor (documents.loader.stream_*),
+  so only a batch of rows is in memory at a time.
+- Renders go through the PDF cache and the render process pool; at most
+  PDF_EXPORT_CONCURRENCY are in flight, which also bounds how many rendered
+  PDFs wait to be written. Cached PDFs are reused, new ones are written to
+  the cache's disk tier rather than its memory tier.
+- Entries are added in completion order and each is copied into the archive
+  in chunks; the ZIP is written to an unseekable sink that is drained after
+  every chunk, so the archive is never held in memory.
+- A document that fails to render does not abort the export: it is listed in
+  errores.txt at the end of the archive.
+- If the client goes away mid-export, queued renders are cancelled, running
+  ones are waited for, and every rendered PDF not yet written is closed.
+"""
+import io
+import os
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import date
+from typing import Iterator, List, Optional, Tuple
+
+from fastapi import HTTPException
+from psycopg2.extras import RealDictCursor
+
+from database import get_db_connection
+from documents.loader import stream_invoice_documents, stream_quote_documents
+from documents.model import invoice_document, quote_document
+from documents.numbering import conduce_number
+from pdf.builder_conduce import render_conduce_document
+from pdf.builder_invoice import render_invoice_document
+from pdf.builder_quote import render_quote_document
+from pdf.cache import pdf_cache
+from pdf.executor import PDF_STREAM_CHUNK_KB, pdf_executor
+
+EXPORT_TYPES = ("quote", "invoice", "conduce")
+
+PDF_EXPORT_MAX_DOCUMENTS = int(os.getenv("PDF_EXPORT_MAX_DOCUMENTS", "5000"))
+PDF_EXPORT_CONCURRENCY = int(os.getenv("PDF_EXPORT_CONCURRENCY", str(max(pdf_executor.workers, 1))))
+PDF_EXPORT_RETRIES = int(os.getenv("PDF_EXPORT_RETRIES", "3"))
+
+
+# ============================================================
+# FILTERS
+# ============================================================
+def parse_doc_types(doc_type: str) -> Tuple[str, ...]:
+    """"invoice,conduce" -> ("invoice", "conduce"); 400 on unknown types."""
+    requested = {t.strip().lower() for t in doc_type.split(",") if t.strip()}
+    unknown = requested - set(EXPORT_TYPES)
+    if not requested or unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"doc_type must be a comma-separated list of: {', '.join(EXPORT_TYPES)}",
+        )
+    return tuple(t for t in EXPORT_TYPES if t in requested)
+
+
+def _where(alias: str, date_column: str, date_from: Optional[date], date_to: Optional[date],
+           client_id: Optional[int], status: Optional[str]) -> Tuple[str, tuple]:
+    clauses, params = [], []
+    if date_from:
+        clauses.append(f"{date_column} >= %s")
+        params.append(date_from)
+    if date_to:
+        clauses.append(f"{date_column} <= %s")
+        params.append(date_to)
+    if client_id is not None:
+        clauses.append(f"{alias}.client_id = %s")
+        params.append(client_id)
+    if status:
+        clauses.append(f"{alias}.status = %s")
+        params.append(status)
+    return " AND ".join(clauses) or "TRUE", tuple(params)
+
+
+def _quote_where(*filters) -> Tuple[str, tuple]:
+    return _where("q", "q.created_at::date", *filters)
+
+
+def _invoice_where(*filters) -> Tuple[str, tuple]:
+    return _where("i", "i.invoice_date", *filters)
+
+
+def count_export_documents(doc_types: Tuple[str, ...], date_from: Optional[date], date_to: Optional[date],
+                           client_id: Optional[int], status: Optional[str]) -> int:
+    """Number of PDFs an export with these filters would contain."""
+    filters = (date_from, date_to, client_id, status)
+    conn = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        total = 0
+        if "quote" in doc_types:
+            where, params = _quote_where(*filters)
+            cursor.execute(f"SELECT COUNT(*) AS n FROM quotes q WHERE {where}", params)
+            total += cursor.fetchone()["n"]
+        invoice_types = [t for t in doc_types if t in ("invoice", "conduce")]
+        if invoice_types:
+            where, params = _invoice_where(*filters)
+            cursor.execute(f"SELECT COUNT(*) AS n FROM invoices i WHERE {where}", params)
+            total += cursor.fetchone()["n"] * len(invoice_types)
+        return total
+    finally:
+        if conn:
+            conn.close()
+
+
+# ============================================================
+# RENDERING
+# ============================================================
+def _export_jobs(conn, doc_types, filters) -> Iterator[tuple]:
+    """(entry name, cache ref, document, render function) for every PDF to export."""
+    if "quote" in doc_types:
+        where, params = _quote_where(*filters)
+        for row in stream_quote_documents(conn, where, params):
+            doc = quote_document(row)
+            yield f"{doc.header.number}_cotizacion.pdf", f"quote:{row['quote_id']}", doc, render_quote_document
+
+    if "invoice" in doc_types or "conduce" in doc_types:
+        where, params = _invoice_where(*filters)
+        for row in stream_invoice_documents(conn, where, params):
+            doc = invoice_document(row)
+            ref = f"invoice:{row['id']}"
+            if "invoice" in doc_types:
+                yield f"{doc.header.number}_factura.pdf", ref, doc, render_invoice_document
+            if "conduce" in doc_types:
+                yield f"{conduce_number(doc.header.number)}_conduce.pdf", ref, doc, render_conduce_document
+
+
+def _render_entry(name: str, ref: str, doc, render) -> tuple:
+    """Runs on the export threads; returns (name, open PDF file or None, error or None)."""
+    for attempt in range(PDF_EXPORT_RETRIES + 1):
+        try:
+            f = pdf_cache.open_or_render(ref, doc, render, run_to_file=pdf_executor.render_to_file)
+            return name, f, None
+        except HTTPException as e:
+            # 503: renderer saturated by other traffic, back off and retry.
+            if e.status_code != 503 or attempt == PDF_EXPORT_RETRIES:
+                return name, None, e.detail
+            time.sleep(2 ** attempt)
+        except Exception as e:
+            return name, None, str(e)
+
+
+# ============================================================
+# ZIP STREAMING
+# ============================================================
+class _ZipSink(io.RawIOBase):
+    """Write-only, unseekable file object collecting ZIP output until drained."""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _write_entry(archive: zipfile.ZipFile, sink: _ZipSink, result: tuple, errors: List[str]) -> Iterator[bytes]:
+    name, f, error = result
+    if f is None:
+        errors.append(f"{name}: {error}")
+        return
+
+    info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+    info.compress_type = zipfile.ZIP_STORED   # PDF streams are already compressed
+    with f, archive.open(info, "w") as entry:
+        while True:
+            chunk = f.read(PDF_STREAM_CHUNK_KB * 1024)
+            if not chunk:
+                break
+            entry.write(chunk)
+            data = sink.drain()
+            if data:
+                yield data
+    data = sink.drain()
+    if data:
+        yield data
+
+
+def stream_export(doc_types: Tuple[str, ...], date_from: Optional[date], date_to: Optional[date],
+                  client_id: Optional[int], status: Optional[str]) -> Iterator[bytes]:
+    """Generator of ZIP bytes for a StreamingResponse."""
+    filters = (date_from, date_to, client_id, status)
+    sink = _ZipSink()
+    errors: List[str] = []
+    threads = ThreadPoolExecutor(max_workers=PDF_EXPORT_CONCURRENCY, thread_name_prefix="pdf-export")
+    pending = set()
+    conn = None
+    try:
+        # Own connection: the request's unit of work is closed before the body streams.
+        conn = get_db_connection()
+        with zipfile.ZipFile(sink, "w") as archive:
+            for name, ref, doc, render in _export_jobs(conn, doc_types, filters):
+                pending.add(threads.submit(_render_entry, name, ref, doc, render))
+                if len(pending) >= PDF_EXPORT_CONCURRENCY:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        # _write_entry closes the PDF even when interrupted.
+                        pending.discard(future)
+                        yield from _write_entry(archive, sink, future.result(), errors)
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    pending.discard(future)
+                    yield from _write_entry(archive, sink, future.result(), errors)
+
+            if errors:
+                archive.writestr("errores.txt", "\n".join(errors) + "\n")
+        yield sink.drain()
+    finally:
+        # Drop queued renders, wait for running ones, close what was never written.
+        threads.shutdown(wait=True, cancel_futures=True)
+        for future in pending:
+            if not future.cancelled():
+                f = future.result()[1]
+                if f is not None:
+                    f.close()
+        if conn:
+            conn.close()
@@ -0,0 +1,172 @@
+"""
+Background pre-rendering of PDFs on status transitions.
+
+When a quote is marked Sent / Approved or an invoice is created, the client
+usually opens the public PDF link soon after. Services call
+prerender_quote() / prerender_invoice() after committing; a background
+thread then renders the PDF exactly as the public endpoint would, so that
+download is a cache hit.
+
+This is best-effort and must never slow down or fail the request:
+
+- jobs go into a bounded queue (PDF_PRERENDER_QUEUE_SIZE); when it is full
+  the job is dropped, as is a job whose render would have to wait for the
+  process pool (503);
+- a document already waiting in the queue is not queued twice;
+- PDF_PRERENDER_ENABLED=false turns the hooks into no-ops.
+"""
+import os
+import queue
+import threading
+from typing import Optional
+
+from documents.loader import load_invoice_document, load_quote_document
+from documents.model import invoice_document, quote_document
+from pdf.builder_invoice import render_invoice_document
+from pdf.builder_quote import render_quote_document
+from pdf.cache import pdf_cache
+from pdf.executor import PDF_STREAM_MIN_LINES, pdf_executor
+
+PDF_PRERENDER_ENABLED = os.getenv("PDF_PRERENDER_ENABLED", "true").lower() in ("1", "true", "yes")
+PDF_PRERENDER_QUEUE_SIZE = int(os.getenv("PDF_PRERENDER_QUEUE_SIZE", "32"))
+
+# Quote statuses after which the client is expected to open the PDF.
+PRERENDER_QUOTE_STATUSES = ("Sent", "Approved")
+
+_STOP = object()
+
+
+class Prerenderer:
+    def __init__(self, queue_size: int):
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._queued = set()      # (kind, id) currently waiting in the queue
+        self._thread: Optional[threading.Thread] = None
+
+        self._submitted = 0
+        self._rendered = 0
+        self._dropped = 0
+        self._failed = 0
+
+    # ------------------------------------------------------------------
+    # SUBMIT
+    # ------------------------------------------------------------------
+    def submit(self, kind: str, doc_id) -> bool:
+        """Queue a pre-render; returns False if it was dropped."""
+        job = (kind, doc_id)
+        with self._lock:
+            if job in self._queued:
+                return True
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                self._dropped += 1
+                return False
+            self._queued.add(job)
+            self._submitted += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._work, name="pdf-prerender", daemon=True)
+                self._thread.start()
+        return True
+
+    # ------------------------------------------------------------------
+    # WORKER
+    # ------------------------------------------------------------------
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            if job is _STOP:
+                return
+            with self._lock:
+                self._queued.discard(job)
+            try:
+                rendered = self._render(*job)
+            except Exception as e:
+                print(f"PDF pre-render failed for {job}: {e}")
+                rendered = None
+            with self._lock:
+                if rendered is None:
+                    self._failed += 1
+                elif rendered:
+                    self._rendered += 1
+                else:
+                    self._dropped += 1
+
+    def _render(self, kind: str, doc_id) -> bool:
+        if kind == "quote":
+            doc = quote_document(load_quote_document(doc_id))
+            ref, render = f"quote:{doc_id}", render_quote_document
+        else:
+            doc = invoice_document(load_invoice_document(doc_id))
+            ref, render = f"invoice:{doc_id}", render_invoice_document
+
+        # Interactive requests come first: skip when the pool has no idle worker.
+        stats = pdf_executor.stats()
+        if pdf_executor.workers > 0 and stats["pending"] >= pdf_executor.workers:
+            return False
+
+        # Same storage path as pdf_response, so the public download hits.
+        if len(doc.lines) >= PDF_STREAM_MIN_LINES:
+            pdf_cache.open_or_render(ref, doc, render, run_to_file=pdf_executor.render_to_file).close()
+        else:
+            pdf_cache.get_or_render(ref, doc, render, run=pdf_executor.render)
+        return True
+
+    # ------------------------------------------------------------------
+    # LIFECYCLE / STATS
+    # ------------------------------------------------------------------
+    def shutdown(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        # Pending jobs are only a cache warm-up; discard them.
+        try:
+            while True:
+                self._queue.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            self._queued.clear()
+        self._queue.put(_STOP)
+        thread.join(timeout=5)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": True,
+                "queue_size": self._queue.maxsize,
+                "queued": len(self._queued),
+                "submitted": self._submitted,
+                "rendered": self._rendered,
+                "dropped": self._dropped,
+                "failed": self._failed,
+            }
+
+
+pdf_prerenderer = Prerenderer(PDF_PRERENDER_QUEUE_SIZE)
+
+
+def prerender_quote(quote_id: str, status: Optional[str] = None):
+    """Warm the cache for a quote's PDF (only for PRERENDER_QUOTE_STATUSES when status is given)."""
+    if not PDF_PRERENDER_ENABLED:
+        return
+    if status is not None and status not in PRERENDER_QUOTE_STATUSES:
+        return
+    pdf_prerenderer.submit("quote", quote_id)
+
+
+def prerender_invoice(invoice_id: int):
+    """Warm the cache for an invoice's PDF."""
+    if PDF_PRERENDER_ENABLED:
+        pdf_prerenderer.submit("invoice", invoice_id)
+
+
+def get_pdf_prerender_stats() -> dict:
+    if not PDF_PRERENDER_ENABLED:
+        return {"enabled": False}
+    return pdf_prerenderer.stats()
+
+
+def shutdown_pdf_prerender():
+    pdf_prerenderer.shutdown()
@@ -1,23 +1,55 @@
 from fastapi import APIRouter, Depends
 from fastapi.responses import StreamingResponse
+from typing import Optional
+from datetime import date
 from . import service
 from auth.service import verify_token
+from database import UnitOfWork, get_unit_of_work
 
 router = APIRouter(prefix='/pdf', tags=['pdf'])
 
 # Quote PDF endpoints
 @router.get('/quotes/{quote_id}')
-def get_quote_pdf(quote_id: str, current_user: dict = Depends(verify_token)):
+def get_quote_pdf(
+    quote_id: str,
+    current_user: dict = Depends(verify_token),
+    uow: UnitOfWork = Depends(get_unit_of_work),
+):
     """Generate quote PDF"""
-    return service.generate_quote_pdf(quote_id)
+    return service.generate_quote_pdf(quote_id, uow)
 
 # Invoice PDF endpoints
 @router.get('/invoices/{invoice_id}')
-def get_invoice_pdf(invoice_id: int, current_user: dict = Depends(verify_token)):
+def get_invoice_pdf(
+    invoice_id: int,
+    current_user: dict = Depends(verify_token),
+    uow: UnitOfWork = Depends(get_unit_of_work),
+):
     """Generate invoice PDF"""
-    return service.generate_invoice_pdf(invoice_id)
+    return service.generate_invoice_pdf(invoice_id, uow)
 
 @router.get('/invoices/{invoice_id}/conduce')
-def get_conduce_pdf(invoice_id: int, current_user: dict = Depends(verify_token)):
+def get_conduce_pdf(
+    invoice_id: int,
+    current_user: dict = Depends(verify_token),
+    uow: UnitOfWork = Depends(get_unit_of_work),
+):
     """Generate conduce (delivery note) PDF for invoice"""
-    return service.generate_conduce_pdf(invoice_id)
+    return service.generate_conduce_pdf(invoice_id, uow)
+
+# Bulk export
+@router.get('/export')
+def export_pdfs(
+    doc_type: str = 'invoice',
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    client_id: Optional[int] = None,
+    status: Optional[str] = None,
+    current_user: dict = Depends(verify_token),
+):
+    """
+    ZIP of all matching PDFs, streamed as they are rendered.
+    doc_type: comma-separated quote, invoice, conduce. Dates filter the quote
+    creation date / invoice date; status applies to each document's own status.
+    """
+    return service.export_pdfs(doc_type, date_from, date_to, client_id, status)
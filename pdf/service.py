@@ -1,151 +1,27 @@
-import json
-import io
 from fastapi import HTTPException
-from fastapi.responses import StreamingResponse
-from database import get_db_connection
-from psycopg2.extras import RealDictCursor
-from datetime import datetime
-from pdf.utils.date_utils import format_date
-from pdf.builder_quote import create_quote_pdf
-from pdf.builder_invoice import create_invoice_pdf
-from pdf.builder_conduce import create_conduce_pdf
-from pdf.utils.layout_utils import build_quote_invoice_pdf   # ✅ ADD THIS
+from fastapi.responses import Response, StreamingResponse
+from datetime import date
+from typing import Optional
+from database import UnitOfWork
+from documents.loader import load_quote_document, load_invoice_document
+from documents.model import quote_document, invoice_document
+from documents.numbering import conduce_number
+from pdf.builder_quote import render_quote_document
+from pdf.builder_invoice import render_invoice_document
+from pdf.builder_conduce import render_conduce_document
+from pdf.executor import pdf_response
+from pdf.export import PDF_EXPORT_MAX_DOCUMENTS, count_export_documents, parse_doc_types, stream_export
 
 
 # ============================================================
 # QUOTE PDF GENERATION
 # ============================================================
-def generate_quote_pdf(quote_id: str) -> StreamingResponse:
-    conn = None
+def generate_quote_pdf(quote_id: str, uow: Optional[UnitOfWork] = None) -> Response:
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-
-        cursor.execute('SELECT * FROM quotes WHERE quote_id = %s', (quote_id,))
-        quote = cursor.fetchone()
-        if not quote:
-            raise HTTPException(status_code=404, detail='Quote not found')
-        quote = dict(quote)
-
-        cursor.execute('SELECT * FROM clients WHERE id = %s', (quote['client_id'],))
-        raw_client = cursor.fetchone()
-        if not raw_client:
-            raise HTTPException(status_code=404, detail='Client not found')
-        raw_client = dict(raw_client)
-
-        # Fetch the contact selected on this quote — not any company default
-        contact = {}
-        if quote.get('contact_id'):
-            cursor.execute(
-                'SELECT name, email, phone FROM contacts WHERE id = %s',
-                (quote['contact_id'],)
-            )
-            row = cursor.fetchone()
-            if row:
-                contact = dict(row)
-
-        # Build client dict with keys that layout_utils.py expects
-        client = {
-            'company_name': raw_client.get('company_name', ''),
-            'address':      raw_client.get('address', ''),
-            'tax_id':       raw_client.get('tax_id', ''),
-            'contact_name': contact.get('name', ''),
-            'email':        contact.get('email', ''),
-            'phone':        contact.get('phone', ''),
-        }
-
-        cursor.execute('SELECT * FROM quote_items WHERE quote_id = %s', (quote_id,))
-        items = [dict(row) for row in cursor.fetchall()]
-
-        raw_charges = quote.get('included_charges')
-        if not raw_charges:
-            charges = {}
-        elif isinstance(raw_charges, str):
-            try:
-                charges = json.loads(raw_charges)
-            except Exception:
-                charges = {}
-        else:
-            charges = raw_charges
-
-        charges.setdefault('supervision', True)
-        charges.setdefault('admin', True)
-        charges.setdefault('insurance', True)
-        charges.setdefault('transport', True)
-        charges.setdefault('contingency', True)
-        charges.setdefault('supervision_percentage', 10.0)
-        charges.setdefault('admin_percentage', 4.0)
-        charges.setdefault('insurance_percentage', 1.0)
-        charges.setdefault('transport_percentage', 3.0)
-        charges.setdefault('contingency_percentage', 3.0)
-
-        items_total = sum(float(item.get('quantity') or 0) * float(item.get('unit_price') or 0) for item in items)
-
-        total_discounts = 0
-        for item in items:
-            subtotal = float(item.get('quantity') or 0) * float(item.get('unit_price') or 0)
-            if item.get('discount_type') == 'percentage':
-                total_discounts += subtotal * (float(item.get('discount_value', 0)) / 100)
-            elif item.get('discount_type') == 'fixed':
-                total_discounts += float(item.get('discount_value', 0))
-
-        items_after_discount = items_total - total_discounts
-
-        supervision_pct = float(charges.get('supervision_percentage', 10.0))
-        admin_pct = float(charges.get('admin_percentage', 4.0))
-        insurance_pct = float(charges.get('insurance_percentage', 1.0))
-        transport_pct = float(charges.get('transport_percentage', 3.0))
-        contingency_pct = float(charges.get('contingency_percentage', 3.0))
-
-        supervision = items_after_discount * (supervision_pct / 100) if charges.get('supervision') else 0
-        admin = items_after_discount * (admin_pct / 100) if charges.get('admin') else 0
-        insurance = items_after_discount * (insurance_pct / 100) if charges.get('insurance') else 0
-        transport = items_after_discount * (transport_pct / 100) if charges.get('transport') else 0
-        contingency = items_after_discount * (contingency_pct / 100) if charges.get('contingency') else 0
-
-        subtotal_general = items_after_discount + supervision + admin + insurance + transport + contingency
-        itbis = subtotal_general * 0.18
-        grand_total = subtotal_general + itbis
-
-        raw_date = quote.get('created_at') or quote.get('updated_at') or ''
-        doc_date = format_date(raw_date)
-
-        payment_terms = quote.get('payment_terms') or ''
-        valid_until = quote.get('valid_until') or ''
-
-        pdf_stream = build_quote_invoice_pdf(
-            doc_type='COTIZACION',
-            doc_id=quote['quote_id'],
-            doc_date=doc_date,
-            client=client,
-            project_name=quote.get('project_name'),
-            notes=quote.get('notes'),
-            payment_terms=payment_terms,
-            valid_until=valid_until,
-            items=items,
-            charges=charges,
-            items_total=items_total,
-            total_discounts=total_discounts,
-            items_after_discount=items_after_discount,
-            supervision=supervision,
-            supervision_pct=supervision_pct,
-            admin=admin,
-            admin_pct=admin_pct,
-            insurance=insurance,
-            insurance_pct=insurance_pct,
-            transport=transport,
-            transport_pct=transport_pct,
-            contingency=contingency,
-            contingency_pct=contingency_pct,
-            subtotal_general=subtotal_general,
-            itbis=itbis,
-            grand_total=grand_total
-        )
-
-        return StreamingResponse(
-            pdf_stream,
-            media_type='application/pdf',
-            headers={'Content-Disposition': f'attachment; filename={quote_id}_cotizacion.pdf'}
+        doc = quote_document(load_quote_document(quote_id, uow))
+        return pdf_response(
+            f"quote:{quote_id}", doc, render_quote_document,
+            f'attachment; filename={quote_id}_cotizacion.pdf'
         )
 
     except HTTPException:
@@ -155,168 +31,17 @@ def generate_quote_pdf(quote_id: str) -> StreamingResponse:
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Quote PDF generation failed: {str(e)}")
-    finally:
-        if conn:
-            conn.close()
 
 
 # ============================================================
 # INVOICE PDF GENERATION
 # ============================================================
-def generate_invoice_pdf(invoice_id: int) -> StreamingResponse:
-    conn = None
+def generate_invoice_pdf(invoice_id: int, uow: Optional[UnitOfWork] = None) -> Response:
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-
-        cursor.execute('SELECT * FROM invoices WHERE id = %s', (invoice_id,))
-        invoice = cursor.fetchone()
-        if not invoice:
-            raise HTTPException(status_code=404, detail='Invoice not found')
-        invoice = dict(invoice)
-
-        cursor.execute('SELECT * FROM clients WHERE id = %s', (invoice['client_id'],))
-        raw_client = cursor.fetchone()
-        if not raw_client:
-            raise HTTPException(status_code=404, detail='Client not found')
-        raw_client = dict(raw_client)
-
-        # Fetch the contact stored on the invoice (carried over from the quote)
-        contact = {}
-        if invoice.get('contact_id'):
-            cursor.execute(
-                'SELECT name, email, phone FROM contacts WHERE id = %s',
-                (invoice['contact_id'],)
-            )
-            row = cursor.fetchone()
-            if row:
-                contact = dict(row)
-
-        client = {
-            'company_name': raw_client.get('company_name', ''),
-            'address':      raw_client.get('address', ''),
-            'tax_id':       raw_client.get('tax_id', ''),
-            'contact_name': contact.get('name', ''),
-            'email':        contact.get('email', ''),
-            'phone':        contact.get('phone', ''),
-        }
-
-        cursor.execute('SELECT * FROM quote_items WHERE quote_id = %s', (invoice['quote_id'],))
-        items = [dict(row) for row in cursor.fetchall()]
-
-        cursor.execute(
-            'SELECT included_charges, project_name, payment_terms, valid_until '
-            'FROM quotes WHERE quote_id = %s',
-            (invoice['quote_id'],)
-        )
-        quote_data = cursor.fetchone()
-
-        if quote_data:
-            raw_charges = quote_data['included_charges']
-            if isinstance(raw_charges, str):
-                try:
-                    charges = json.loads(raw_charges)
-                except Exception:
-                    charges = {}
-            else:
-                charges = raw_charges or {}
-
-            project_name = quote_data.get('project_name')
-            payment_terms = quote_data.get('payment_terms') or ''
-            valid_until = quote_data.get('valid_until') or ''
-        else:
-            charges = {
-                'supervision': True, 'supervision_percentage': 10.0,
-                'admin': True, 'admin_percentage': 4.0,
-                'insurance': True, 'insurance_percentage': 1.0,
-                'transport': True, 'transport_percentage': 3.0,
-                'contingency': True, 'contingency_percentage': 3.0
-            }
-            project_name = None
-            payment_terms = ''
-            valid_until = ''
-
-        # Fetch payments
-        cursor.execute(
-            'SELECT * FROM invoice_payments WHERE invoice_id = %s ORDER BY id ASC',
-            (invoice_id,)
-        )
-        payments = [dict(row) for row in cursor.fetchall()]
-
-        amount_paid = float(invoice.get('amount_paid') or 0)
-        amount_due = float(invoice.get('amount_due') or 0)
-
-        # If amount_paid/amount_due not stored on invoice, calculate from payments
-        if amount_paid == 0 and payments:
-            amount_paid = sum(float(p.get('amount') or 0) for p in payments)
-            amount_due = float(invoice.get('total_amount') or 0) - amount_paid
-
-        items_total = sum(float(item.get('quantity') or 0) * float(item.get('unit_price') or 0) for item in items)
-
-        total_discounts = 0
-        for item in items:
-            subtotal = float(item.get('quantity') or 0) * float(item.get('unit_price') or 0)
-            if item.get('discount_type') == 'percentage':
-                total_discounts += subtotal * (float(item.get('discount_value', 0)) / 100)
-            elif item.get('discount_type') == 'fixed':
-                total_discounts += float(item.get('discount_value', 0))
-
-        items_after_discount = items_total - total_discounts
-
-        supervision_pct = float(charges.get('supervision_percentage', 10.0))
-        admin_pct = float(charges.get('admin_percentage', 4.0))
-        insurance_pct = float(charges.get('insurance_percentage', 1.0))
-        transport_pct = float(charges.get('transport_percentage', 3.0))
-        contingency_pct = float(charges.get('contingency_percentage', 3.0))
-
-        supervision = items_after_discount * (supervision_pct / 100) if charges.get('supervision') else 0
-        admin = items_after_discount * (admin_pct / 100) if charges.get('admin') else 0
-        insurance = items_after_discount * (insurance_pct / 100) if charges.get('insurance') else 0
-        transport = items_after_discount * (transport_pct / 100) if charges.get('transport') else 0
-        contingency = items_after_discount * (contingency_pct / 100) if charges.get('contingency') else 0
-
-        subtotal_general = items_after_discount + supervision + admin + insurance + transport + contingency
-        itbis = subtotal_general * 0.18
-        grand_total = subtotal_general + itbis
-
-        doc_date = format_date(invoice['invoice_date'])
-
-        pdf_stream = build_quote_invoice_pdf(
-            doc_type='FACTURA',
-            doc_id=invoice['invoice_number'],
-            doc_date=doc_date,
-            client=client,
-            project_name=project_name,
-            notes=invoice.get('notes'),
-            payment_terms=payment_terms,
-            valid_until=valid_until,
-            items=items,
-            charges=charges,
-            items_total=items_total,
-            total_discounts=total_discounts,
-            items_after_discount=items_after_discount,
-            supervision=supervision,
-            supervision_pct=supervision_pct,
-            admin=admin,
-            admin_pct=admin_pct,
-            insurance=insurance,
-            insurance_pct=insurance_pct,
-            transport=transport,
-            transport_pct=transport_pct,
-            contingency=contingency,
-            contingency_pct=contingency_pct,
-            subtotal_general=subtotal_general,
-            itbis=itbis,
-            grand_total=grand_total,
-            payments=payments,
-            amount_paid=amount_paid,
-            amount_due=amount_due
-        )
-
-        return StreamingResponse(
-            pdf_stream,
-            media_type='application/pdf',
-            headers={'Content-Disposition': f'attachment; filename={invoice["invoice_number"]}_factura.pdf'}
+        doc = invoice_document(load_invoice_document(invoice_id, uow))
+        return pdf_response(
+            f"invoice:{invoice_id}", doc, render_invoice_document,
+            f'attachment; filename={doc.header.number}_factura.pdf'
         )
 
     except HTTPException:
@@ -326,73 +51,17 @@ def generate_invoice_pdf(invoice_id: int) -> StreamingResponse:
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Invoice PDF generation failed: {str(e)}")
-    finally:
-        if conn:
-            conn.close()
 
 
 # ============================================================
 # CONDUCE PDF GENERATION (NO PRICES)
 # ============================================================
-def generate_conduce_pdf(invoice_id: int) -> StreamingResponse:
-    conn = None
+def generate_conduce_pdf(invoice_id: int, uow: Optional[UnitOfWork] = None) -> Response:
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-
-        cursor.execute('SELECT * FROM invoices WHERE id = %s', (invoice_id,))
-        invoice = cursor.fetchone()
-        if not invoice:
-            raise HTTPException(status_code=404, detail='Invoice not found')
-        invoice = dict(invoice)
-
-        cursor.execute('SELECT * FROM clients WHERE id = %s', (invoice['client_id'],))
-        raw_client = cursor.fetchone()
-        if not raw_client:
-            raise HTTPException(status_code=404, detail='Client not found')
-        raw_client = dict(raw_client)
-
-        # Fetch the contact stored on the invoice
-        contact = {}
-        if invoice.get('contact_id'):
-            cursor.execute(
-                'SELECT name, email, phone FROM contacts WHERE id = %s',
-                (invoice['contact_id'],)
-            )
-            row = cursor.fetchone()
-            if row:
-                contact = dict(row)
-
-        client = {
-            'company_name': raw_client.get('company_name', ''),
-            'address':      raw_client.get('address', ''),
-            'contact_name': contact.get('name', ''),
-            'email':        contact.get('email', ''),
-            'phone':        contact.get('phone', ''),
-        }
-
-        cursor.execute('SELECT * FROM quote_items WHERE quote_id = %s', (invoice['quote_id'],))
-        items = [dict(row) for row in cursor.fetchall()]
-
-        cursor.execute('SELECT project_name FROM quotes WHERE quote_id = %s', (invoice['quote_id'],))
-        quote_data = cursor.fetchone()
-        project_name = quote_data.get('project_name') if quote_data else None
-
-        doc_date = format_date(invoice['invoice_date'])
-
-        pdf_stream = create_conduce_pdf(
-            doc_id=invoice['invoice_number'].replace('INV-', 'CD-'),
-            doc_date=doc_date,
-            client=client,
-            project_name=project_name,
-            notes=invoice.get('notes'),
-            items=items
-        )
-
-        return StreamingResponse(
-            pdf_stream,
-            media_type='application/pdf',
-            headers={'Content-Disposition': f'attachment; filename=CD-{invoice["invoice_number"]}_conduce.pdf'}
+        doc = invoice_document(load_invoice_document(invoice_id, uow))
+        return pdf_response(
+            f"invoice:{invoice_id}", doc, render_conduce_document,
+            f'attachment; filename={conduce_number(doc.header.number)}_conduce.pdf'
         )
 
     except HTTPException:
@@ -402,6 +71,37 @@ def generate_conduce_pdf(invoice_id: int) -> StreamingResponse:
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Conduce generation failed: {str(e)}")
-    finally:
-        if conn:
-            conn.close()
+
+
+# ============================================================
+# BULK EXPORT (ZIP)
+# ============================================================
+def export_pdfs(
+    doc_type: str,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    client_id: Optional[int] = None,
+    status: Optional[str] = None,
+) -> StreamingResponse:
+    doc_types = parse_doc_types(doc_type)
+    if date_from and date_to and date_from > date_to:
+        raise HTTPException(status_code=400, detail="date_from must be on or before date_to")
+
+    total = count_export_documents(doc_types, date_from, date_to, client_id, status)
+    if total == 0:
+        raise HTTPException(status_code=404, detail="No documents match the export filters")
+    if total > PDF_EXPORT_MAX_DOCUMENTS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Export would contain {total} PDFs (max {PDF_EXPORT_MAX_DOCUMENTS}); narrow the filters",
+        )
+
+    period = f"{date_from or 'inicio'}_{date_to or 'hoy'}"
+    return StreamingResponse(
+        stream_export(doc_types, date_from, date_to, client_id, status),
+        media_type='application/zip',
+        headers={
+            'Content-Disposition': f'attachment; filename=metpro_pdfs_{period}.zip',
+            'X-Export-Documents': str(total),
+        }
+    )
@@ -1,7 +1,10 @@
 import io
 import os
-from fpdf import FPDF
+from pdf.utils.page_utils import PagedPDF
 from pdf.utils.text_utils import sanitize_text
+from pdf import assets
+from documents.model import Document
+from documents.numbering import NCF_TYPES
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
 LOGO_PATH = os.path.join(BASE_DIR, "assets", "logo.png")
@@ -17,12 +20,7 @@ def add_footer_with_signature(pdf):
 
     FONT_PATH = os.path.join(BASE_DIR, "fonts", "GreatVibes-Regular.ttf")
 
-    font_loaded = False
-    try:
-        pdf.add_font("GreatVibes", "", FONT_PATH, uni=True)
-        font_loaded = True
-    except Exception as e:
-        print(f"Font load failed: {e}")
+    font_loaded = assets.add_font(pdf, "GreatVibes", FONT_PATH)
 
     # Left — METPRO signature
     pdf.set_xy(15, sig_y)
@@ -50,29 +48,17 @@ def add_footer_with_signature(pdf):
     pdf.cell(75, 4, "Representante Cliente", 0, 1, "C")
 
 
-def build_quote_invoice_pdf(
-    doc_type, doc_id, doc_date, client, project_name, notes, items,
-    charges, items_total, total_discounts, items_after_discount,
-    supervision, supervision_pct, admin, admin_pct, insurance, insurance_pct,
-    transport, transport_pct, contingency, contingency_pct,
-    subtotal_general, itbis, grand_total,
-    payment_terms=None,
-    valid_until=None,
-    payments=None,
-    amount_paid=0,
-    amount_due=0
-):
-    payments = payments or []
-    amount_paid = amount_paid or 0
-    amount_due = amount_due or 0
-
-    pdf = FPDF()
+def build_quote_invoice_pdf(doc: Document):
+    """Quote / invoice layout for a documents.model.Document; returns a BytesIO."""
+    header, client, totals = doc.header, doc.party, doc.totals
+
+    pdf = PagedPDF()
     pdf.add_page()
     pdf.set_auto_page_break(auto=True, margin=15)
 
     try:
         if os.path.exists(LOGO_PATH):
-            pdf.image(LOGO_PATH, x=10, y=10, w=15)
+            assets.image(pdf, LOGO_PATH, x=10, y=10, w=15)
     except Exception as e:
         print(f"Logo loading failed: {str(e)}")
 
@@ -85,7 +71,7 @@ def build_quote_invoice_pdf(
 
     pdf.set_font('Arial', 'B', 14)
     pdf.set_text_color(30, 30, 30)
-    pdf.cell(0, 7, doc_type, 0, 1, 'R')
+    pdf.cell(0, 7, header.doc_type, 0, 1, 'R')
     pdf.set_draw_color(220, 220, 220)
     pdf.line(10, pdf.get_y(), 200, pdf.get_y())
     pdf.ln(6)
@@ -100,11 +86,21 @@ def build_quote_invoice_pdf(
     pdf.set_xy(left_x, start_y)
     pdf.set_font('Arial', 'B', 7)
     pdf.set_text_color(80, 80, 80)
-    label = 'Numero de Cotizacion:' if doc_type == 'COTIZACION' else 'Numero de Factura:'
+    label = 'Numero de Cotizacion:' if doc.is_quote else 'Numero de Factura:'
     pdf.cell(35, 4, label, 0, 0)
     pdf.set_font('Arial', '', 7)
     pdf.set_text_color(30, 30, 30)
-    pdf.cell(0, 4, sanitize_text(doc_id), 0, 1)
+    pdf.cell(0, 4, sanitize_text(header.number), 0, 1)
+
+    if header.ncf:
+        pdf.set_x(left_x)
+        pdf.set_font('Arial', 'B', 7)
+        pdf.set_text_color(80, 80, 80)
+        pdf.cell(35, 4, 'NCF:', 0, 0)
+        pdf.set_font('Arial', '', 7)
+        pdf.set_text_color(30, 30, 30)
+        ncf_label = NCF_TYPES.get(header.ncf_type)
+        pdf.cell(0, 4, sanitize_text(f'{header.ncf} ({ncf_label})' if ncf_label else header.ncf), 0, 1)
 
     pdf.set_x(left_x)
     pdf.set_font('Arial', 'B', 7)
@@ -112,34 +108,34 @@ def build_quote_invoice_pdf(
     pdf.cell(35, 4, 'Fecha:', 0, 0)
     pdf.set_font('Arial', '', 7)
     pdf.set_text_color(30, 30, 30)
-    pdf.cell(0, 4, sanitize_text(doc_date), 0, 1)
+    pdf.cell(0, 4, sanitize_text(header.date), 0, 1)
 
-    if payment_terms:
+    if header.payment_terms:
         pdf.set_x(left_x)
         pdf.set_font('Arial', 'B', 7)
         pdf.set_text_color(80, 80, 80)
         pdf.cell(35, 4, 'Terminos de Pago:', 0, 0)
         pdf.set_font('Arial', '', 7)
         pdf.set_text_color(30, 30, 30)
-        pdf.cell(0, 4, sanitize_text(payment_terms)[:60], 0, 1)
+        pdf.cell(0, 4, sanitize_text(header.payment_terms)[:60], 0, 1)
 
-    if valid_until:
+    if header.valid_until:
         pdf.set_x(left_x)
         pdf.set_font('Arial', 'B', 7)
         pdf.set_text_color(80, 80, 80)
         pdf.cell(35, 4, 'Valida Hasta:', 0, 0)
         pdf.set_font('Arial', '', 7)
         pdf.set_text_color(30, 30, 30)
-        pdf.cell(0, 4, sanitize_text(str(valid_until)), 0, 1)
+        pdf.cell(0, 4, sanitize_text(header.valid_until), 0, 1)
 
-    if project_name:
+    if header.project_name:
         pdf.set_x(left_x)
         pdf.set_font('Arial', 'B', 7)
         pdf.set_text_color(80, 80, 80)
         pdf.cell(35, 4, 'Proyecto:', 0, 0)
         pdf.set_font('Arial', '', 7)
         pdf.set_text_color(30, 30, 30)
-        pdf.cell(0, 4, sanitize_text(project_name)[:60], 0, 1)
+        pdf.cell(0, 4, sanitize_text(header.project_name)[:60], 0, 1)
 
     pdf.set_xy(right_x, start_y)
     pdf.set_font('Arial', 'B', 7)
@@ -147,52 +143,52 @@ def build_quote_invoice_pdf(
     pdf.cell(25, 4, 'Cliente:', 0, 0)
     pdf.set_font('Arial', '', 7)
     pdf.set_text_color(30, 30, 30)
-    pdf.cell(0, 4, sanitize_text(client.get("company_name", ""))[:40], 0, 1)
+    pdf.cell(0, 4, sanitize_text(client.company_name)[:40], 0, 1)
 
-    if client.get('contact_name'):
+    if client.contact_name:
         pdf.set_x(right_x)
         pdf.set_font('Arial', 'B', 7)
         pdf.set_text_color(80, 80, 80)
         pdf.cell(25, 4, 'Contacto:', 0, 0)
         pdf.set_font('Arial', '', 7)
         pdf.set_text_color(30, 30, 30)
-        pdf.cell(0, 4, sanitize_text(client["contact_name"])[:40], 0, 1)
+        pdf.cell(0, 4, sanitize_text(client.contact_name)[:40], 0, 1)
 
-    if client.get('email'):
+    if client.email:
         pdf.set_x(right_x)
         pdf.set_font('Arial', 'B', 7)
         pdf.set_text_color(80, 80, 80)
         pdf.cell(25, 4, 'Email:', 0, 0)
         pdf.set_font('Arial', '', 7)
         pdf.set_text_color(30, 30, 30)
-        pdf.cell(0, 4, sanitize_text(client["email"])[:40], 0, 1)
+        pdf.cell(0, 4, sanitize_text(client.email)[:40], 0, 1)
 
-    if client.get('phone'):
+    if client.phone:
         pdf.set_x(right_x)
         pdf.set_font('Arial', 'B', 7)
         pdf.set_text_color(80, 80, 80)
         pdf.cell(25, 4, 'Telefono:', 0, 0)
         pdf.set_font('Arial', '', 7)
         pdf.set_text_color(30, 30, 30)
-        pdf.cell(0, 4, sanitize_text(client["phone"])[:30], 0, 1)
+        pdf.cell(0, 4, sanitize_text(client.phone)[:30], 0, 1)
 
-    if client.get('address'):
+    if client.address:
         pdf.set_x(right_x)
         pdf.set_font('Arial', 'B', 7)
         pdf.set_text_color(80, 80, 80)
         pdf.cell(25, 4, 'Direccion:', 0, 0)
         pdf.set_font('Arial', '', 7)
         pdf.set_text_color(30, 30, 30)
-        pdf.cell(0, 4, sanitize_text(client["address"])[:40], 0, 1)
+        pdf.cell(0, 4, sanitize_text(client.address)[:40], 0, 1)
 
-    if client.get('tax_id'):
+    if client.tax_id:
         pdf.set_x(right_x)
         pdf.set_font('Arial', 'B', 7)
         pdf.set_text_color(80, 80, 80)
         pdf.cell(25, 4, 'RNC:', 0, 0)
         pdf.set_font('Arial', '', 7)
         pdf.set_text_color(30, 30, 30)
-        pdf.cell(0, 4, sanitize_text(client["tax_id"])[:30], 0, 1)
+        pdf.cell(0, 4, sanitize_text(client.tax_id)[:30], 0, 1)
 
     pdf.ln(8)
     final_y = max(pdf.get_y(), start_y + 20)
@@ -203,24 +199,27 @@ def build_quote_invoice_pdf(
     pdf.cell(0, 5, 'Detalle de Items', 0, 1, 'L')
     pdf.ln(2)
 
-    pdf.set_fill_color(245, 245, 245)
-    pdf.set_draw_color(220, 220, 220)
-    pdf.set_font('Arial', 'B', 7)
-    pdf.set_text_color(60, 60, 60)
-    pdf.cell(85, 6, 'DESCRIPCION', 1, 0, 'L', True)
-    pdf.cell(25, 6, 'CANTIDAD', 1, 0, 'C', True)
-    pdf.cell(35, 6, 'PRECIO UNIT.', 1, 0, 'R', True)
-    pdf.cell(45, 6, 'TOTAL', 1, 1, 'R', True)
+    def items_header():
+        pdf.set_fill_color(245, 245, 245)
+        pdf.set_draw_color(220, 220, 220)
+        pdf.set_font('Arial', 'B', 7)
+        pdf.set_text_color(60, 60, 60)
+        pdf.cell(85, 6, 'DESCRIPCION', 1, 0, 'L', True)
+        pdf.cell(25, 6, 'CANTIDAD', 1, 0, 'C', True)
+        pdf.cell(35, 6, 'PRECIO UNIT.', 1, 0, 'R', True)
+        pdf.cell(45, 6, 'TOTAL', 1, 1, 'R', True)
+
+    pdf.start_table(items_header)
 
     pdf.set_font('Arial', '', 7)
     pdf.set_text_color(30, 30, 30)
     row_color = True
 
-    for item in items:
-        qty = float(item.get('quantity') or 0)
-        price = float(item.get('unit_price') or 0)
-        subtotal = qty * price
-        product_name = sanitize_text(item.get('product_name', 'Item'))[:50]
+    for line in doc.lines:
+        qty = line.quantity
+        price = line.unit_price
+        subtotal = line.subtotal
+        product_name = sanitize_text(line.product_name)[:50]
 
         if row_color:
             pdf.set_fill_color(252, 252, 252)
@@ -234,6 +233,7 @@ def build_quote_invoice_pdf(
 
         row_color = not row_color
 
+    pdf.end_table()
     pdf.ln(6)
 
     pdf.set_font('Arial', 'B', 9)
@@ -248,56 +248,28 @@ def build_quote_invoice_pdf(
     pdf.set_x(summary_x)
     pdf.cell(45, 4, 'Subtotal de Items:', 0, 0, 'L')
     pdf.set_text_color(30, 30, 30)
-    pdf.cell(25, 4, f'${items_total:,.2f}', 0, 1, 'R')
+    pdf.cell(25, 4, f'${totals.items_total:,.2f}', 0, 1, 'R')
 
-    if total_discounts > 0:
+    if totals.total_discounts > 0:
         pdf.set_x(summary_x)
         pdf.set_text_color(60, 60, 60)
         pdf.cell(45, 4, 'Total Descuentos:', 0, 0, 'L')
         pdf.set_text_color(200, 50, 50)
-        pdf.cell(25, 4, f'-${total_discounts:,.2f}', 0, 1, 'R')
+        pdf.cell(25, 4, f'-${totals.total_discounts:,.2f}', 0, 1, 'R')
 
         pdf.set_x(summary_x)
         pdf.set_text_color(60, 60, 60)
         pdf.cell(45, 4, 'Despues de Descuentos:', 0, 0, 'L')
         pdf.set_text_color(30, 30, 30)
-        pdf.cell(25, 4, f'${items_after_discount:,.2f}', 0, 1, 'R')
+        pdf.cell(25, 4, f'${totals.items_after_discount:,.2f}', 0, 1, 'R')
         pdf.ln(1)
 
-    if charges.get('supervision'):
+    for charge in doc.charges:
         pdf.set_x(summary_x)
         pdf.set_text_color(100, 100, 100)
-        pdf.cell(45, 4, f'Supervision ({supervision_pct:.1f}%):', 0, 0, 'L')
+        pdf.cell(45, 4, f'{charge.label} ({charge.percentage:.1f}%):', 0, 0, 'L')
         pdf.set_text_color(60, 60, 60)
-        pdf.cell(25, 4, f'${supervision:,.2f}', 0, 1, 'R')
-
-    if charges.get('admin'):
-        pdf.set_x(summary_x)
-        pdf.set_text_color(100, 100, 100)
-        pdf.cell(45, 4, f'Administracion ({admin_pct:.1f}%):', 0, 0, 'L')
-        pdf.set_text_color(60, 60, 60)
-        pdf.cell(25, 4, f'${admin:,.2f}', 0, 1, 'R')
-
-    if charges.get('insurance'):
-        pdf.set_x(summary_x)
-        pdf.set_text_color(100, 100, 100)
-        pdf.cell(45, 4, f'Seguro ({insurance_pct:.1f}%):', 0, 0, 'L')
-        pdf.set_text_color(60, 60, 60)
-        pdf.cell(25, 4, f'${insurance:,.2f}', 0, 1, 'R')
-
-    if charges.get('transport'):
-        pdf.set_x(summary_x)
-        pdf.set_text_color(100, 100, 100)
-        pdf.cell(45, 4, f'Transporte ({transport_pct:.1f}%):', 0, 0, 'L')
-        pdf.set_text_color(60, 60, 60)
-        pdf.cell(25, 4, f'${transport:,.2f}', 0, 1, 'R')
-
-    if charges.get('contingency'):
-        pdf.set_x(summary_x)
-        pdf.set_text_color(100, 100, 100)
-        pdf.cell(45, 4, f'Contingencia ({contingency_pct:.1f}%):', 0, 0, 'L')
-        pdf.set_text_color(60, 60, 60)
-        pdf.cell(25, 4, f'${contingency:,.2f}', 0, 1, 'R')
+        pdf.cell(25, 4, f'${charge.amount:,.2f}', 0, 1, 'R')
 
     pdf.ln(2)
     pdf.set_draw_color(220, 220, 220)
@@ -308,14 +280,14 @@ def build_quote_invoice_pdf(
     pdf.set_font('Arial', 'B', 8)
     pdf.set_text_color(30, 30, 30)
     pdf.cell(45, 5, 'Subtotal General:', 0, 0, 'L')
-    pdf.cell(25, 5, f'${subtotal_general:,.2f}', 0, 1, 'R')
+    pdf.cell(25, 5, f'${totals.subtotal_general:,.2f}', 0, 1, 'R')
 
     pdf.set_x(summary_x)
     pdf.set_font('Arial', '', 7)
     pdf.set_text_color(60, 60, 60)
     pdf.cell(45, 4, 'ITBIS (18%):', 0, 0, 'L')
     pdf.set_text_color(30, 30, 30)
-    pdf.cell(25, 4, f'${itbis:,.2f}', 0, 1, 'R')
+    pdf.cell(25, 4, f'${totals.itbis:,.2f}', 0, 1, 'R')
 
     pdf.ln(1)
     pdf.set_draw_color(200, 200, 200)
@@ -326,12 +298,12 @@ def build_quote_invoice_pdf(
     pdf.set_font('Arial', 'B', 11)
     pdf.set_text_color(30, 30, 30)
     pdf.cell(45, 7, 'TOTAL GENERAL:', 0, 0, 'L')
-    pdf.cell(25, 7, f'${grand_total:,.2f}', 0, 1, 'R')
+    pdf.cell(25, 7, f'${totals.grand_total:,.2f}', 0, 1, 'R')
 
     pdf.ln(8)
 
     # ==================== PAYMENT SECTION (INVOICES ONLY) ====================
-    if doc_type != 'COTIZACION':
+    if not doc.is_quote:
         pdf.set_font("Arial", "B", 10)
         pdf.set_text_color(30, 30, 30)
         pdf.cell(0, 6, "Resumen de Pagos", 0, 1, "L")
@@ -342,17 +314,17 @@ def build_quote_invoice_pdf(
 
         pdf.cell(40, 5, "Total Facturado:", 0, 0, "L")
         pdf.set_text_color(30, 30, 30)
-        pdf.cell(0, 5, f"${grand_total:,.2f}", 0, 1, "L")
+        pdf.cell(0, 5, f"${totals.grand_total:,.2f}", 0, 1, "L")
 
         pdf.set_text_color(60, 60, 60)
         pdf.cell(40, 5, "Total Pagado:", 0, 0, "L")
         pdf.set_text_color(0, 140, 0)
-        pdf.cell(0, 5, f"${amount_paid:,.2f}", 0, 1, "L")
+        pdf.cell(0, 5, f"${doc.amount_paid:,.2f}", 0, 1, "L")
 
         pdf.set_text_color(60, 60, 60)
         pdf.cell(40, 5, "Pendiente:", 0, 0, "L")
         pdf.set_text_color(200, 0, 0)
-        pdf.cell(0, 5, f"${amount_due:,.2f}", 0, 1, "L")
+        pdf.cell(0, 5, f"${doc.amount_due:,.2f}", 0, 1, "L")
 
         pdf.ln(8)
 
@@ -361,46 +333,49 @@ def build_quote_invoice_pdf(
         pdf.cell(0, 6, "Historial de Pagos", 0, 1, "L")
         pdf.ln(2)
 
-        if len(payments) == 0:
+        if not doc.payments:
             pdf.set_font("Arial", "", 8)
             pdf.set_text_color(120, 120, 120)
             pdf.cell(0, 5, "No hay pagos registrados.", 0, 1, "L")
         else:
-            pdf.set_font("Arial", "B", 8)
-            pdf.set_fill_color(245, 245, 245)
-            pdf.set_draw_color(220, 220, 220)
-            pdf.set_text_color(60, 60, 60)
+            def payments_header():
+                pdf.set_font("Arial", "B", 8)
+                pdf.set_fill_color(245, 245, 245)
+                pdf.set_draw_color(220, 220, 220)
+                pdf.set_text_color(60, 60, 60)
 
-            pdf.cell(40, 6, "Fecha", 1, 0, "L", True)
-            pdf.cell(40, 6, "Metodo", 1, 0, "L", True)
-            pdf.cell(40, 6, "Monto", 1, 0, "R", True)
-            pdf.cell(70, 6, "Notas", 1, 1, "L", True)
+                pdf.cell(40, 6, "Fecha", 1, 0, "L", True)
+                pdf.cell(40, 6, "Metodo", 1, 0, "L", True)
+                pdf.cell(40, 6, "Monto", 1, 0, "R", True)
+                pdf.cell(70, 6, "Notas", 1, 1, "L", True)
+
+            pdf.start_table(payments_header)
 
             pdf.set_font("Arial", "", 8)
             pdf.set_text_color(30, 30, 30)
 
-            for p in payments:
-                pay_date = str(p.get("payment_date") or p.get("date") or "")
-                pay_method = sanitize_text(str(p.get("method") or ""))
-                pay_amount = float(p.get("amount") or 0)
-                pay_notes = sanitize_text(str(p.get("notes") or ""))[:60]
+            for p in doc.payments:
+                pay_method = sanitize_text(p.method)
+                pay_notes = sanitize_text(p.notes)[:60]
 
-                pdf.cell(40, 5, pay_date[:20], 1, 0, "L")
+                pdf.cell(40, 5, p.date[:20], 1, 0, "L")
                 pdf.cell(40, 5, pay_method[:20], 1, 0, "L")
-                pdf.cell(40, 5, f"${pay_amount:,.2f}", 1, 0, "R")
+                pdf.cell(40, 5, f"${p.amount:,.2f}", 1, 0, "R")
                 pdf.cell(70, 5, pay_notes, 1, 1, "L")
 
+            pdf.end_table()
+
         pdf.ln(8)
 
     # ==================== NOTES SECTION ====================
-    if notes:
+    if header.notes:
         pdf.set_font("Arial", "B", 9)
         pdf.set_text_color(30, 30, 30)
         pdf.cell(0, 6, "Notas", 0, 1, "L")
         pdf.ln(1)
         pdf.set_font("Arial", "", 8)
         pdf.set_text_color(80, 80, 80)
-        pdf.multi_cell(0, 5, sanitize_text(str(notes)))
+        pdf.multi_cell(0, 5, sanitize_text(header.notes))
         pdf.ln(6)
 
     # ==================== SIGNATURES ====================
@@ -0,0 +1,34 @@
+from fpdf import FPDF
+
+
+class PagedPDF(FPDF):
+    """
+    FPDF with a "Pagina X de Y" footer on every page and table headers that
+    are repeated at the top of each page a table spills onto.
+
+    Usage: set ``table_header`` to a function drawing the header row while
+    the table rows are written, reset it to None afterwards.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.table_header = None
+
+    def header(self):
+        if self.table_header is not None:
+            self.table_header()
+
+    def footer(self):
+        self.set_y(-15)
+        self.set_font('Arial', 'I', 8)
+        self.set_text_color(180, 180, 180)
+        # "{nb}" is replaced by the total page count when the PDF is written.
+        self.cell(0, 10, f'Pagina {self.page_no()} de {self.str_alias_nb_pages}', 0, 0, 'C')
+
+    def start_table(self, draw_header):
+        """Draw the header row now and on every page break until end_table()."""
+        draw_header()
+        self.table_header = draw_header
+
+    def end_table(self):
+        self.table_header = None
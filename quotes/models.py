@@ -34,6 +34,11 @@ class QuoteItemBase(BaseModel):
     discount_value: float = 0.0
 
 
+class QuoteItemUpdate(QuoteItemBase):
+    # Existing quote_items.id; omit for new lines.
+    id: Optional[int] = None
+
+
 # -----------------------------
 # Base Quote Schema
 # -----------------------------
@@ -69,7 +74,10 @@ class QuoteUpdate(BaseModel):
     payment_terms: Optional[str] = None
     valid_until: Optional[date] = None
 
-    items: Optional[List[QuoteItemBase]] = None
+    # Full desired item list. Lines with an id are matched to existing rows
+    # (updated only if changed), lines without one are inserted, and
+    # existing rows not listed are deleted.
+    items: Optional[List[QuoteItemUpdate]] = None
     included_charges: Optional[IncludedCharges] = None
 
 
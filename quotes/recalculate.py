@@ -0,0 +1,225 @@
+"""
+Bulk recalculation of quote and invoice totals.
+
+When a pricing rule changes (a default overhead percentage, the ITBIS rate)
+every stored total is stale: quotes.total_amount / quotes.totals and the
+total_amount / amount_due of open invoices. An admin starts a
+recalculation; it runs on a background thread and reports progress.
+
+- Quotes (with their invoice, if any) are read in keyset pages of
+  RECALC_BATCH_SIZE with the totals check's query (fetch_quote_page) and
+  priced with calculate_totals_batch() from array-aggregated line columns.
+- Each page is one short transaction: changed rows are written with one
+  UPDATE ... FROM (VALUES ...) per table and committed. Rows edited after
+  they were read (updated_at moved) are skipped and counted as conflicts.
+- Invoices that are Paid or Cancelled are never changed; for the others
+  amount_due becomes the new total minus amount_paid.
+- dry_run computes the same diff without writing anything.
+
+Only one recalculation runs at a time; finished jobs stay in the registry
+(last RECALC_KEEP_JOBS) so their report can still be read.
+"""
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from decimal import Decimal
+from typing import List, Optional
+
+from fastapi import HTTPException
+from psycopg2.extras import RealDictCursor, execute_values
+
+from database import get_db_connection
+from quotes.totals_check import compute_batch_totals, fetch_quote_page, write_quote_totals
+from utils.totals import parse_totals, totals_json
+
+RECALC_BATCH_SIZE = int(os.getenv("RECALC_BATCH_SIZE", "500"))
+RECALC_DIFF_LIMIT = int(os.getenv("RECALC_DIFF_LIMIT", "200"))
+RECALC_KEEP_JOBS = 10
+
+# Invoices in these states keep the amount they were issued / settled with.
+FROZEN_INVOICE_STATUSES = ("Paid", "Cancelled")
+
+
+class RecalcJob:
+    def __init__(self, dry_run: bool, invoices: bool):
+        self.id = uuid.uuid4().hex[:12]
+        self.dry_run = dry_run
+        self.invoices = invoices
+        self.status = "running"
+        self.error: Optional[str] = None
+
+        self.total = 0
+        self.processed = 0
+        self.quotes_changed = 0
+        self.invoices_changed = 0
+        self.invoices_frozen = 0
+        self.written = 0
+        self.conflicts = 0
+        self.delta = Decimal("0.00")      # sum of grand_total changes
+        self.diff: List[dict] = []
+
+        self.started = time.time()
+        self.finished: Optional[float] = None
+        self.lock = threading.Lock()
+
+    def add_diff(self, entry: dict):
+        if len(self.diff) < RECALC_DIFF_LIMIT:
+            self.diff.append(entry)
+
+    def report(self) -> dict:
+        with self.lock:
+            elapsed = (self.finished or time.time()) - self.started
+            rate = self.processed / elapsed if elapsed > 0 else 0.0
+            remaining = max(self.total - self.processed, 0)
+            return {
+                "job_id": self.id,
+                "status": self.status,
+                "dry_run": self.dry_run,
+                "invoices": self.invoices,
+                "error": self.error,
+                "total": self.total,
+                "processed": self.processed,
+                "percent": round(self.processed / self.total * 100, 1) if self.total else 100.0,
+                "quotes_changed": self.quotes_changed,
+                "invoices_changed": self.invoices_changed,
+                "invoices_frozen": self.invoices_frozen,
+                "written": self.written,
+                "conflicts": self.conflicts,
+                "grand_total_delta": self.delta,
+                "elapsed_seconds": round(elapsed, 2),
+                "quotes_per_second": round(rate, 1),
+                "eta_seconds": round(remaining / rate, 1) if rate and self.status == "running" else None,
+                "diff": list(self.diff),
+                "diff_truncated": self.quotes_changed + self.invoices_changed > len(self.diff),
+            }
+
+
+# ============================================================
+# BATCH
+# ============================================================
+def _diff_batch(job: RecalcJob, rows: List[dict]):
+    """(quote updates, invoice updates) for one batch; records the diff on ``job``."""
+    quote_updates, invoice_updates = [], []
+    for row, totals in zip(rows, compute_batch_totals(rows)):
+        new_total = totals["grand_total"]
+        old_total = Decimal(row["total_amount"])
+
+        if parse_totals(row["totals"]) != totals or old_total != new_total:
+            job.quotes_changed += 1
+            job.delta += new_total - old_total
+            job.add_diff({"quote_id": row["quote_id"], "old_total": old_total, "new_total": new_total})
+            quote_updates.append((row["quote_id"], new_total, totals_json(totals), row["updated_at"]))
+
+        if not job.invoices or row["invoice_id"] is None:
+            continue
+        invoice_total = Decimal(row["invoice_total"])
+        if invoice_total == new_total:
+            continue
+        if row["invoice_status"] in FROZEN_INVOICE_STATUSES:
+            job.invoices_frozen += 1
+            continue
+        job.invoices_changed += 1
+        job.add_diff({
+            "invoice_number": row["invoice_number"],
+            "quote_id": row["quote_id"],
+            "old_total": invoice_total,
+            "new_total": new_total,
+        })
+        invoice_updates.append((row["invoice_id"], new_total, row["invoice_updated_at"]))
+    return quote_updates, invoice_updates
+
+
+def _write_invoices(cursor, updates: List[tuple]) -> int:
+    execute_values(cursor, """
+        UPDATE invoices AS i
+        SET total_amount = v.total_amount,
+            amount_due = v.total_amount - COALESCE(i.amount_paid, 0),
+            updated_at = CURRENT_TIMESTAMP
+        FROM (VALUES %s) AS v(id, total_amount, updated_at)
+        WHERE i.id = v.id
+          AND i.updated_at IS NOT DISTINCT FROM v.updated_at
+    """, updates, template="(%s, %s::numeric, %s::timestamp)", page_size=len(updates))
+    return cursor.rowcount
+
+
+# ============================================================
+# RUN
+# ============================================================
+def run_recalculation(job: RecalcJob, batch_size: int = RECALC_BATCH_SIZE):
+    conn = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        cursor.execute("SELECT COUNT(*) AS n FROM quotes")
+        job.total = cursor.fetchone()["n"]
+
+        conn.commit()
+        last_id = 0
+
+        while True:
+            rows = fetch_quote_page(conn, last_id, batch_size)
+            if not rows:
+                break
+            last_id = rows[-1]["id"]
+
+            with job.lock:
+                quote_updates, invoice_updates = _diff_batch(job, rows)
+
+            written = 0
+            if not job.dry_run and (quote_updates or invoice_updates):
+                if quote_updates:
+                    written += write_quote_totals(cursor, quote_updates)
+                if invoice_updates:
+                    written += _write_invoices(cursor, invoice_updates)
+            conn.commit()
+
+            with job.lock:
+                job.processed += len(rows)
+                job.written += written
+                if not job.dry_run:
+                    job.conflicts += len(quote_updates) + len(invoice_updates) - written
+
+        job.status = "done"
+
+    except Exception as e:
+        if conn:
+            conn.rollback()
+        job.status = "failed"
+        job.error = str(e)
+
+    finally:
+        job.finished = time.time()
+        if conn:
+            conn.close()
+
+
+# ============================================================
+# REGISTRY
+# ============================================================
+_jobs: "OrderedDict[str, RecalcJob]" = OrderedDict()
+_jobs_lock = threading.Lock()
+
+
+def start_recalculation(dry_run: bool = True, invoices: bool = True) -> dict:
+    """Start a recalculation in the background; 409 while another one is running."""
+    with _jobs_lock:
+        running = [job for job in _jobs.values() if job.status == "running"]
+        if running:
+            raise HTTPException(status_code=409, detail=f"Recalculation {running[0].id} is still running")
+
+        job = RecalcJob(dry_run=dry_run, invoices=invoices)
+        _jobs[job.id] = job
+        while len(_jobs) > RECALC_KEEP_JOBS:
+            _jobs.popitem(last=False)
+
+    threading.Thread(target=run_recalculation, args=(job,), name=f"recalc-{job.id}", daemon=True).start()
+    return job.report()
+
+
+def get_recalculation(job_id: str) -> dict:
+    job = _jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Recalculation job not found")
+    return job.report()
@@ -1,16 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, Depends, Header, HTTPException
 from typing import Optional
-import json
+from datetime import date
 
 from .models import QuoteCreate, StatusUpdate, QuoteUpdate
-from . import service
-from auth.service import verify_token
-from pdf.builder_quote import create_quote_pdf
+from . import recalculate, service, totals_check
+from auth.service import require_role, verify_token
+from database import UnitOfWork, get_unit_of_work
+from documents.model import quote_document
+from pdf.builder_quote import render_quote_document
+from pdf.executor import pdf_response, render_pdf
 
 # Email sending
 from email_service import send_quote_email
-from quotes.service import calculate_quote_totals
 
 router = APIRouter(prefix="/quotes", tags=["quotes"])
 
@@ -35,204 +36,141 @@ def create_quote(quote: QuoteCreate, current_user: dict = Depends(verify_token))
 
 
 @router.get("/")
-def get_quotes(
+async def get_quotes(
     client_id: Optional[int] = None,
     status: Optional[str] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    sort: str = "id",
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    search: Optional[str] = None,
+    min_amount: Optional[float] = None,
+    max_amount: Optional[float] = None,
+    include_charges: bool = True,
     current_user: dict = Depends(verify_token),
 ):
-    """Get all quotes with optional filters"""
-    return service.get_all_quotes(client_id, status)
+    """
+    Get quotes with optional filters.
+    Pass ``limit`` for a keyset-paginated page ({"items", "next_cursor"}).
+    """
+    return await service.get_all_quotes(
+        client_id, status,
+        limit=limit,
+        cursor=cursor,
+        sort=sort,
+        date_from=date_from,
+        date_to=date_to,
+        search=search,
+        min_amount=min_amount,
+        max_amount=max_amount,
+        include_charges=include_charges,
+    )
 
 
 @router.get("/{quote_id}/public")
-def get_quote_public(quote_id: str):
+async def get_quote_public(quote_id: str):
     """Public endpoint — no auth required. Used for client view page."""
-    return service.get_quote_with_contact(quote_id)
+    return await service.get_quote_public_async(quote_id)
 
 
 @router.get("/{quote_id}/public/pdf")
-def get_quote_public_pdf(quote_id: str):
+def get_quote_public_pdf(quote_id: str, uow: UnitOfWork = Depends(get_unit_of_work)):
     """Public PDF endpoint — no auth required."""
-    quote = service.get_quote_with_contact(quote_id)
-
-    client = {
-        "company_name": quote["company_name"],
-        "address":      quote.get("company_address", ""),
-        "contact_name": quote.get("contact_name", ""),
-        "email":        quote.get("contact_email", ""),
-        "phone":        quote.get("contact_phone", ""),
-    }
-
-    raw_charges = quote.get("included_charges") or {}
-    if isinstance(raw_charges, str):
-        raw_charges = json.loads(raw_charges)
+    quote = service.get_quote_with_contact(quote_id, uow)
 
-    items = quote.get("items", [])
-    totals = calculate_quote_totals(items, raw_charges)
-
-    pdf_stream = create_quote_pdf(
-        doc_type="COTIZACION",
-        doc_id=quote["quote_id"],
-        doc_date=str(quote["created_at"])[:10] if quote.get("created_at") else "",
-        client=client,
-        project_name=quote.get("project_name", ""),
-        notes=quote.get("notes", ""),
-        items=items,
-        charges=raw_charges,
-        items_total=totals["items_total"],
-        total_discounts=totals["total_discounts"],
-        items_after_discount=totals["items_after_discount"],
-        supervision=totals["supervision"],
-        supervision_pct=raw_charges.get("supervision_percentage", 10.0),
-        admin=totals["admin"],
-        admin_pct=raw_charges.get("admin_percentage", 4.0),
-        insurance=totals["insurance"],
-        insurance_pct=raw_charges.get("insurance_percentage", 1.0),
-        transport=totals["transport"],
-        transport_pct=raw_charges.get("transport_percentage", 3.0),
-        contingency=totals["contingency"],
-        contingency_pct=raw_charges.get("contingency_percentage", 3.0),
-        subtotal_general=totals["subtotal_general"],
-        itbis=totals["itbis"],
-        grand_total=totals["grand_total"],
-        payment_terms=quote.get("payment_terms"),
-        valid_until=str(quote["valid_until"]) if quote.get("valid_until") else None,
-    )
-
-    return StreamingResponse(
-        pdf_stream,
-        media_type="application/pdf",
-        headers={"Content-Disposition": f"inline; filename=quote_{quote_id}.pdf"},
+    return pdf_response(
+        f"quote:{quote_id}",
+        quote_document(quote),
+        render_quote_document,
+        f"inline; filename=quote_{quote_id}.pdf",
     )
 
 
-@router.post("/{quote_id}/send")
-def send_quote(quote_id: str, current_user: dict = Depends(verify_token)):
-    """Send quote PDF to client via email"""
-
-    quote = service.get_quote_with_contact(quote_id)
-
-    client = {
-        "company_name": quote["company_name"],
-        "address": quote.get("company_address", ""),
-        "contact_name": quote.get("contact_name", ""),
-        "email": quote.get("contact_email", ""),
-        "phone": quote.get("contact_phone", ""),
-    }
-
-    raw_charges = quote.get("included_charges") or {}
-    if isinstance(raw_charges, str):
-        raw_charges = json.loads(raw_charges)
+@router.post("/{quote_id}/send", status_code=202)
+def send_quote(
+    quote_id: str,
+    idempotency_key: Optional[str] = Header(None),
+    current_user: dict = Depends(verify_token),
+    uow: UnitOfWork = Depends(get_unit_of_work),
+):
+    """Queue the quote PDF for sending to the client; poll GET /emails/{job_id}."""
 
-    items = quote.get("items", [])
-    totals = calculate_quote_totals(items, raw_charges)
+    quote = service.get_quote_with_contact(quote_id, uow)
 
-    pdf_stream = create_quote_pdf(
-        doc_type="COTIZACION",
-        doc_id=quote["quote_id"],
-        doc_date=str(quote["created_at"])[:10] if quote.get("created_at") else "",
-        client=client,
-        project_name=quote.get("project_name", ""),
-        notes=quote.get("notes", ""),
-        items=items,
-        charges=raw_charges,
-        items_total=totals["items_total"],
-        total_discounts=totals["total_discounts"],
-        items_after_discount=totals["items_after_discount"],
-        supervision=totals["supervision"],
-        supervision_pct=raw_charges.get("supervision_percentage", 10.0),
-        admin=totals["admin"],
-        admin_pct=raw_charges.get("admin_percentage", 4.0),
-        insurance=totals["insurance"],
-        insurance_pct=raw_charges.get("insurance_percentage", 1.0),
-        transport=totals["transport"],
-        transport_pct=raw_charges.get("transport_percentage", 3.0),
-        contingency=totals["contingency"],
-        contingency_pct=raw_charges.get("contingency_percentage", 3.0),
-        subtotal_general=totals["subtotal_general"],
-        itbis=totals["itbis"],
-        grand_total=totals["grand_total"],
-        payment_terms=quote.get("payment_terms"),
-        valid_until=str(quote["valid_until"]) if quote.get("valid_until") else None,
-    )
+    pdf_bytes = render_pdf(f"quote:{quote_id}", quote_document(quote), render_quote_document)
 
-    pdf_bytes = pdf_stream.read()
-
-    send_quote_email(
+    job = send_quote_email(
         contact_email=quote["contact_email"],
         contact_name=quote["contact_name"],
         company_name=quote["company_name"],
         project_name=quote.get("project_name", ""),
         quote_id=quote_id,
         pdf_bytes=pdf_bytes,
+        idempotency_key=idempotency_key,
+        uow=uow,
     )
 
-    service.update_quote_status(quote_id, "Sent")
+    service.update_quote_status(quote_id, "Sent", uow)
 
-    return {"message": "Cotización enviada exitosamente", "quote_id": quote_id}
+    return {
+        "message": "Cotización en cola de envío",
+        "quote_id": quote_id,
+        "job_id": job["job_id"],
+        "status": job["status"],
+    }
 
 
 @router.get("/{quote_id}")
-def get_quote(quote_id: str, current_user: dict = Depends(verify_token)):
+async def get_quote(quote_id: str, current_user: dict = Depends(verify_token)):
     """Get a single quote"""
-    return service.get_quote_by_id(quote_id)
+    return await service.get_quote_by_id(quote_id)
 
 
 @router.get("/{quote_id}/pdf")
-def get_quote_pdf(quote_id: str, current_user: dict = Depends(verify_token)):
+def get_quote_pdf(
+    quote_id: str,
+    current_user: dict = Depends(verify_token),
+    uow: UnitOfWork = Depends(get_unit_of_work),
+):
     """Generate and stream a quote PDF"""
 
-    quote = service.get_quote_with_contact(quote_id)
+    quote = service.get_quote_with_contact(quote_id, uow)
 
-    client = {
-        "company_name": quote["company_name"],
-        "address": quote.get("company_address", ""),
-        "contact_name": quote.get("contact_name", ""),
-        "email": quote.get("contact_email", ""),
-        "phone": quote.get("contact_phone", ""),
-    }
+    return pdf_response(
+        f"quote:{quote_id}",
+        quote_document(quote),
+        render_quote_document,
+        f"inline; filename=quote_{quote_id}.pdf",
+    )
 
-    raw_charges = quote.get("included_charges") or {}
-    if isinstance(raw_charges, str):
-        raw_charges = json.loads(raw_charges)
 
-    items = quote.get("items", [])
-    totals = calculate_quote_totals(items, raw_charges)
+@router.get("/{quote_id}/totals")
+async def get_quote_totals(quote_id: str, current_user: dict = Depends(verify_token)):
+    """Totals breakdown of a quote (from the stored totals, no item scan)"""
+    return await service.get_quote_totals(quote_id)
 
-    pdf_stream = create_quote_pdf(
-        doc_type="COTIZACION",
-        doc_id=quote["quote_id"],
-        doc_date=str(quote["created_at"])[:10] if quote.get("created_at") else "",
-        client=client,
-        project_name=quote.get("project_name", ""),
-        notes=quote.get("notes", ""),
-        items=items,
-        charges=raw_charges,
-        items_total=totals["items_total"],
-        total_discounts=totals["total_discounts"],
-        items_after_discount=totals["items_after_discount"],
-        supervision=totals["supervision"],
-        supervision_pct=raw_charges.get("supervision_percentage", 10.0),
-        admin=totals["admin"],
-        admin_pct=raw_charges.get("admin_percentage", 4.0),
-        insurance=totals["insurance"],
-        insurance_pct=raw_charges.get("insurance_percentage", 1.0),
-        transport=totals["transport"],
-        transport_pct=raw_charges.get("transport_percentage", 3.0),
-        contingency=totals["contingency"],
-        contingency_pct=raw_charges.get("contingency_percentage", 3.0),
-        subtotal_general=totals["subtotal_general"],
-        itbis=totals["itbis"],
-        grand_total=totals["grand_total"],
-        payment_terms=quote.get("payment_terms"),
-        valid_until=str(quote["valid_until"]) if quote.get("valid_until") else None,
-    )
 
-    return StreamingResponse(
-        pdf_stream,
-        media_type="application/pdf",
-        headers={"Content-Disposition": f"inline; filename=quote_{quote_id}.pdf"},
-    )
+@router.post("/totals/check")
+def check_quote_totals(repair: bool = False, current_user: dict = Depends(require_role("admin"))):
+    """Verify stored quote totals against the items; ``repair`` fixes the ones that differ"""
+    return totals_check.check_quote_totals(repair=repair)
+
+
+@router.post("/totals/recalculate", status_code=202)
+def start_totals_recalculation(
+    dry_run: bool = True,
+    invoices: bool = True,
+    current_user: dict = Depends(require_role("admin")),
+):
+    """Recompute all quote (and open invoice) totals in the background; poll the returned job_id"""
+    return recalculate.start_recalculation(dry_run=dry_run, invoices=invoices)
+
+
+@router.get("/totals/recalculate/{job_id}")
+def get_totals_recalculation(job_id: str, current_user: dict = Depends(require_role("admin"))):
+    """Progress, throughput and diff of a totals recalculation"""
+    return recalculate.get_recalculation(job_id)
 
 
 @router.put("/{quote_id}")
@@ -268,6 +206,7 @@ def convert_to_invoice(quote_id: str, current_user: dict = Depends(verify_token)
     return {
         "invoice_id": invoice["id"],
         "invoice_number": invoice["invoice_number"],
+        "ncf": invoice["ncf"],
         "quote_id": invoice["quote_id"],
         "client_id": invoice["client_id"],
         "total_amount": invoice["total_amount"],
@@ -5,59 +5,160 @@ from typing import List, Optional
 from fastapi import HTTPException
 import json
 from datetime import datetime, date
-from database import get_db_connection
-from psycopg2.extras import RealDictCursor
+from database import get_db_connection, UnitOfWork
+from async_database import async_connection, fetch_all, fetch_one
+from utils.pagination import check_page_size, decode_cursor, encode_cursor, like_pattern
+from utils.totals import calculate_totals, line_amounts, parse_totals, totals_from_sums, totals_json
+from documents.loader import load_quote_document, load_quote_document_async
+from documents.numbering import next_invoice_number, next_quote_number
+from invoices.ncf.service import stamp_invoice_ncf
+from pdf.prerender import prerender_invoice, prerender_quote
+from psycopg2.extras import RealDictCursor, execute_values
 
 
 # =============================================================================
 # SECTION 2: HELPER FUNCTIONS
 # =============================================================================
-def calculate_quote_totals(items: List[dict], charges: dict) -> dict:
-    items_total = sum(float(item['quantity'] or 0) * float(item['unit_price'] or 0) for item in items)
-    total_discounts = 0
-    for item in items:
-        subtotal = float(item['quantity'] or 0) * float(item['unit_price'] or 0)
-        if item.get('discount_type') == 'percentage':
-            total_discounts += subtotal * (float(item.get('discount_value', 0)) / 100)
-        elif item.get('discount_type') == 'fixed':
-            total_discounts += float(item.get('discount_value', 0))
-
-    items_after_discount = items_total - total_discounts
-
-    supervision_pct = float(charges.get('supervision_percentage', 10.0))
-    admin_pct = float(charges.get('admin_percentage', 4.0))
-    insurance_pct = float(charges.get('insurance_percentage', 1.0))
-    transport_pct = float(charges.get('transport_percentage', 3.0))
-    contingency_pct = float(charges.get('contingency_percentage', 3.0))
-
-    supervision = items_after_discount * (supervision_pct / 100) if charges.get('supervision') else 0
-    admin = items_after_discount * (admin_pct / 100) if charges.get('admin') else 0
-    insurance = items_after_discount * (insurance_pct / 100) if charges.get('insurance') else 0
-    transport = items_after_discount * (transport_pct / 100) if charges.get('transport') else 0
-    contingency = items_after_discount * (contingency_pct / 100) if charges.get('contingency') else 0
-
-    subtotal_general = items_after_discount + supervision + admin + insurance + transport + contingency
-    itbis = subtotal_general * 0.18
-    grand_total = subtotal_general + itbis
+# Rows per multi-row INSERT statement for quote_items / invoice_items.
+ITEM_BATCH_SIZE = 1000
 
+
+def generate_quote_id(cursor=None) -> str:
+    return next_quote_number(cursor)
+
+
+def _insert_quote_items(cursor, quote_id: str, items: List[dict]) -> List[dict]:
+    """
+    Insert all line items of a quote with one multi-row INSERT and return
+    the inserted rows. Replaces the old one-statement-per-item loop.
+    """
+    if not items:
+        return []
+
+    rows = [
+        (
+            quote_id,
+            item.get("product_name", ""),
+            item.get("quantity", 1),
+            item.get("unit_price", 0),
+            item.get("discount_type") or "none",
+            item.get("discount_value") or 0.0,
+        )
+        for item in items
+    ]
+    return execute_values(cursor, """
+        INSERT INTO quote_items
+            (quote_id, product_name, quantity, unit_price, discount_type, discount_value)
+        VALUES %s
+        RETURNING *
+    """, rows, page_size=ITEM_BATCH_SIZE, fetch=True)
+
+
+# Columns compared when deciding whether an existing line changed.
+_ITEM_FIELDS = ("product_name", "quantity", "unit_price", "discount_type", "discount_value")
+
+
+def _normalize_item(item) -> dict:
+    """Item may be a dict, a Pydantic model or a JSON string."""
+    if hasattr(item, 'dict'):
+        item = item.dict()
+    elif isinstance(item, str):
+        item = json.loads(item)
     return {
-        'items_total': items_total,
-        'total_discounts': total_discounts,
-        'items_after_discount': items_after_discount,
-        'supervision': supervision,
-        'admin': admin,
-        'insurance': insurance,
-        'transport': transport,
-        'contingency': contingency,
-        'subtotal_general': subtotal_general,
-        'itbis': itbis,
-        'grand_total': grand_total
+        "id": item.get("id"),
+        "product_name": item.get("product_name", ""),
+        "quantity": item.get("quantity", 1),
+        "unit_price": item.get("unit_price", 0),
+        "discount_type": item.get("discount_type") or "none",
+        "discount_value": item.get("discount_value") or 0.0,
     }
 
 
-def generate_quote_id() -> str:
-    timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
-    return f"Q-{timestamp}"
+def _item_changed(existing: dict, item: dict) -> bool:
+    for field in _ITEM_FIELDS:
+        old, new = existing.get(field), item.get(field)
+        if field in ("product_name", "discount_type"):
+            if (old or None) != (new or None):
+                return True
+        # NUMERIC(12,2) columns: compare at stored precision
+        elif round(float(old or 0), 2) != round(float(new or 0), 2):
+            return True
+    return False
+
+
+def _sync_quote_items(cursor, quote_id: str, items: list) -> List[dict]:
+    """
+    Bring quote_items in line with ``items`` writing only the rows that differ:
+    lines with a known id are updated when changed, lines without an id are
+    inserted, and rows missing from ``items`` are deleted.
+
+    Returns the merged list of item rows in the submitted order.
+    """
+    cursor.execute("""
+        SELECT * FROM quote_items
+        WHERE quote_id = %s
+        ORDER BY id
+        FOR UPDATE
+    """, (quote_id,))
+    existing = {row["id"]: dict(row) for row in cursor.fetchall()}
+
+    submitted = [_normalize_item(item) for item in items]
+
+    seen = set()
+    for item in submitted:
+        item_id = item["id"]
+        if item_id is None:
+            continue
+        if item_id not in existing:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Item {item_id} does not belong to quote {quote_id}"
+            )
+        if item_id in seen:
+            raise HTTPException(status_code=400, detail=f"Item {item_id} listed more than once")
+        seen.add(item_id)
+
+    to_insert = [item for item in submitted if item["id"] is None]
+    to_update = [
+        item for item in submitted
+        if item["id"] is not None and _item_changed(existing[item["id"]], item)
+    ]
+    to_delete = [item_id for item_id in existing if item_id not in seen]
+
+    if to_delete:
+        cursor.execute(
+            "DELETE FROM quote_items WHERE quote_id = %s AND id = ANY(%s)",
+            (quote_id, to_delete)
+        )
+
+    updated = {}
+    if to_update:
+        rows = execute_values(cursor, """
+            UPDATE quote_items AS qi
+            SET product_name = v.product_name,
+                quantity = v.quantity,
+                unit_price = v.unit_price,
+                discount_type = v.discount_type,
+                discount_value = v.discount_value
+            FROM (VALUES %s) AS v(id, product_name, quantity, unit_price, discount_type, discount_value)
+            WHERE qi.id = v.id
+            RETURNING qi.*
+        """, [
+            (item["id"],) + tuple(item[field] for field in _ITEM_FIELDS)
+            for item in to_update
+        ], template="(%s, %s, %s::numeric, %s::numeric, %s, %s::numeric)",
+            page_size=ITEM_BATCH_SIZE, fetch=True)
+        updated = {row["id"]: row for row in rows}
+
+    inserted = iter(_insert_quote_items(cursor, quote_id, to_insert))
+
+    merged = []
+    for item in submitted:
+        if item["id"] is None:
+            merged.append(next(inserted))
+        else:
+            merged.append(updated.get(item["id"]) or existing[item["id"]])
+    return merged
 
 
 def _serialize_date(d) -> Optional[str]:
@@ -69,6 +170,14 @@ def _serialize_date(d) -> Optional[str]:
     return d  # already a string — let Postgres handle it
 
 
+def _line_net(item: dict):
+    """Line amount after its discount (invoice_items.total)."""
+    subtotal, discount = line_amounts(
+        item["quantity"], item["unit_price"], item.get("discount_type") or "none", item.get("discount_value"),
+    )
+    return subtotal - discount
+
+
 # =============================================================================
 # SECTION 3: QUOTE CRUD OPERATIONS
 # =============================================================================
@@ -102,15 +211,15 @@ def create_quote(
                 detail=f"Contact {contact_id} does not belong to client {client_id}",
             )
 
-        quote_id = generate_quote_id()
-        totals = calculate_quote_totals(items, included_charges)
+        quote_id = generate_quote_id(cursor)
+        totals = calculate_totals(items, included_charges)
 
         cursor.execute("""
             INSERT INTO quotes
                 (quote_id, client_id, contact_id, project_name, notes, status,
-                 included_charges, total_amount, payment_terms, valid_until)
+                 included_charges, total_amount, totals, payment_terms, valid_until)
             VALUES
-                (%s, %s, %s, %s, %s, %s, %s::jsonb, %s, %s, %s)
+                (%s, %s, %s, %s, %s, %s, %s::jsonb, %s, %s::jsonb, %s, %s)
         """, (
             quote_id,
             client_id,
@@ -120,37 +229,24 @@ def create_quote(
             "Draft",
             json.dumps(included_charges),
             totals["grand_total"],
+            totals_json(totals),
             payment_terms,
             _serialize_date(valid_until),
         ))
 
-        for item in items:
-            cursor.execute("""
-                INSERT INTO quote_items
-                    (quote_id, product_name, quantity, unit_price, discount_type, discount_value)
-                VALUES (%s, %s, %s, %s, %s, %s)
-            """, (
-                quote_id,
-                item["product_name"],
-                item["quantity"],
-                item["unit_price"],
-                item.get("discount_type", "none"),
-                item.get("discount_value", 0.0),
-            ))
+        inserted_items = _insert_quote_items(cursor, quote_id, items)
 
         conn.commit()
 
         cursor.execute("""
             SELECT quote_id, client_id, contact_id, project_name, notes, status,
-                   included_charges, total_amount, payment_terms, valid_until,
+                   included_charges, total_amount, totals, payment_terms, valid_until,
                    created_at, updated_at
             FROM quotes
             WHERE quote_id = %s
         """, (quote_id,))
         quote = dict(cursor.fetchone())
-
-        cursor.execute("SELECT * FROM quote_items WHERE quote_id = %s", (quote_id,))
-        quote["items"] = cursor.fetchall()
+        quote["items"] = inserted_items
 
         return quote
 
@@ -169,127 +265,183 @@ def create_quote(
             conn.close()
 
 
-def get_quote_by_id(quote_id: str) -> dict:
-    conn = None
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-
-        cursor.execute("""
+async def get_quote_by_id(quote_id: str) -> dict:
+    async with async_connection() as conn:
+        cursor = await conn.execute("""
             SELECT quote_id, client_id, contact_id, project_name, notes, status,
-                   included_charges, total_amount, payment_terms, valid_until,
+                   included_charges, total_amount, totals, payment_terms, valid_until,
                    created_at, updated_at
             FROM quotes
             WHERE quote_id = %s
         """, (quote_id,))
-        quote = cursor.fetchone()
+        quote = await cursor.fetchone()
 
         if not quote:
             raise HTTPException(status_code=404, detail="Quote not found")
 
-        quote = dict(quote)
-
-        cursor.execute("SELECT * FROM quote_items WHERE quote_id = %s", (quote_id,))
-        quote["items"] = cursor.fetchall()
+        cursor = await conn.execute("SELECT * FROM quote_items WHERE quote_id = %s", (quote_id,))
+        quote["items"] = await cursor.fetchall()
 
         return quote
 
-    finally:
-        if conn:
-            conn.close()
 
+async def get_quote_totals(quote_id: str) -> dict:
+    """Stored totals breakdown; quotes written before it existed are priced from their items."""
+    quote = await fetch_one(
+        "SELECT quote_id, included_charges, total_amount, totals FROM quotes WHERE quote_id = %s",
+        (quote_id,),
+    )
+    if not quote:
+        raise HTTPException(status_code=404, detail="Quote not found")
+
+    totals = parse_totals(quote["totals"])
+    if totals is None:
+        items = await fetch_all("SELECT * FROM quote_items WHERE quote_id = %s", (quote_id,))
+        totals = calculate_totals(items, quote["included_charges"] or {})
+    return {"quote_id": quote_id, "totals": totals}
 
-def get_quote_with_contact(quote_id: str) -> dict:
+
+def get_quote_with_contact(quote_id: str, uow: Optional[UnitOfWork] = None) -> dict:
     """
     Load a quote joined with full client and selected contact info.
     Always use this function when building a PDF — never get_quote_by_id.
     The contact comes from quotes.contact_id, not from any company default.
     """
-    conn = None
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
+    quote = load_quote_document(quote_id, uow)
+    if quote["contact_name"] is None:
+        raise HTTPException(status_code=404, detail="Quote not found")
+    return quote
 
-        cursor.execute("""
-            SELECT
-                q.quote_id,
-                q.client_id,
-                q.contact_id,
-                q.project_name,
-                q.notes,
-                q.status,
-                q.included_charges,
-                q.total_amount,
-                q.payment_terms,
-                q.valid_until,
-                q.created_at,
-                q.updated_at,
-
-                c.company_name,
-                c.address        AS company_address,
-
-                ct.name          AS contact_name,
-                ct.email         AS contact_email,
-                ct.phone         AS contact_phone
-
-            FROM quotes q
-            JOIN clients  c  ON q.client_id  = c.id
-            JOIN contacts ct ON q.contact_id = ct.id AND ct.company_id = q.client_id
-            WHERE q.quote_id = %s
-        """, (quote_id,))
-        row = cursor.fetchone()
 
-        if not row:
-            raise HTTPException(status_code=404, detail="Quote not found")
+async def get_quote_with_contact_async(quote_id: str) -> dict:
+    """Async twin of get_quote_with_contact for event-loop endpoints."""
+    quote = await load_quote_document_async(quote_id)
+    if quote["contact_name"] is None:
+        raise HTTPException(status_code=404, detail="Quote not found")
+    return quote
 
-        quote = dict(row)
 
-        cursor.execute("SELECT * FROM quote_items WHERE quote_id = %s", (quote_id,))
-        quote["items"] = cursor.fetchall()
+# Keys of the unauthenticated GET /quotes/{quote_id}/public view. The loader
+# row carries more (client tax id, stored totals breakdown) that stays private.
+QUOTE_PUBLIC_FIELDS = (
+    "quote_id", "client_id", "contact_id", "project_name", "notes", "status",
+    "included_charges", "total_amount", "payment_terms", "valid_until",
+    "created_at", "updated_at",
+    "company_name", "company_address",
+    "contact_name", "contact_email", "contact_phone",
+    "items",
+)
 
-        return quote
 
-    finally:
-        if conn:
-            conn.close()
+async def get_quote_public_async(quote_id: str) -> dict:
+    """The public view of a quote: get_quote_with_contact_async limited to QUOTE_PUBLIC_FIELDS."""
+    quote = await get_quote_with_contact_async(quote_id)
+    return {key: quote.get(key) for key in QUOTE_PUBLIC_FIELDS}
+
 
+# Keyset orderings for the quote list: sort name -> (ORDER BY, key columns)
+QUOTE_SORTS = {
+    "id": ("q.id DESC", ("q.id",)),
+    "created_at": ("q.created_at DESC, q.id DESC", ("q.created_at", "q.id")),
+}
 
-def get_all_quotes(
+
+async def get_all_quotes(
     client_id: Optional[int] = None,
     status: Optional[str] = None,
-) -> List[dict]:
-    conn = None
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    sort: str = "id",
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    search: Optional[str] = None,
+    min_amount: Optional[float] = None,
+    max_amount: Optional[float] = None,
+    include_charges: bool = True,
+):
+    """
+    List quotes, newest first.
 
-        query = """
-            SELECT q.quote_id, q.client_id, q.project_name, q.notes, q.status,
-                   q.included_charges, q.total_amount, q.payment_terms, q.valid_until,
-                   q.created_at, q.updated_at,
-                   c.company_name AS client_name
-            FROM quotes q
-            JOIN clients c ON q.client_id = c.id
-            WHERE 1=1
-        """
-        params = []
+    Without ``limit`` the full filtered list is returned (legacy shape).
+    With ``limit`` the result is keyset-paginated:
+    ``{"items": [...], "next_cursor": str | None}``; pass ``next_cursor``
+    back as ``cursor`` to fetch the following page.
+    """
+    if sort not in QUOTE_SORTS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of: {', '.join(QUOTE_SORTS)}")
+    order_by, key_columns = QUOTE_SORTS[sort]
+
+    charges_column = "q.included_charges, " if include_charges else ""
+    query = f"""
+        SELECT q.id, q.quote_id, q.client_id, q.project_name, q.notes, q.status,
+               {charges_column}q.total_amount, q.payment_terms, q.valid_until,
+               q.created_at, q.updated_at,
+               c.company_name AS client_name
+        FROM quotes q
+        JOIN clients c ON q.client_id = c.id
+        WHERE 1=1
+    """
+    params = []
 
-        if client_id:
-            query += " AND q.client_id = %s"
-            params.append(client_id)
+    if client_id:
+        query += " AND q.client_id = %s"
+        params.append(client_id)
 
-        if status:
-            query += " AND q.status = %s"
-            params.append(status)
+    if status:
+        query += " AND q.status = %s"
+        params.append(status)
 
-        query += " ORDER BY q.id DESC"
+    if date_from:
+        query += " AND q.created_at >= %s"
+        params.append(date_from)
 
-        cursor.execute(query, params)
-        return cursor.fetchall()
+    if date_to:
+        query += " AND q.created_at < %s::date + 1"
+        params.append(date_to)
 
-    finally:
-        if conn:
-            conn.close()
+    if search:
+        query += """
+            AND (q.quote_id ILIKE %s OR q.project_name ILIKE %s OR c.company_name ILIKE %s)
+        """
+        params.extend([like_pattern(search)] * 3)
+
+    if min_amount is not None:
+        query += " AND q.total_amount >= %s"
+        params.append(min_amount)
+
+    if max_amount is not None:
+        query += " AND q.total_amount <= %s"
+        params.append(max_amount)
+
+    if limit is not None:
+        check_page_size(limit)
+        if cursor:
+            values = decode_cursor(cursor, len(key_columns))
+            if sort == "created_at":
+                query += " AND (q.created_at, q.id) < (%s::timestamp, %s)"
+            else:
+                query += " AND q.id < %s"
+            params.extend(values)
+        query += f" ORDER BY {order_by} LIMIT %s"
+        params.append(limit + 1)
+    else:
+        query += f" ORDER BY {order_by}"
+
+    rows = await fetch_all(query, params)
+
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor([last[column.split(".")[1]] for column in key_columns])
+
+    # q.id is only selected for the keyset; it is not part of the response.
+    for row in rows:
+        del row["id"]
+
+    if limit is None:
+        return rows
+    return {"items": rows, "next_cursor": next_cursor}
 
 
 def update_quote(quote_id: str, quote_update) -> dict:
@@ -299,7 +451,8 @@ def update_quote(quote_id: str, quote_update) -> dict:
         conn = get_db_connection()
         cursor = conn.cursor(cursor_factory=RealDictCursor)
 
-        cursor.execute("SELECT * FROM quotes WHERE quote_id = %s", (quote_id,))
+        # Row lock: concurrent updates must not interleave on the stored totals.
+        cursor.execute("SELECT * FROM quotes WHERE quote_id = %s FOR UPDATE", (quote_id,))
         quote = cursor.fetchone()
         if not quote:
             raise HTTPException(status_code=404, detail="Quote not found")
@@ -323,35 +476,13 @@ def update_quote(quote_id: str, quote_update) -> dict:
             """
             cursor.execute(query, list(update_dict.values()) + [quote_id])
 
-        # Re-insert items if provided
+        # Apply item changes (only rows that differ are written)
+        current_items = None
         if items is not None:
-            cursor.execute("DELETE FROM quote_items WHERE quote_id = %s", (quote_id,))
-
-            for item in items:
-                # Normalize — item may be a dict or a Pydantic model
-                if hasattr(item, 'dict'):
-                    item = item.dict()
-                elif isinstance(item, str):
-                    item = json.loads(item)
-
-                cursor.execute("""
-                    INSERT INTO quote_items
-                        (quote_id, product_name, quantity, unit_price, discount_type, discount_value)
-                    VALUES (%s, %s, %s, %s, %s, %s)
-                """, (
-                    quote_id,
-                    item.get("product_name", ""),
-                    item.get("quantity", 1),
-                    item.get("unit_price", 0),
-                    item.get("discount_type", "none"),
-                    item.get("discount_value", 0.0),
-                ))
+            current_items = _sync_quote_items(cursor, quote_id, items)
 
         # Recalculate totals if items or charges changed
         if included_charges is not None or items is not None:
-            cursor.execute("SELECT * FROM quote_items WHERE quote_id = %s", (quote_id,))
-            current_items = [dict(row) for row in cursor.fetchall()]
-
             if included_charges is not None:
                 if hasattr(included_charges, 'dict'):
                     charges = included_charges.dict()
@@ -360,39 +491,46 @@ def update_quote(quote_id: str, quote_update) -> dict:
                 else:
                     charges = included_charges
             else:
-                cursor.execute(
-                    "SELECT included_charges FROM quotes WHERE quote_id = %s", (quote_id,)
-                )
-                row = cursor.fetchone()
-                raw = row['included_charges'] if row else {}
+                raw = quote['included_charges']
                 if isinstance(raw, str):
                     charges = json.loads(raw)
                 else:
                     charges = raw or {}
 
-            totals = calculate_quote_totals(current_items, charges)
+            stored = parse_totals(quote.get("totals"))
+            if current_items is None and stored is not None:
+                # Charges only: the line sums are unchanged, no need to read the items.
+                totals = totals_from_sums(stored["items_total"], stored["total_discounts"], charges)
+            else:
+                if current_items is None:
+                    cursor.execute("SELECT * FROM quote_items WHERE quote_id = %s ORDER BY id", (quote_id,))
+                    current_items = [dict(row) for row in cursor.fetchall()]
+                totals = calculate_totals(current_items, charges)
 
             cursor.execute("""
                 UPDATE quotes
                 SET included_charges = %s::jsonb,
                     total_amount = %s,
+                    totals = %s::jsonb,
                     updated_at = CURRENT_TIMESTAMP
                 WHERE quote_id = %s
-            """, (json.dumps(charges), totals["grand_total"], quote_id))
+            """, (json.dumps(charges), totals["grand_total"], totals_json(totals), quote_id))
 
         conn.commit()
 
         cursor.execute("""
             SELECT quote_id, client_id, project_name, notes, status,
-                   included_charges, total_amount, payment_terms, valid_until,
+                   included_charges, total_amount, totals, payment_terms, valid_until,
                    created_at, updated_at
             FROM quotes
             WHERE quote_id = %s
         """, (quote_id,))
         updated_quote = dict(cursor.fetchone())
 
-        cursor.execute("SELECT * FROM quote_items WHERE quote_id = %s", (quote_id,))
-        updated_quote["items"] = cursor.fetchall()
+        if current_items is None:
+            cursor.execute("SELECT * FROM quote_items WHERE quote_id = %s ORDER BY id", (quote_id,))
+            current_items = cursor.fetchall()
+        updated_quote["items"] = current_items
 
         return updated_quote
 
@@ -452,7 +590,7 @@ def duplicate_quote(quote_id: str) -> dict:
         # 1. Fetch original quote
         cursor.execute("""
             SELECT quote_id, client_id, contact_id, project_name, notes, status,
-                   included_charges, total_amount, payment_terms, valid_until
+                   included_charges, total_amount, totals, payment_terms, valid_until
             FROM quotes
             WHERE quote_id = %s
         """, (quote_id,))
@@ -462,29 +600,25 @@ def duplicate_quote(quote_id: str) -> dict:
 
         original = dict(original)
 
-        # 2. Fetch original items
-        cursor.execute("SELECT * FROM quote_items WHERE quote_id = %s", (quote_id,))
-        original_items = cursor.fetchall()
+        # 2. Generate new quote ID
+        new_quote_id = generate_quote_id(cursor)
 
-        # 3. Generate new quote ID
-        new_quote_id = generate_quote_id()
-
-        # 4. Normalize included_charges — it may arrive as dict or string
+        # 3. Normalize included_charges — it may arrive as dict or string
         included_charges = original.get("included_charges") or ""
         if isinstance(included_charges, dict):
             included_charges = json.dumps(included_charges)
         elif not isinstance(included_charges, str):
             included_charges = ""
 
-        # 5. valid_until — serialize date to string if needed
+        # 4. valid_until — serialize date to string if needed
         valid_until = _serialize_date(original.get("valid_until"))
 
-        # 6. Insert duplicated quote
+        # 5. Insert duplicated quote
         cursor.execute("""
             INSERT INTO quotes
                 (quote_id, client_id, contact_id, project_name, notes, status,
-                 included_charges, total_amount, payment_terms, valid_until)
-            VALUES (%s, %s, %s, %s, %s, %s, %s::jsonb, %s, %s, %s)
+                 included_charges, total_amount, totals, payment_terms, valid_until)
+            VALUES (%s, %s, %s, %s, %s, %s, %s::jsonb, %s, %s::jsonb, %s, %s)
         """, (
             new_quote_id,
             original["client_id"],
@@ -494,39 +628,36 @@ def duplicate_quote(quote_id: str) -> dict:
             "Draft",
             included_charges,
             original["total_amount"],
+            json.dumps(original["totals"]) if original.get("totals") else None,
             original.get("payment_terms"),
             valid_until,
         ))
 
-        # 7. Duplicate quote items
-        for item in original_items:
-            cursor.execute("""
-                INSERT INTO quote_items
-                    (quote_id, product_name, quantity, unit_price, discount_type, discount_value)
-                VALUES (%s, %s, %s, %s, %s, %s)
-            """, (
-                new_quote_id,
-                item["product_name"],
-                item["quantity"],
-                item["unit_price"],
-                item.get("discount_type") or "none",
-                item.get("discount_value") or 0.0,
-            ))
+        # 6. Duplicate quote items server-side in a single statement
+        cursor.execute("""
+            INSERT INTO quote_items
+                (quote_id, product_name, quantity, unit_price, discount_type, discount_value)
+            SELECT %s, product_name, quantity, unit_price,
+                   COALESCE(discount_type, 'none'), COALESCE(discount_value, 0)
+            FROM quote_items
+            WHERE quote_id = %s
+            ORDER BY id
+            RETURNING *
+        """, (new_quote_id, quote_id))
+        new_items = cursor.fetchall()
 
         conn.commit()
 
-        # 8. Return new quote with items
+        # 7. Return new quote with items
         cursor.execute("""
             SELECT quote_id, client_id, project_name, notes, status,
-                   included_charges, total_amount, payment_terms, valid_until,
+                   included_charges, total_amount, totals, payment_terms, valid_until,
                    created_at, updated_at
             FROM quotes
             WHERE quote_id = %s
         """, (new_quote_id,))
         new_quote = dict(cursor.fetchone())
-
-        cursor.execute("SELECT * FROM quote_items WHERE quote_id = %s", (new_quote_id,))
-        new_quote["items"] = cursor.fetchall()
+        new_quote["items"] = new_items
 
         return new_quote
 
@@ -545,10 +676,10 @@ def duplicate_quote(quote_id: str) -> dict:
             conn.close()
 
 
-def update_quote_status(quote_id: str, status: str) -> dict:
+def update_quote_status(quote_id: str, status: str, uow: Optional[UnitOfWork] = None) -> dict:
     conn = None
     try:
-        conn = get_db_connection()
+        conn = get_db_connection(uow)
         cursor = conn.cursor()
 
         cursor.execute("SELECT quote_id FROM quotes WHERE quote_id = %s", (quote_id,))
@@ -567,6 +698,13 @@ def update_quote_status(quote_id: str, status: str) -> dict:
         )
         conn.commit()
 
+        # Inside a unit of work the commit above is deferred: queue the
+        # prerender only once the status change is actually committed.
+        if uow is not None:
+            uow.after_commit(lambda: prerender_quote(quote_id, status))
+        else:
+            prerender_quote(quote_id, status)
+
         return {"message": "Status updated successfully", "quote_id": quote_id, "status": status}
 
     except HTTPException:
@@ -594,7 +732,7 @@ def convert_quote_to_invoice(quote_id: str) -> dict:
         # 1. Load quote
         cursor.execute("""
             SELECT quote_id, client_id, contact_id, project_name, notes, status,
-                   included_charges, total_amount, payment_terms, valid_until
+                   included_charges, total_amount, totals, payment_terms, valid_until
             FROM quotes
             WHERE quote_id = %s
         """, (quote_id,))
@@ -625,11 +763,10 @@ def convert_quote_to_invoice(quote_id: str) -> dict:
         raw_charges = quote.get("included_charges")
         charges = json.loads(raw_charges) if isinstance(raw_charges, str) else (raw_charges or {})
 
-        totals = calculate_quote_totals(items, charges)
+        totals = parse_totals(quote.get("totals")) or calculate_totals(items, charges)
 
         # 4. Create invoice
-        timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
-        invoice_number = f"INV-{timestamp}"
+        invoice_number = next_invoice_number(cursor)
         invoice_date = datetime.now().strftime("%Y-%m-%d")
 
         cursor.execute("""
@@ -653,26 +790,32 @@ def convert_quote_to_invoice(quote_id: str) -> dict:
 
         invoice_id = cursor.fetchone()["id"]   # FIXED
 
-        # 5. Insert invoice items
-        for item in items:
-            line_total = (item["quantity"] * item["unit_price"]) - item.get("discount_value", 0)
-            cursor.execute("""
+        # 5. Insert invoice items (one multi-row INSERT)
+        if items:
+            execute_values(cursor, """
                 INSERT INTO invoice_items
                     (invoice_id, product_id, description, quantity, unit_price, discount, total)
-                VALUES (%s, %s, %s, %s, %s, %s, %s)
-            """, (
-                invoice_id,                     # FIXED
-                item["product_id"],
-                item["product_name"],
-                item["quantity"],
-                item["unit_price"],
-                item.get("discount_value", 0),
-                line_total,
-            ))
+                VALUES %s
+            """, [
+                (
+                    invoice_id,                     # FIXED
+                    item["product_id"],
+                    item["product_name"],
+                    item["quantity"],
+                    item["unit_price"],
+                    item.get("discount_value", 0),
+                    _line_net(item),
+                )
+                for item in items
+            ], page_size=ITEM_BATCH_SIZE)
+
+        # 6. Fiscal number last: its range row stays locked only until the commit
+        stamp_invoice_ncf(cursor, invoice_id, quote["client_id"])
 
         conn.commit()
+        prerender_invoice(invoice_id)
 
-        # 6. Return invoice with items
+        # 7. Return invoice with items
         cursor.execute("""
             SELECT i.*, q.payment_terms, q.valid_until
             FROM invoices i
@@ -0,0 +1,178 @@
+"""
+Consistency check / repair of the persisted totals breakdown (quotes.totals).
+
+The quote service keeps quotes.totals and quotes.total_amount current on
+every item or charge change. This job recomputes every quote from its
+quote_items with the shared engine (utils.totals) and reports the quotes
+whose stored breakdown is missing (rows written before the column existed)
+or differs; with ``repair`` those rows are rewritten.
+
+- Quotes are read in keyset pages of TOTALS_CHECK_BATCH (q.id > last id),
+  with each quote's line fields aggregated into arrays: the columnar input
+  of calculate_totals_batch(). Each page, with its fixes, is one short
+  transaction, so a full run never holds a snapshot or a long transaction.
+- Fixes are written per page with one UPDATE ... FROM (VALUES ...). A quote
+  edited after it was read (updated_at moved) is left alone.
+
+fetch_quote_page(), compute_batch_totals() and write_quote_totals() are
+shared with the bulk recalculation (quotes/recalculate.py).
+
+Run with ``python -m quotes.totals_check [--repair]`` or through
+POST /quotes/totals/check (admin).
+"""
+import json
+import os
+from decimal import Decimal
+from typing import List
+
+from psycopg2.extras import RealDictCursor, execute_values
+
+from database import get_db_connection
+from utils.totals import TOTAL_KEYS, calculate_totals_batch, parse_totals, totals_json
+
+TOTALS_CHECK_BATCH = int(os.getenv("TOTALS_CHECK_BATCH", "500"))
+
+# Quotes listed in the report (the counts cover all of them).
+TOTALS_CHECK_SAMPLES = 20
+
+_QUOTES_SQL = """
+    SELECT
+        q.id,
+        q.quote_id,
+        q.included_charges,
+        q.total_amount,
+        q.totals,
+        q.updated_at,
+        i.id             AS invoice_id,
+        i.invoice_number,
+        i.status         AS invoice_status,
+        i.total_amount   AS invoice_total,
+        i.updated_at     AS invoice_updated_at,
+        li.quantities,
+        li.unit_prices,
+        li.discount_types,
+        li.discount_values
+    FROM quotes q
+    LEFT JOIN invoices i ON i.quote_id = q.quote_id
+    LEFT JOIN LATERAL (
+        SELECT array_agg(qi.quantity ORDER BY qi.id)       AS quantities,
+               array_agg(qi.unit_price ORDER BY qi.id)     AS unit_prices,
+               array_agg(qi.discount_type ORDER BY qi.id)  AS discount_types,
+               array_agg(qi.discount_value ORDER BY qi.id) AS discount_values
+        FROM quote_items qi
+        WHERE qi.quote_id = q.quote_id
+    ) li ON TRUE
+    WHERE q.id > %s
+    ORDER BY q.id
+    LIMIT %s
+"""
+
+
+def _charges(value) -> dict:
+    if isinstance(value, str):
+        return json.loads(value or "{}")
+    return value or {}
+
+
+def fetch_quote_page(conn, after_id: int, limit: int) -> List[dict]:
+    """The next ``limit`` quotes with q.id > ``after_id``, as rows of _QUOTES_SQL."""
+    cursor = conn.cursor(cursor_factory=RealDictCursor)
+    try:
+        cursor.execute(_QUOTES_SQL, (after_id, limit))
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+
+
+def compute_batch_totals(rows: List[dict]) -> List[dict]:
+    """Totals for rows of _QUOTES_SQL, in one calculate_totals_batch() call."""
+    line_doc, quantities, unit_prices, discount_types, discount_values = [], [], [], [], []
+    for doc, row in enumerate(rows):
+        quantity_column = row["quantities"] or []
+        line_doc.extend([doc] * len(quantity_column))
+        quantities.extend(quantity_column)
+        unit_prices.extend(row["unit_prices"] or [])
+        discount_types.extend(row["discount_types"] or [])
+        discount_values.extend(row["discount_values"] or [])
+
+    columns = calculate_totals_batch(
+        line_doc, quantities, unit_prices, discount_types, discount_values,
+        [_charges(row["included_charges"]) for row in rows],
+    )
+    return [{key: columns[key][doc] for key in TOTAL_KEYS} for doc in range(len(rows))]
+
+
+def write_quote_totals(cursor, fixes: List[tuple]) -> int:
+    """Rewrite (quote_id, total_amount, totals, updated_at) rows still at that updated_at."""
+    execute_values(cursor, """
+        UPDATE quotes AS q
+        SET total_amount = v.total_amount,
+            totals = v.totals,
+            updated_at = CURRENT_TIMESTAMP
+        FROM (VALUES %s) AS v(quote_id, total_amount, totals, updated_at)
+        WHERE q.quote_id = v.quote_id
+          AND q.updated_at IS NOT DISTINCT FROM v.updated_at
+    """, fixes, template="(%s, %s::numeric, %s::jsonb, %s::timestamp)", page_size=len(fixes))
+    return cursor.rowcount
+
+
+def check_quote_totals(repair: bool = False, batch_size: int = TOTALS_CHECK_BATCH) -> dict:
+    """Compare every quote's stored totals with its items; ``repair`` rewrites the ones that differ."""
+    report = {"checked": 0, "missing": 0, "mismatched": 0, "repaired": 0, "samples": []}
+    conn = None
+    try:
+        conn = get_db_connection()
+        writer = conn.cursor()
+        last_id = 0
+
+        while True:
+            rows = fetch_quote_page(conn, last_id, batch_size)
+            if not rows:
+                break
+            last_id = rows[-1]["id"]
+
+            fixes = []
+            for row, totals in zip(rows, compute_batch_totals(rows)):
+                stored = parse_totals(row["totals"])
+                if stored == totals and Decimal(row["total_amount"]) == totals["grand_total"]:
+                    continue
+                if stored is None:
+                    report["missing"] += 1
+                else:
+                    report["mismatched"] += 1
+                if len(report["samples"]) < TOTALS_CHECK_SAMPLES:
+                    report["samples"].append({
+                        "quote_id": row["quote_id"],
+                        "stored_total_amount": row["total_amount"],
+                        "computed_grand_total": totals["grand_total"],
+                        "breakdown_missing": stored is None,
+                    })
+                fixes.append((row["quote_id"], totals["grand_total"], totals_json(totals), row["updated_at"]))
+
+            report["checked"] += len(rows)
+            if repair and fixes:
+                report["repaired"] += write_quote_totals(writer, fixes)
+            conn.commit()
+
+        return report
+
+    except Exception:
+        if conn:
+            conn.rollback()
+        raise
+
+    finally:
+        if conn:
+            conn.close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Check (and optionally repair) the stored quote totals.")
+    parser.add_argument("--repair", action="store_true", help="rewrite quotes whose totals are missing or wrong")
+    parser.add_argument("--batch-size", type=int, default=TOTALS_CHECK_BATCH)
+    args = parser.parse_args()
+
+    result = check_quote_totals(repair=args.repair, batch_size=args.batch_size)
+    print(json.dumps(result, indent=2, default=str))
@@ -1,99 +1,86 @@
 from typing import Optional
 from fastapi import HTTPException
-from database import get_db_connection
-from psycopg2.extras import RealDictCursor
+from async_database import fetch_all, async_connection
 
 
 # ============================================================
 # QUOTES SUMMARY REPORT
 # ============================================================
 
-def get_quotes_summary(start_date: Optional[str], end_date: Optional[str],
-                       client_id: Optional[int]) -> dict:
-
-    conn = None
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-
-        # Base query
-        query = """
-            SELECT 
-                q.status,
-                COUNT(*) AS count
-            FROM quotes q
-            WHERE 1=1
-        """
-        params = []
-
-        # Date filter
-        if start_date and end_date:
-            query += " AND q.created_at BETWEEN %s AND %s"
-            params.extend([start_date, end_date])
-
-        # Client filter
-        if client_id:
-            query += " AND q.client_id = %s"
-            params.append(client_id)
-
-        # Grouping
-        query += " GROUP BY q.status ORDER BY q.status"
-
-        cursor.execute(query, params)
-        status_breakdown = cursor.fetchall()
-
-        # Grand total
-        total_query = "SELECT COUNT(*) AS total FROM quotes q WHERE 1=1"
-        total_params = []
-
-        if start_date and end_date:
-            total_query += " AND q.created_at BETWEEN %s AND %s"
-            total_params.extend([start_date, end_date])
-
-        if client_id:
-            total_query += " AND q.client_id = %s"
-            total_params.append(client_id)
-
-        cursor.execute(total_query, total_params)
-        grand_total = cursor.fetchone()["total"]
-
-        return {
-            "summary": {
-                "total_quotes": grand_total,
-                "filters": {
-                    "start_date": start_date,
-                    "end_date": end_date,
-                    "client_id": client_id
-                }
-            },
-            "status_breakdown": [
-                {
-                    "status": row["status"],
-                    "count": row["count"],
-                    "percentage": round((row["count"] / grand_total * 100), 1)
-                    if grand_total > 0 else 0
-                }
-                for row in status_breakdown
-            ]
-        }
-
-    finally:
-        if conn:
-            conn.close()
+async def get_quotes_summary(start_date: Optional[str], end_date: Optional[str],
+                             client_id: Optional[int]) -> dict:
+
+    # Base query
+    query = """
+        SELECT 
+            q.status,
+            COUNT(*) AS count
+        FROM quotes q
+        WHERE 1=1
+    """
+    params = []
+
+    # Date filter
+    if start_date and end_date:
+        query += " AND q.created_at BETWEEN %s AND %s"
+        params.extend([start_date, end_date])
+
+    # Client filter
+    if client_id:
+        query += " AND q.client_id = %s"
+        params.append(client_id)
+
+    # Grouping
+    query += " GROUP BY q.status ORDER BY q.status"
+
+    # Grand total
+    total_query = "SELECT COUNT(*) AS total FROM quotes q WHERE 1=1"
+    total_params = []
+
+    if start_date and end_date:
+        total_query += " AND q.created_at BETWEEN %s AND %s"
+        total_params.extend([start_date, end_date])
+
+    if client_id:
+        total_query += " AND q.client_id = %s"
+        total_params.append(client_id)
+
+    async with async_connection() as conn:
+        cursor = await conn.execute(query, params)
+        status_breakdown = await cursor.fetchall()
+
+        cursor = await conn.execute(total_query, total_params)
+        grand_total = (await cursor.fetchone())["total"]
+
+    return {
+        "summary": {
+            "total_quotes": grand_total,
+            "filters": {
+                "start_date": start_date,
+                "end_date": end_date,
+                "client_id": client_id
+            }
+        },
+        "status_breakdown": [
+            {
+                "status": row["status"],
+                "count": row["count"],
+                "percentage": round((row["count"] / grand_total * 100), 1)
+                if grand_total > 0 else 0
+            }
+            for row in status_breakdown
+        ]
+    }
 
 
 # ============================================================
 # REVENUE REPORT
 # ============================================================
 
-def get_revenue_report(start_date: Optional[str], end_date: Optional[str],
-                       client_id: Optional[int]) -> dict:
+async def get_revenue_report(start_date: Optional[str], end_date: Optional[str],
+                             client_id: Optional[int]) -> dict:
 
-    conn = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-
         query = """
             SELECT 
                 q.status,
@@ -116,8 +103,7 @@ def get_revenue_report(start_date: Optional[str], end_date: Optional[str],
 
         query += " GROUP BY q.status ORDER BY q.status"
 
-        cursor.execute(query, params)
-        results = cursor.fetchall()
+        results = await fetch_all(query, params)
 
         approved = next((r for r in results if r["status"] == "Approved"),
                         {"total_revenue": 0, "quote_count": 0})
@@ -154,67 +140,53 @@ def get_revenue_report(start_date: Optional[str], end_date: Optional[str],
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Revenue report failed: {str(e)[:100]}")
 
-    finally:
-        if conn:
-            conn.close()
-
 
 # ============================================================
 # CLIENT ACTIVITY REPORT
 # ============================================================
 
-def get_client_activity(start_date: Optional[str], end_date: Optional[str]) -> dict:
-
-    conn = None
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-
-        query = """
-            SELECT 
-                c.id AS client_id,
-                c.company_name,
-                COUNT(q.quote_id) AS quote_count,
-                COALESCE(SUM(q.total_amount), 0) AS total_quoted,
-                MAX(q.created_at) AS last_quote_date
-            FROM clients c
-            INNER JOIN quotes q ON c.id = q.client_id
-            WHERE 1=1
-        """
-        params = []
-
-        # Date filter
-        if start_date and end_date:
-            query += " AND q.created_at BETWEEN %s AND %s"
-            params.extend([start_date, end_date])
-
-        query += " GROUP BY c.id, c.company_name ORDER BY total_quoted DESC"
-
-        cursor.execute(query, params)
-        rows = cursor.fetchall()
-
-        clients_data = [
-            {
-                "client_id": row["client_id"],
-                "client_name": row["company_name"] or "Unknown",
-                "quote_count": int(row["quote_count"]) if row["quote_count"] else 0,
-                "total_quoted": float(row["total_quoted"]) if row["total_quoted"] else 0.0,
-                "last_quote_date": row["last_quote_date"]
-            }
-            for row in rows
-        ]
-
-        return {
-            "summary": {
-                "total_clients": len(clients_data),
-                "filters": {
-                    "start_date": start_date,
-                    "end_date": end_date
-                }
-            },
-            "clients": clients_data
+async def get_client_activity(start_date: Optional[str], end_date: Optional[str]) -> dict:
+
+    query = """
+        SELECT 
+            c.id AS client_id,
+            c.company_name,
+            COUNT(q.quote_id) AS quote_count,
+            COALESCE(SUM(q.total_amount), 0) AS total_quoted,
+            MAX(q.created_at) AS last_quote_date
+        FROM clients c
+        INNER JOIN quotes q ON c.id = q.client_id
+        WHERE 1=1
+    """
+    params = []
+
+    # Date filter
+    if start_date and end_date:
+        query += " AND q.created_at BETWEEN %s AND %s"
+        params.extend([start_date, end_date])
+
+    query += " GROUP BY c.id, c.company_name ORDER BY total_quoted DESC"
+
+    rows = await fetch_all(query, params)
+
+    clients_data = [
+        {
+            "client_id": row["client_id"],
+            "client_name": row["company_name"] or "Unknown",
+            "quote_count": int(row["quote_count"]) if row["quote_count"] else 0,
+            "total_quoted": float(row["total_quoted"]) if row["total_quoted"] else 0.0,
+            "last_quote_date": row["last_quote_date"]
         }
-
-    finally:
-        if conn:
-            conn.close()
+        for row in rows
+    ]
+
+    return {
+        "summary": {
+            "total_clients": len(clients_data),
+            "filters": {
+                "start_date": start_date,
+                "end_date": end_date
+            }
+        },
+        "clients": clients_data
+    }
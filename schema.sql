@@ -46,10 +46,18 @@ CREATE TABLE IF NOT EXISTS quotes (
     status TEXT DEFAULT 'Draft',
     included_charges JSONB NOT NULL,
     total_amount NUMERIC(12,2) NOT NULL,
-    created_at TIMESTAMP DEFAULT NOW(),
+    -- Full totals breakdown (utils.totals.TOTAL_KEYS), kept current on every
+    -- item / charge change; NULL until computed (python -m quotes.totals_check --repair)
+    totals JSONB,
+    -- NOT NULL: the created_at keyset (GET /quotes?sort=created_at) compares it
+    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
     updated_at TIMESTAMP DEFAULT NOW()
 );
 
+ALTER TABLE quotes ADD COLUMN IF NOT EXISTS totals JSONB;
+UPDATE quotes SET created_at = COALESCE(updated_at, date::timestamp) WHERE created_at IS NULL;
+ALTER TABLE quotes ALTER COLUMN created_at SET NOT NULL;
+
 -- ==================== QUOTE ITEMS TABLE ====================
 CREATE TABLE IF NOT EXISTS quote_items (
     id SERIAL PRIMARY KEY,
@@ -75,6 +83,68 @@ CREATE TABLE IF NOT EXISTS invoices (
     updated_at TIMESTAMP DEFAULT NOW()
 );
 
+-- ==================== NCF RANGES ====================
+-- DGII-authorized fiscal receipt number ranges (invoices.ncf.service)
+CREATE TABLE IF NOT EXISTS ncf_ranges (
+    id SERIAL PRIMARY KEY,
+    ncf_type TEXT NOT NULL,                -- '01' credito fiscal, '02' consumo, ...
+    series TEXT NOT NULL DEFAULT 'B',      -- 'B' printed, 'E' electronic
+    range_start BIGINT NOT NULL,
+    range_end BIGINT NOT NULL,
+    next_number BIGINT NOT NULL,
+    expires_on DATE,
+    active BOOLEAN DEFAULT TRUE,
+    created_at TIMESTAMP DEFAULT NOW(),
+    CHECK (range_start <= range_end),
+    CHECK (next_number BETWEEN range_start AND range_end + 1)
+);
+
+ALTER TABLE invoices ADD COLUMN IF NOT EXISTS ncf TEXT UNIQUE;
+ALTER TABLE invoices ADD COLUMN IF NOT EXISTS ncf_type TEXT;
+
+-- Payment reminder campaigns (invoices.reminders)
+ALTER TABLE invoices ADD COLUMN IF NOT EXISTS last_reminder_at TIMESTAMP;
+
+-- ==================== DOCUMENT NUMBERS ====================
+-- documents.numbering: each nextval() reserves a block of INCREMENT BY numbers
+-- that one API process hands out from memory.
+CREATE SEQUENCE IF NOT EXISTS quote_number_seq INCREMENT BY 50;
+CREATE SEQUENCE IF NOT EXISTS invoice_number_seq INCREMENT BY 50;
+
+-- ==================== EMAIL OUTBOX ====================
+-- Outgoing emails, sent by the email_outbox worker pool.
+-- status: pending -> sending -> sent | dead (dead-lettered after the last retry)
+CREATE TABLE IF NOT EXISTS email_outbox (
+    id BIGSERIAL PRIMARY KEY,
+    job_id TEXT UNIQUE NOT NULL,
+    idempotency_key TEXT UNIQUE NOT NULL,
+    kind TEXT,                             -- 'quote', 'invoice', ...
+    reference TEXT,                        -- quote_id / invoice id
+    params JSONB NOT NULL,                 -- from, to, subject, html
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    next_attempt_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    locked_at TIMESTAMP,
+    last_error TEXT,
+    provider_id TEXT,
+    created_at TIMESTAMP DEFAULT NOW(),
+    updated_at TIMESTAMP DEFAULT NOW(),
+    sent_at TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS email_outbox_attachments (
+    outbox_id BIGINT NOT NULL REFERENCES email_outbox(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    filename TEXT NOT NULL,
+    content BYTEA NOT NULL,
+    PRIMARY KEY (outbox_id, position)
+);
+
+-- Workers poll for due rows
+CREATE INDEX IF NOT EXISTS idx_email_outbox_due ON email_outbox(next_attempt_at)
+    WHERE status IN ('pending', 'sending');
+
 -- ==================== PROJECTS TABLE ====================
 CREATE TABLE IF NOT EXISTS projects (
     id SERIAL PRIMARY KEY,
@@ -108,11 +178,26 @@ CREATE INDEX IF NOT EXISTS idx_quotes_client_id ON quotes(client_id);
 CREATE INDEX IF NOT EXISTS idx_quotes_status ON quotes(status);
 CREATE INDEX IF NOT EXISTS idx_quotes_date ON quotes(date);
 
+-- Keyset pagination for GET /quotes (sort=id is served by the primary key)
+CREATE INDEX IF NOT EXISTS idx_quotes_created_at_id ON quotes(created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_quotes_client_id_id ON quotes(client_id, id DESC);
+CREATE INDEX IF NOT EXISTS idx_quotes_status_id ON quotes(status, id DESC);
+
+-- Text search (ILIKE '%...%') on the quote list
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX IF NOT EXISTS idx_quotes_quote_id_trgm ON quotes USING gin (quote_id gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_quotes_project_name_trgm ON quotes USING gin (project_name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_clients_company_name_trgm ON clients USING gin (company_name gin_trgm_ops);
+
 CREATE INDEX IF NOT EXISTS idx_quote_items_quote_id ON quote_items(quote_id);
 
 CREATE INDEX IF NOT EXISTS idx_invoices_client_id ON invoices(client_id);
 CREATE INDEX IF NOT EXISTS idx_invoices_status ON invoices(status);
 
+-- Keyset pagination for GET /invoices
+CREATE INDEX IF NOT EXISTS idx_invoices_invoice_date_id ON invoices(invoice_date DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_invoices_client_id_date ON invoices(client_id, invoice_date DESC, id DESC);
+
 CREATE INDEX IF NOT EXISTS idx_projects_client_id ON projects(client_id);
 CREATE INDEX IF NOT EXISTS idx_projects_status ON projects(status);
 
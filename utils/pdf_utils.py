@@ -14,12 +14,10 @@ def add_footer_with_signature(pdf):
     FONT_PATH = os.path.join(os.path.dirname(__file__), "..", "fonts", "GreatVibes-Regular.ttf")
     FONT_PATH = os.path.abspath(FONT_PATH)
 
-    font_loaded = False
-    try:
-        pdf.add_font("GreatVibes", "", FONT_PATH, uni=True)
-        font_loaded = True
-    except Exception as e:
-        print("Font load failed:", e)
+    # Parsed once per process by the asset registry (imported here to avoid
+    # a utils -> pdf -> utils import cycle).
+    from pdf import assets
+    font_loaded = assets.add_font(pdf, "GreatVibes", FONT_PATH)
 
     # ============================
     # LEFT SIDE — METPRO SIGNATURE
@@ -0,0 +1,212 @@
+"""
+Circuit breaker and bulkhead for calls to external services.
+
+CircuitBreaker
+    closed     calls go through; failure_threshold consecutive failures open it
+    open       calls fail at once with CircuitOpenError for reset_timeout seconds
+    half_open  one probe call is let through: success closes the circuit,
+               failure opens it again for another reset_timeout
+
+    Exceptions listed in ``healthy_errors`` mean the remote side answered
+    (e.g. a validation error) and count as successes. Every call's latency
+    is kept in a rolling window for stats().
+
+Bulkhead
+    At most ``size`` calls at a time; a caller waits up to ``max_wait``
+    seconds for a slot, then gets BulkheadFullError.
+"""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Optional, Tuple, Type
+
+LATENCY_WINDOW = 500
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} circuit is open, retry in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+class BulkheadFullError(Exception):
+    def __init__(self, name: str, size: int):
+        super().__init__(f"{name} bulkhead is full ({size} calls in flight)")
+        self.retry_after = 1.0
+
+
+def _percentile(values, fraction: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(int(len(ordered) * fraction), len(ordered) - 1)] * 1000, 1)
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 healthy_errors: Tuple[Type[BaseException], ...] = ()):
+        self.name = name
+        self.failure_threshold = max(failure_threshold, 1)
+        self.reset_timeout = reset_timeout
+        self.healthy_errors = healthy_errors
+
+        self._lock = threading.Lock()
+        self._state = "closed"
+        self._failures = 0            # consecutive
+        self._opened_at = 0.0
+        self._probing = False
+
+        self._calls = 0
+        self._successes = 0
+        self._errors = 0
+        self._rejected = 0
+        self._opened = 0
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+
+    # ------------------------------------------------------------------
+    # STATE
+    # ------------------------------------------------------------------
+    def _refresh(self, now: float):
+        if self._state == "open" and now - self._opened_at >= self.reset_timeout:
+            self._state = "half_open"
+            self._probing = False
+
+    def _open(self, now: float):
+        self._state = "open"
+        self._opened_at = now
+        self._opened += 1
+        print(f"WARNING: {self.name} circuit opened after {self._failures} failures")
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._refresh(time.monotonic())
+            return self._state
+
+    def retry_after(self) -> float:
+        """Seconds until calls are let through again (0 when closed or ready to probe)."""
+        with self._lock:
+            now = time.monotonic()
+            self._refresh(now)
+            if self._state == "open":
+                return max(self._opened_at + self.reset_timeout - now, 0.0)
+            return 0.0
+
+    def check(self):
+        """Raise CircuitOpenError while open, without taking the half-open probe."""
+        delay = self.retry_after()
+        if delay > 0:
+            with self._lock:
+                self._rejected += 1
+            raise CircuitOpenError(self.name, delay)
+
+    # ------------------------------------------------------------------
+    # CALL
+    # ------------------------------------------------------------------
+    def _allow(self):
+        with self._lock:
+            now = time.monotonic()
+            self._refresh(now)
+            if self._state == "open" or (self._state == "half_open" and self._probing):
+                self._rejected += 1
+                retry = self._opened_at + self.reset_timeout - now if self._state == "open" else 1.0
+                raise CircuitOpenError(self.name, max(retry, 0.0))
+            if self._state == "half_open":
+                self._probing = True
+            self._calls += 1
+
+    def _record(self, ok: bool, seconds: float):
+        with self._lock:
+            self._latencies.append(seconds)
+            now = time.monotonic()
+            if ok:
+                self._successes += 1
+                self._failures = 0
+                if self._state == "half_open":
+                    print(f"{self.name} circuit closed")
+                self._state = "closed"
+                self._probing = False
+                return
+            self._errors += 1
+            self._failures += 1
+            if self._state == "half_open" or self._failures >= self.failure_threshold:
+                self._probing = False
+                self._open(now)
+
+    def call(self, fn, *args, **kwargs):
+        self._allow()
+        started = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+        except self.healthy_errors:
+            self._record(True, time.perf_counter() - started)
+            raise
+        except Exception:
+            self._record(False, time.perf_counter() - started)
+            raise
+        self._record(True, time.perf_counter() - started)
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            now = time.monotonic()
+            self._refresh(now)
+            latencies = list(self._latencies)
+            return {
+                "state": self._state,
+                "consecutive_failures": self._failures,
+                "retry_after_seconds": round(max(self._opened_at + self.reset_timeout - now, 0.0), 1)
+                if self._state == "open" else 0.0,
+                "calls": self._calls,
+                "successes": self._successes,
+                "failures": self._errors,
+                "rejected": self._rejected,
+                "times_opened": self._opened,
+                "latency_ms": {
+                    "p50": _percentile(latencies, 0.50),
+                    "p95": _percentile(latencies, 0.95),
+                    "max": round(max(latencies) * 1000, 1) if latencies else None,
+                },
+            }
+
+
+class Bulkhead:
+    def __init__(self, name: str, size: int, max_wait: float = 0.0):
+        self.name = name
+        self.size = max(size, 1)
+        self.max_wait = max_wait
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._lock = threading.Lock()
+        self._in_use = 0
+        self._peak = 0
+        self._rejected = 0
+
+    @contextmanager
+    def slot(self):
+        if self.max_wait > 0:
+            acquired = self._slots.acquire(timeout=self.max_wait)
+        else:
+            acquired = self._slots.acquire(blocking=False)
+        if not acquired:
+            with self._lock:
+                self._rejected += 1
+            raise BulkheadFullError(self.name, self.size)
+        with self._lock:
+            self._in_use += 1
+            self._peak = max(self._peak, self._in_use)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._in_use -= 1
+            self._slots.release()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": self.size,
+                "in_use": self._in_use,
+                "peak": self._peak,
+                "rejected": self._rejected,
+            }
@@ -0,0 +1,198 @@
+"""
+Quote / invoice totals engine.
+
+Every total in the system (API responses, stored total_amount, PDFs, batch
+jobs) comes from here. Amounts are exact: inputs are rounded to the precision
+of their NUMERIC(12,2) columns and all arithmetic is done on integer cents,
+results are returned as Decimal with two places.
+
+Rounding rules (ROUND_HALF_UP, like Postgres round()):
+
+- line subtotal = quantity x unit_price, rounded to cents per line;
+- percentage discount = line subtotal x pct / 100, rounded per line;
+  fixed discount = discount_value;
+- each enabled charge (supervision, admin, insurance, transport,
+  contingency) = items_after_discount x pct / 100, rounded;
+- subtotal_general = items_after_discount + charges;
+- itbis = subtotal_general x 18%, rounded; grand_total = subtotal_general + itbis.
+
+calculate_totals() handles one document; calculate_totals_batch() computes
+many documents at once from columnar inputs (one sequence per line field
+plus the document index of each line), for reports and recalculation jobs.
+
+Everything after the line loop only depends on items_total and
+total_discounts, so totals_from_sums() re-prices a document (e.g. after a
+charge change) without its lines. totals_json() / parse_totals() convert
+the breakdown persisted in quotes.totals.
+"""
+import json
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Dict, List, Optional, Sequence, Tuple
+
+ITBIS_RATE = Decimal("0.18")
+
+# (key in included_charges, default percentage)
+CHARGE_DEFAULTS = (
+    ("supervision", Decimal("10")),
+    ("admin", Decimal("4")),
+    ("insurance", Decimal("1")),
+    ("transport", Decimal("3")),
+    ("contingency", Decimal("3")),
+)
+
+TOTAL_KEYS = (
+    "items_total", "total_discounts", "items_after_discount",
+    *(key for key, _ in CHARGE_DEFAULTS),
+    "subtotal_general", "itbis", "grand_total",
+)
+
+# Percentages are kept with 4 decimals (scaled by _PCT); money and quantities with 2.
+_PCT = 10 ** 4
+_ITBIS = int(ITBIS_RATE * 100)
+
+
+# ============================================================
+# SCALED INTEGERS
+# ============================================================
+def _scaled(value, places: int) -> int:
+    """value * 10**places as an int, rounded half-up (None/"" -> 0)."""
+    if not value:
+        return 0
+    if isinstance(value, int):
+        return value * 10 ** places
+    if not isinstance(value, Decimal):
+        # str() first: floats from JSON/pydantic must not carry binary noise.
+        value = Decimal(str(value))
+    return int(value.scaleb(places).to_integral_value(ROUND_HALF_UP))
+
+
+def _cents(value) -> int:
+    return _scaled(value, 2)
+
+
+def _pct(value) -> int:
+    return _scaled(value, 4)
+
+
+def _div(n: int, d: int) -> int:
+    """n / d rounded half-up (away from zero) for d > 0."""
+    q, r = divmod(abs(n), d)
+    if 2 * r >= d:
+        q += 1
+    return q if n >= 0 else -q
+
+
+def _money(cents: int) -> Decimal:
+    return Decimal(cents).scaleb(-2)
+
+
+def _line(quantity: int, unit_price: int, discount_type: str, discount_value) -> Tuple[int, int]:
+    """(subtotal, discount) in cents for scaled quantity / unit_price."""
+    subtotal = _div(quantity * unit_price, 100)
+    if discount_type == "percentage":
+        return subtotal, _div(subtotal * _pct(discount_value), 100 * _PCT)
+    if discount_type == "fixed":
+        return subtotal, _cents(discount_value)
+    return subtotal, 0
+
+
+def _charge_rates(charges: dict) -> Tuple[int, ...]:
+    """Scaled percentage of each charge in CHARGE_DEFAULTS order, 0 when disabled."""
+    charges = charges or {}
+    return tuple(
+        _pct(charges.get(f"{key}_percentage", default)) if charges.get(key) else 0
+        for key, default in CHARGE_DEFAULTS
+    )
+
+
+def _price(items: int, discounts: int, rates: Tuple[int, ...]) -> Tuple[int, ...]:
+    """Every total in TOTAL_KEYS order, in cents, from the line sums."""
+    after = items - discounts
+    amounts = tuple(_div(after * rate, 100 * _PCT) if rate else 0 for rate in rates)
+    subtotal_general = after + sum(amounts)
+    itbis = _div(subtotal_general * _ITBIS, 100)
+    return (items, discounts, after, *amounts, subtotal_general, itbis, subtotal_general + itbis)
+
+
+# ============================================================
+# PUBLIC API
+# ============================================================
+def charge_percentage(charges: dict, key: str) -> Decimal:
+    """Percentage applied for charge ``key`` (its default when not set)."""
+    default = dict(CHARGE_DEFAULTS)[key]
+    return Decimal(_pct((charges or {}).get(f"{key}_percentage", default))).scaleb(-4).normalize()
+
+
+def line_amounts(quantity, unit_price, discount_type: str = "none", discount_value=0) -> Tuple[Decimal, Decimal]:
+    """(subtotal, discount amount) of a single line."""
+    subtotal, discount = _line(_cents(quantity), _cents(unit_price), discount_type, discount_value)
+    return _money(subtotal), _money(discount)
+
+
+def calculate_totals_batch(
+    line_doc: Sequence[int],
+    quantities: Sequence,
+    unit_prices: Sequence,
+    discount_types: Sequence[str],
+    discount_values: Sequence,
+    charges: Sequence[dict],
+) -> Dict[str, List[Decimal]]:
+    """
+    Totals for ``len(charges)`` documents at once.
+
+    Line inputs are parallel sequences; ``line_doc[i]`` is the index (into
+    ``charges``) of the document line i belongs to, lines need not be sorted.
+    Returns one list per TOTAL_KEYS key, indexed like ``charges``.
+    """
+    n = len(charges)
+    items = [0] * n
+    discounts = [0] * n
+    for doc, quantity, unit_price, discount_type, discount_value in zip(
+        line_doc, map(_cents, quantities), map(_cents, unit_prices), discount_types, discount_values,
+    ):
+        subtotal, discount = _line(quantity, unit_price, discount_type, discount_value)
+        items[doc] += subtotal
+        discounts[doc] += discount
+
+    rows = map(_price, items, discounts, map(_charge_rates, charges))
+    columns = zip(*rows) if n else [()] * len(TOTAL_KEYS)
+    return {key: [_money(c) for c in column] for key, column in zip(TOTAL_KEYS, columns)}
+
+
+def calculate_totals(items: List[dict], charges: dict) -> Dict[str, Decimal]:
+    """Totals of one quote / invoice from its item dicts and included_charges."""
+    items = items or []
+    batch = calculate_totals_batch(
+        [0] * len(items),
+        [item.get("quantity") for item in items],
+        [item.get("unit_price") for item in items],
+        [item.get("discount_type") for item in items],
+        [item.get("discount_value") for item in items],
+        [charges or {}],
+    )
+    return {key: column[0] for key, column in batch.items()}
+
+
+def totals_from_sums(items_total, total_discounts, charges: dict) -> Dict[str, Decimal]:
+    """Totals of a document whose line sums are already known."""
+    cents = _price(_cents(items_total), _cents(total_discounts), _charge_rates(charges))
+    return {key: _money(c) for key, c in zip(TOTAL_KEYS, cents)}
+
+
+# ============================================================
+# PERSISTED BREAKDOWN (quotes.totals)
+# ============================================================
+def totals_json(totals: Dict[str, Decimal]) -> str:
+    """JSON object with every total as an exact JSON number."""
+    return "{" + ", ".join(f'"{key}": {Decimal(totals[key]):f}' for key in TOTAL_KEYS) + "}"
+
+
+def parse_totals(value) -> Optional[Dict[str, Decimal]]:
+    """quotes.totals (dict or JSON text) -> totals dict; None when missing or incomplete."""
+    if not value:
+        return None
+    if isinstance(value, str):
+        value = json.loads(value)
+    if not all(key in value for key in TOTAL_KEYS):
+        return None
+    return {key: _money(_cents(value[key])) for key in TOTAL_KEYS}